@@ -0,0 +1,114 @@
+"""
+Benchmark the host-side matcher (src.core.matcher) on a gallery of simulated fingers.
+
+Builds a GalleryIndex of --users simulated templates, then searches probes of enrolled
+fingers (shifted, rotated, with position/direction noise and some minutiae missing, like
+a second touch) and of fingers that are not enrolled. The report shows the index build
+rate, search latency p50/p95 and the genuine / impostor scores against the threshold.
+
+    python -m benchmarks.matcher --users 100000
+"""
+
+# Standard Library
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from typing import List, Optional, Tuple
+
+# Third Library
+import numpy as np
+
+from src.core.matcher import GalleryIndex
+from src.core.template import Template, TemplateFormat
+from src.sim import minutiae
+from src.sim.r503 import (
+    IDENTITY_SIZE,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    SimulatedR503,
+    encode_minutiae,
+    finger_identity,
+    minutiae_for,
+)
+
+Minutiae = List[Tuple[int, int, int]]
+TEMPLATE_SIZE = SimulatedR503().template_size
+
+
+def _template(minutiae: Minutiae) -> Template:
+    data = bytes(IDENTITY_SIZE) + encode_minutiae(minutiae)
+    return Template(data.ljust(TEMPLATE_SIZE, b"\0"), TemplateFormat.CHAR)
+
+
+def second_touch(minutiae: Minutiae, rng: random.Random, noise: float, dropped: float) -> Minutiae:
+    """The same finger placed again: moved, turned, slightly distorted, partly outside the window."""
+    turn = rng.uniform(-0.35, 0.35)
+    dx, dy = rng.uniform(-12, 12), rng.uniform(-12, 12)
+    cos, sin = math.cos(turn), math.sin(turn)
+    cx, cy = IMAGE_WIDTH / 2, IMAGE_HEIGHT / 2
+    moved = []
+    for x, y, direction in minutiae:
+        if rng.random() < dropped:
+            continue
+        nx = cx + cos * (x - cx) - sin * (y - cy) + dx + rng.gauss(0, noise)
+        ny = cy + sin * (x - cx) + cos * (y - cy) + dy + rng.gauss(0, noise)
+        nd = direction + turn * 256 / (2 * math.pi) + rng.gauss(0, noise)
+        moved.append((int(min(max(nx, 0), IMAGE_WIDTH)), int(min(max(ny, 0), IMAGE_HEIGHT)), int(nd) % 256))
+    return moved
+
+
+def _finger(number: int) -> Minutiae:
+    return minutiae_for(finger_identity(f"user_{number}"))
+
+
+def _enrolled(device: SimulatedR503, number: int) -> Template:
+    return Template(device.template_for(f"user_{number}"), TemplateFormat.CHAR)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=0, help="0: one per CPU")
+    parser.add_argument("--threshold", type=float, default=12.0)
+    parser.add_argument("--noise", type=float, default=1.5, help="position (px) / direction (1/256 turn) noise")
+    parser.add_argument("--dropped", type=float, default=0.15, help="share of minutiae missing from a probe")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    device = SimulatedR503()
+    index = GalleryIndex(minutiae.LAYOUT, workers=args.workers)
+    started = time.perf_counter()
+    for number in range(args.users):
+        index.put(f"user_{number}", _enrolled(device, number))
+    build = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    latencies, genuine, impostor, identified = [], [], [], 0
+    for attempt in range(args.searches):
+        number = rng.randrange(args.users)
+        probe = _template(second_touch(_finger(number), rng, args.noise, args.dropped))
+        started = time.perf_counter()
+        best = index.search(probe, 0.0, top=1)
+        latencies.append(time.perf_counter() - started)
+        genuine.append(best[0][1])
+        identified += best[0][0] == f"user_{number}" and best[0][1] >= args.threshold
+        stranger = _template(second_touch(_finger(args.users + attempt), rng, args.noise, args.dropped))
+        impostor.append(index.search(stranger, 0.0, top=1)[0][1])
+    index.close()
+
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    print(f"index build     {args.users} users in {build:.1f} s ({args.users / build:,.0f} users/s)")
+    print(f"search          p50 {p50:.1f} ms  p95 {p95:.1f} ms  ({index.workers} workers)")
+    print(f"genuine score   min {min(genuine):.1f}  median {statistics.median(genuine):.1f}")
+    print(f"impostor score  max {max(impostor):.1f}  median {statistics.median(impostor):.1f}")
+    false_matches = sum(score >= args.threshold for score in impostor)
+    print(f"at {args.threshold:g}: {identified}/{args.searches} identified, {false_matches} false matches")
+    return 0 if identified == args.searches and not false_matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+Benchmark the enroll / encrypt / upload / search pipeline against a simulated sensor.
+
+Every stage of `enroll_fingerprint` and `authenticate_with_encrypted` is measured on its
+own: wall time, CPU time, explicit sleep time and serial bytes moved. The report shows
+p50/p95/p99 per stage. With --check the run fails (exit code 1) when a stage regresses
+past the stored baselines; --update stores the current run as the new baselines.
+
+    python -m benchmarks.pipeline --iterations 20 --time-scale 0 --check
+"""
+
+# Standard Library
+import argparse
+import asyncio
+from contextlib import contextmanager
+from dataclasses import dataclass
+import functools
+import inspect
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+DEVICE = "bench"
+USER_ID = "bench_user"
+PERCENTILES = (50, 95, 99)
+# Empty GETIMAGE polls before the finger lands on authenticate (the user reaching the reader)
+ARRIVAL_POLLS = 3
+# One GETIMAGE packet each way: pipelined runs race the decrypt thread against the polls
+POLL_BYTES = 12
+# scenario -> (AUTH_MODE, library emptied before every attempt); run in this order
+SCENARIOS = {
+    "enroll": (None, False),
+    "authenticate_cold": ("search", True),
+    "authenticate_warm": ("search", False),
+    "verify_resident": ("verify", False),
+    "verify_upload": ("verify", True),
+}
+# Scenarios whose stages run concurrently (decrypt/upload during capture)
+OVERLAPPING = ("verify_upload",)
+
+
+# -------------------------------------------------------------------
+# Measurements
+# -------------------------------------------------------------------
+@dataclass
+class Sample:
+    wall: float = 0.0
+    cpu: float = 0.0
+    sleep: float = 0.0
+    bytes_in: int = 0  # host -> sensor
+    bytes_out: int = 0  # sensor -> host
+
+
+class Recorder:
+    """
+    Collects one Sample per stage and iteration. Stages may nest (e.g. capture inside
+    total); requests run one at a time, so a single stack covers the worker threads too.
+    CPU time is process-wide and includes the in-process simulated sensor.
+    """
+
+    def __init__(self, device=None):
+        self.device = device
+        self.samples: Dict[str, List[Sample]] = {}
+        self._iteration: Optional[Dict[str, Sample]] = None
+        self._stack: List[Sample] = []
+
+    def begin_iteration(self):
+        self._iteration = {}
+
+    def end_iteration(self, keep: bool = True):
+        if keep:
+            for stage, sample in self._iteration.items():
+                self.samples.setdefault(stage, []).append(sample)
+        self._iteration = None
+
+    def _counters(self) -> Tuple[int, int]:
+        return (self.device.bytes_in, self.device.bytes_out) if self.device is not None else (0, 0)
+
+    @contextmanager
+    def stage(self, name: str):
+        if self._iteration is None:
+            # setup work between iterations is not measured
+            yield
+            return
+        sample = self._iteration.setdefault(name, Sample())
+        self._stack.append(sample)
+        bytes_in, bytes_out = self._counters()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            sample.wall += time.perf_counter() - wall
+            sample.cpu += time.process_time() - cpu
+            now_in, now_out = self._counters()
+            sample.bytes_in += now_in - bytes_in
+            sample.bytes_out += now_out - bytes_out
+            self._stack.remove(sample)
+
+    def slept(self, seconds: float):
+        for sample in self._stack:
+            sample.sleep += seconds
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(recorder: Recorder) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for stage, samples in sorted(recorder.samples.items()):
+        walls = [s.wall for s in samples]
+        row = {"n": len(samples)}
+        for q in PERCENTILES:
+            row[f"wall_p{q}"] = percentile(walls, q)
+        row["cpu_p50"] = percentile([s.cpu for s in samples], 50)
+        row["sleep_p50"] = percentile([s.sleep for s in samples], 50)
+        row["bytes_in"] = sum(s.bytes_in for s in samples) / len(samples)
+        row["bytes_out"] = sum(s.bytes_out for s in samples) / len(samples)
+        summary[stage] = row
+    return summary
+
+
+# -------------------------------------------------------------------
+# Instrumentation (benchmark only: wraps methods for the duration of the run)
+# -------------------------------------------------------------------
+def _wrap(func: Callable, recorder: Recorder, stage: str) -> Callable:
+    if inspect.isgeneratorfunction(func):
+        # service flows (src/core/flow.py): timed from the first step to the result
+
+        @functools.wraps(func)
+        def flow_wrapper(*args, **kwargs):
+            with recorder.stage(stage):
+                return (yield from func(*args, **kwargs))
+
+        return flow_wrapper
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with recorder.stage(stage):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with recorder.stage(stage):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def instrumented(targets: List[Tuple[object, str, str]], recorder: Recorder, time_scale: float):
+    """Wrap (owner, attribute, stage) targets and record sleeps issued by the services."""
+    from src.core.cancel import CancelToken
+
+    originals = [(owner, attr, owner.__dict__[attr]) for owner, attr, _ in targets]
+    real_sleep, real_async_sleep, real_token_sleep = time.sleep, asyncio.sleep, CancelToken.sleep
+
+    def _from_services() -> bool:
+        return sys._getframe(2).f_globals.get("__name__", "").startswith("src.core")
+
+    def sleep(seconds):
+        if _from_services():
+            recorder.slept(seconds)
+            seconds *= time_scale
+            if not seconds:
+                # a zero sleep still yields the GIL and adds scheduler noise to the stage
+                return
+        real_sleep(seconds)
+
+    async def async_sleep(seconds, *args, **kwargs):
+        if _from_services():
+            recorder.slept(seconds)
+            seconds *= time_scale
+        return await real_async_sleep(seconds, *args, **kwargs)
+
+    def token_sleep(token, seconds):
+        # cancellable waits of the blocking services
+        recorder.slept(seconds)
+        seconds *= time_scale
+        token.check()
+        if seconds:
+            real_token_sleep(token, seconds)
+
+    try:
+        for owner, attr, stage in targets:
+            setattr(owner, attr, _wrap(getattr(owner, attr), recorder, stage))
+        time.sleep, asyncio.sleep, CancelToken.sleep = sleep, async_sleep, token_sleep
+        yield
+    finally:
+        time.sleep, asyncio.sleep, CancelToken.sleep = real_sleep, real_async_sleep, real_token_sleep
+        for owner, attr, original in originals:
+            setattr(owner, attr, original)
+
+
+def _targets():
+    import adafruit_fingerprint
+
+    from src.core.async_sensor import AsyncFingerprint
+    from src.core.identify_service import IdentifyService
+    from src.core.sensor_service import FingerprintSensorService, R503Fingerprint
+    from src.utils.encrypt import Encrypt
+    from src.utils.template_store import FileStore, PackedStore
+
+    targets = [
+        (Encrypt, "encrypt_bytes", "encrypt"),
+        (Encrypt, "decrypt_bytes", "decrypt"),
+        (FileStore, "get", "store_read"),
+        (FileStore, "put", "store_write"),
+        (PackedStore, "get", "store_read"),
+        (PackedStore, "put", "store_write"),
+        # flows shared by both transports
+        (FingerprintSensorService, "_capture", "capture"),
+        (IdentifyService, "_upload_to_sensor", "upload"),
+        (IdentifyService, "_verify", "verify"),
+    ]
+    # (class defining create_model/finger_search, class defining get_fpdata/compare_templates)
+    for base_cls, sensor_cls in (
+        (adafruit_fingerprint.Adafruit_Fingerprint, R503Fingerprint),
+        (AsyncFingerprint, AsyncFingerprint),
+    ):
+        targets += [
+            (base_cls, "create_model", "create_model"),
+            (sensor_cls, "get_fpdata", "download"),
+            (base_cls, "finger_search", "search"),
+            (sensor_cls, "compare_templates", "compare"),
+        ]
+    return targets
+
+
+# -------------------------------------------------------------------
+# Scenarios
+# -------------------------------------------------------------------
+async def run(iterations: int, warmup: int, time_scale: float) -> Dict[str, Dict[str, Dict[str, float]]]:
+    from src.core import fingerprint_service as fs
+    from src.sim.protocol_sim import parse_url
+    from src.sim.r503 import get_device
+
+    port = os.environ["PORT"]
+    name, options = parse_url(port)
+    device = get_device(name, **options)
+    results = {}
+    try:
+        for scenario, (auth_mode, cold) in SCENARIOS.items():
+            recorder = Recorder(device=device)
+            if scenario == "authenticate_cold":
+                await fs.enroll_fingerprint(USER_ID)
+            fs.settings.AUTH_MODE = auth_mode or fs.settings.AUTH_MODE
+            with instrumented(_targets(), recorder, time_scale):
+                for i in range(warmup + iterations):
+                    if cold:
+                        # template no longer resident: upload on every attempt
+                        await fs.reset_sensor()
+                    if scenario != "enroll" and device.finger_present:
+                        device.press(device._finger, after_polls=ARRIVAL_POLLS)
+                    recorder.begin_iteration()
+                    with recorder.stage("total"):
+                        if scenario == "enroll":
+                            result = await fs.enroll_fingerprint(USER_ID)
+                        else:
+                            result = await fs.authenticate_with_encrypted(user_id=USER_ID)
+                    if result.get("status") != "ok":
+                        raise RuntimeError(f"{scenario} failed on {port}: {result}")
+                    recorder.end_iteration(keep=i >= warmup)
+            results[scenario] = summarize(recorder)
+    finally:
+        await fs.close_sensors()
+    return results
+
+
+# -------------------------------------------------------------------
+# Report / baselines
+# -------------------------------------------------------------------
+def print_report(results, config):
+    print(f"\nPipeline benchmark ({', '.join(f'{k}={v}' for k, v in config.items())})")
+    header = f"{'stage':<28}{'n':>4}" + "".join(f"{'p' + str(q) + ' ms':>11}" for q in PERCENTILES)
+    header += f"{'cpu ms':>10}{'sleep ms':>10}{'tx B':>9}{'rx B':>9}"
+    for scenario, stages in results.items():
+        print(f"\n{scenario}\n{header}")
+        for stage, row in stages.items():
+            line = f"{stage:<28}{row['n']:>4}"
+            line += "".join(f"{row[f'wall_p{q}'] * 1000:>11.1f}" for q in PERCENTILES)
+            line += f"{row['cpu_p50'] * 1000:>10.1f}{row['sleep_p50'] * 1000:>10.1f}"
+            line += f"{row['bytes_in']:>9.0f}{row['bytes_out']:>9.0f}"
+            print(line)
+
+
+def check_regressions(results, baseline, tolerance: float, slack: float) -> List[str]:
+    """Stages whose p95 wall time or serial traffic grew past the baseline."""
+    failures = []
+    for scenario, stages in baseline.get("results", {}).items():
+        for stage, expected in stages.items():
+            row = results.get(scenario, {}).get(stage)
+            if row is None:
+                continue
+            limit = expected["wall_p95"] * (1 + tolerance) + slack
+            if row["wall_p95"] > limit:
+                failures.append(
+                    f"{scenario}/{stage}: p95 {row['wall_p95'] * 1000:.1f} ms > {limit * 1000:.1f} ms"
+                )
+            if scenario in OVERLAPPING and stage != "total":
+                # serial bytes split between concurrent stages differently from run to run
+                continue
+            for key in ("bytes_in", "bytes_out"):
+                if row[key] > expected[key] * 1.01 + POLL_BYTES:
+                    failures.append(f"{scenario}/{stage}: {key} {row[key]:.0f} > {expected[key]:.0f}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--time-scale", type=float, default=0.0, help="sensor timing model scale (0 = host cost only)")
+    parser.add_argument("--template-format", choices=("char", "image"), default="char")
+    parser.add_argument("--transport", choices=("thread", "asyncio"), default="thread")
+    parser.add_argument("--store", choices=("files", "packed"), default="files")
+    parser.add_argument("--link-tuning", action="store_true", help="raise baud rate and packet size at session start")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 growth")
+    parser.add_argument("--slack", type=float, default=0.005, help="allowed absolute p95 growth (seconds)")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    config = {
+        "time_scale": args.time_scale,
+        "template_format": args.template_format,
+        "transport": args.transport,
+        "store": args.store,
+        "link_tuning": args.link_tuning,
+    }
+    workdir = tempfile.mkdtemp(prefix="r503-bench-")
+    os.environ.update(
+        {
+            "PORT": f"sim://{DEVICE}?time_scale={args.time_scale}",
+            "PORTS": "[]",
+            "TEMPLATE_FORMAT": args.template_format,
+            "LED_IDLE_OFF_DELAY": "-1",
+            "SENSOR_TRANSPORT": args.transport,
+            "TEMPLATE_STORE": args.store,
+            "LINK_TUNING": str(args.link_tuning),
+            "ENCRYPTED_PATH": str(Path(workdir) / "encrypted"),
+            "LOGGER_PATH": str(Path(workdir) / "logs"),
+            "CAPTURE_TMP_PATH": str(Path(workdir) / "tmp"),
+        }
+    )
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    results = asyncio.run(run(args.iterations, args.warmup, args.time_scale))
+    print_report(results, config)
+    if args.json:
+        args.json.write_text(json.dumps({"config": config, "results": results}, indent=2))
+
+    status = 0
+    if args.check:
+        if not args.baseline.exists():
+            print(f"\nNo baseline at {args.baseline}; run with --update first.")
+            status = 1
+        else:
+            baseline = json.loads(args.baseline.read_text())
+            if baseline.get("config") != config:
+                print(f"\nBaseline was recorded with {baseline.get('config')}, not comparable.")
+                status = 1
+            else:
+                failures = check_regressions(results, baseline, args.tolerance, args.slack)
+                print("\nRegressions:\n  " + "\n  ".join(failures) if failures else "\nNo regressions.")
+                status = 1 if failures else 0
+    if args.update:
+        args.baseline.write_text(json.dumps({"config": config, "results": results}, indent=2) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
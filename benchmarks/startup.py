@@ -0,0 +1,132 @@
+"""
+Measure import time of the service modules against a budget.
+
+Each module is imported in a fresh interpreter with `-X importtime`; the report shows the
+median cumulative import time and the heaviest imports it pulled in. An import must also
+stay free of side effects: settings not loaded, no log file opened, and none of the heavy
+libraries that are only needed once a sensor or a template is used. With --check the run
+fails (exit code 1) when a module is over budget or has a side effect.
+
+    python -m benchmarks.startup --runs 7 --check
+"""
+
+# Standard Library
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cumulative import time budget per module (milliseconds, interpreter start-up excluded)
+BUDGETS_MS = {
+    "src.config": 30.0,
+    "src.core.status": 30.0,
+    "src.utils.logger": 60.0,
+    "src.core.fingerprint_service": 200.0,
+}
+# Loaded on first use only (settings access, encryption)
+DEFERRED_MODULES = ("pydantic", "pydantic_settings", "cryptography", "src.config_model")
+
+# Runs inside the child interpreter after the import; reports the side effects as JSON
+PROBE = """
+import json, sys
+from src.config import get_settings
+from src.utils import logger
+print(json.dumps({
+    "settings_loaded": get_settings.loaded(),
+    "log_file_opened": logger._file_handler._file is not None,
+    "deferred_imported": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def _parse_importtime(stderr: str, module: str) -> Dict[str, Tuple[int, int]]:
+    """module and everything it imported -> (self us, cumulative us), from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if self_us.strip().isdigit():
+            depth = len(name) - len(name.lstrip())
+            rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    # children are printed (more indented) right before the module that imported them
+    end = next(i for i, row in enumerate(rows) if row[0] == module)
+    times = {module: rows[end][2:]}
+    for name, depth, self_us, cumulative_us in reversed(rows[:end]):
+        if depth <= rows[end][1]:
+            break
+        times[name] = (self_us, cumulative_us)
+    return times
+
+
+def measure(module: str, runs: int) -> dict:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    totals, heaviest, probe = [], {}, {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}\n" + PROBE % (DEFERRED_MODULES,)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        times = _parse_importtime(proc.stderr, module)
+        totals.append(times[module][1])
+        heaviest = times
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    top = sorted(heaviest.items(), key=lambda item: item[1][0], reverse=True)[:5]
+    return {
+        "median_ms": statistics.median(totals) / 1000,
+        "min_ms": min(totals) / 1000,
+        "top": [(name, self_us / 1000) for name, (self_us, _) in top],
+        **probe,
+    }
+
+
+def check(results: Dict[str, dict], budgets: Dict[str, float], scale: float) -> List[str]:
+    failures = []
+    for module, row in results.items():
+        limit = budgets[module] * scale
+        if row["median_ms"] > limit:
+            failures.append(f"{module}: {row['median_ms']:.1f} ms > {limit:.1f} ms")
+        if row["settings_loaded"]:
+            failures.append(f"{module}: loads the settings at import")
+        if row["log_file_opened"]:
+            failures.append(f"{module}: opens the log file at import")
+        if row["deferred_imported"]:
+            failures.append(f"{module}: imports {', '.join(row['deferred_imported'])}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", action="append", choices=sorted(BUDGETS_MS), help="default: all")
+    parser.add_argument("--check", action="store_true", help="fail when over budget or on import side effects")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply the budgets (slow machines)")
+    args = parser.parse_args(argv)
+
+    results = {module: measure(module, args.runs) for module in args.module or BUDGETS_MS}
+    print(f"{'module':<32}{'median ms':>11}{'min ms':>9}{'budget ms':>11}  heaviest imports (self ms)")
+    for module, row in results.items():
+        top = ", ".join(f"{name} {ms:.1f}" for name, ms in row["top"][:3])
+        budget = BUDGETS_MS[module] * args.budget_scale
+        print(f"{module:<32}{row['median_ms']:>11.1f}{row['min_ms']:>9.1f}{budget:>11.1f}  {top}")
+
+    if not args.check:
+        return 0
+    failures = check(results, BUDGETS_MS, args.budget_scale)
+    print("\nStartup regressions:\n  " + "\n  ".join(failures) if failures else "\nWithin budget.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
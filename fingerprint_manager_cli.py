@@ -7,7 +7,9 @@ from src.core.fingerprint_service import (
     FingerprintError,
     authenticate_with_encrypted,
     check_sensor,
+    close_sensors,
     enroll_fingerprint,
+    identify_fingerprint,
     reset_sensor,
 )
 from src.utils.logger import setup_logger
@@ -78,6 +80,20 @@ async def cli_authenticate():
             print(f"❌ Authentication failed: {e.message}")
 
 
+async def cli_identify():
+    print("\n🔎 Starting Identification...")
+    try:
+        result = await identify_fingerprint()
+        if result.get("status") == "ok":
+            print(f"✅ Identified user: {result['user_id']} (confidence: {result.get('confidence')})")
+        elif result.get("status") == "not found":
+            print("❌ not found fingerprint")
+        else:
+            print(f"❌ Identification failed: {result.get('reason')}")
+    except FingerprintError as e:
+        print(f"❌ Identification failed: {e.message}")
+
+
 async def cli_reset_sensor():
     print("\n⚠️ Resetting fingerprint sensor memory...")
     try:
@@ -99,6 +115,7 @@ async def main():
 [2] Enroll Fingerprint
 [3] Authenticate Fingerprint
 [4] Reset Sensor Memory
+[5] Identify Fingerprint
 [0] Exit
 ------------------------------
 """
@@ -115,8 +132,11 @@ async def main():
             await cli_authenticate()
         elif choice == "4":
             await cli_reset_sensor()
+        elif choice == "5":
+            await cli_identify()
         elif choice == "0":
             print("👋 Exiting...")
+            await close_sensors()
             sys.exit(0)
         else:
             print("❌ Invalid option, please try again.")
@@ -1,54 +1,49 @@
+"""
+Application settings, loaded lazily.
+
+`settings` can be imported anywhere at no cost: the schema (`src.config_model.Settings`,
+pydantic) is imported and the environment / `.env` parsed on the first attribute access.
+Directories are created by the code that writes into them, not at import.
+"""
+
 # Standard Library
-from pathlib import Path
-
-# Third Library
-# THIRDPARTY
-from pydantic_settings import BaseSettings
-
-
-class Settings(BaseSettings):
-    PROJECT_NAME: str = "R503 Fingerprint Manager"
-    # Base paths
-    MAIN_DIR: Path = Path(__file__).resolve().parent.parent
-    DATA_DIR: Path = MAIN_DIR / "data"
-
-    # Paths
-    CAPTURE_TMP_PATH: Path = DATA_DIR / "tmp"
-    LOGGER_PATH: Path = DATA_DIR / "logs"
-    ENCRYPTED_PATH: Path = DATA_DIR / "encrypted"
-
-    # Serial
-    PORT: str = "COM7"
-    BAUDRATE: int = 57600
-
-    # Timeouts
-    SENSOR_TIME_OUT: int = 5
-    CAPTURE_TIME_OUT: int = 20
-
-    # LED Modes
-    LED: dict = {
-        "start": {"color": 7, "mode": 1, "cycle": 0, "speed": 250},
-        "fail": {"color": 1, "mode": 2, "cycle": 20, "speed": 128},
-        "p_finger": {"color": 2, "mode": 3, "cycle": 0, "speed": 128},
-        "r_finger": {"color": 6, "mode": 2, "cycle": 0, "speed": 128},
-        "process": {"color": 3, "mode": 1, "cycle": 0, "speed": 128},
-        "off": {"color": 5, "mode": 4, "cycle": 0, "speed": 128},
-        "success": {"color": 4, "mode": 3, "cycle": 20, "speed": 128},
-    }
-    # Secret Info
-    SECRET_KEY: str
-
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-
-    def ensure_paths(self):
-        """Create all necessary directories"""
-        paths = [self.CAPTURE_TMP_PATH, self.LOGGER_PATH, self.ENCRYPTED_PATH]
-        for path in paths:
-            path.mkdir(parents=True, exist_ok=True)
+from typing import TYPE_CHECKING
+
+from src.utils.lazy import once
+
+if TYPE_CHECKING:
+    from src.config_model import Settings
+
+
+@once
+def get_settings() -> "Settings":
+    """The Settings instance (built on the first call)."""
+    from src.config_model import Settings
+
+    return Settings()
+
+
+class LazySettings:
+    """Stand-in for the Settings instance; attribute reads and writes go to `get_settings()`."""
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(get_settings(), name, value)
+
+    def __repr__(self) -> str:
+        return f"<LazySettings loaded={get_settings.loaded()}>"
 
 
 # Instance
-settings = Settings()
-settings.ensure_paths()
+settings = LazySettings()
+
+
+def __getattr__(name: str):
+    # `from src.config import Settings` keeps working without importing pydantic up front
+    if name == "Settings":
+        from src.config_model import Settings
+
+        return Settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,126 @@
+"""
+Settings schema (environment / `.env`). Imported on first use of `src.config.settings`,
+so modules that only import the config do not pay for pydantic.
+"""
+
+# Standard Library
+from pathlib import Path
+from typing import List, Literal
+
+# Third Library
+# THIRDPARTY
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    PROJECT_NAME: str = "R503 Fingerprint Manager"
+    # Base paths
+    MAIN_DIR: Path = Path(__file__).resolve().parent.parent
+    DATA_DIR: Path = MAIN_DIR / "data"
+
+    # Paths
+    CAPTURE_TMP_PATH: Path = DATA_DIR / "tmp"
+    LOGGER_PATH: Path = DATA_DIR / "logs"
+    ENCRYPTED_PATH: Path = DATA_DIR / "encrypted"
+
+    # Serial
+    PORT: str = "COM7"
+    # Several readers on one host, e.g. PORTS='["/dev/ttyUSB0", "/dev/ttyUSB1"]' (empty: PORT only)
+    PORTS: List[str] = []
+    BAUDRATE: int = 57600
+    # Opt-in link tuning when a session opens: raise the sensor to LINK_BAUDRATE (a multiple
+    # of 9600, at most 115200) and LINK_PACKET_SIZE bytes per data packet (32/64/128/256).
+    # The sensor keeps the rate across power cycles; opening also tries LINK_BAUDRATE.
+    LINK_TUNING: bool = False
+    LINK_BAUDRATE: int = 115200
+    LINK_PACKET_SIZE: int = 256
+    # "thread": blocking pyserial driver run in worker threads, "asyncio": native coroutine transport
+    SENSOR_TRANSPORT: str = "thread"
+
+    # Template storage: "char" (model template, a few hundred bytes) or "image" (raw ~36 KB image)
+    TEMPLATE_FORMAT: str = "char"
+
+    # authenticate_with_encrypted: "verify" (claimed template in char buffer 2, decrypted and
+    # uploaded while the finger is captured, 1:1 compare) or "search" (store the template in
+    # the library, then finger_search over the whole library); other values fail at startup
+    AUTH_MODE: Literal["verify", "search"] = "verify"
+    # Lowest compare_templates score accepted by "verify" (0: the sensor's security level decides)
+    VERIFY_MIN_CONFIDENCE: int = 0
+
+    # Enrollment: ENROLL_SAMPLES captures (2-6, one char buffer each; 2 on firmware that only
+    # merges two) are combined into the model, the finger lifted in between. Every sample
+    # after the first is compared with it and retaken, at most ENROLL_SAMPLE_RETRIES times,
+    # when it does not match (0: no comparison, a mismatch fails at create_model)
+    ENROLL_SAMPLES: int = 2
+    ENROLL_SAMPLE_RETRIES: int = 2
+    # Host-side check of every enrollment capture: the raw image is read back (~36 KB, about
+    # 6 s at 57600 baud, 3 s at 115200) and graded, and a poor one is retaken (at most
+    # ENROLL_QUALITY_RETRIES times) before create_model. Needs the "match" extra.
+    ENROLL_QUALITY_CHECK: bool = False
+    ENROLL_QUALITY_RETRIES: int = 2
+    # Lowest accepted image quality (src.core.image.ImageQuality): share of the sensor
+    # covered by ridges, ridge contrast and sharpness
+    IMAGE_MIN_COVERAGE: float = 0.3
+    IMAGE_MIN_CONTRAST: float = 0.15
+    IMAGE_MIN_SHARPNESS: float = 0.5
+
+    # identify_fingerprint: "sensor" (the gallery is loaded into the sensor library batch by
+    # batch and searched there) or "host" (only the probe is captured; it is matched against
+    # every user in memory, needs the "match" extra). Host matching decodes char templates
+    # with the decoder of HOST_MATCH_LAYOUT, registered by one of the HOST_MATCH_DECODERS
+    # modules; none ships for the R503, the simulator's is HOST_MATCH_LAYOUT="sim" with
+    # HOST_MATCH_DECODERS='["src.sim.minutiae"]'. "host" without a decoder fails at startup.
+    IDENTIFY_MODE: str = "sensor"
+    HOST_MATCH_LAYOUT: str = ""
+    HOST_MATCH_DECODERS: List[str] = []
+    # Lowest host match score (share of minutiae found in both templates, 0-100)
+    HOST_MATCH_THRESHOLD: float = 12.0
+    # Threads scoring blocks of the gallery in parallel (0: one per CPU)
+    HOST_MATCH_WORKERS: int = 0
+
+    # Encrypted template store: "files" (user_<id>.bin per user) or "packed" (one mmap'd
+    # ENCRYPTED_PATH/templates.pack with an index; move data between them with an archive)
+    TEMPLATE_STORE: str = "files"
+
+    # Bulk import/export: crypto worker threads and templates decrypted ahead of the UART
+    BULK_WORKERS: int = 4
+    BULK_PREFETCH: int = 8
+
+    # HTTP front-end (python -m src.http_server). With HTTP_TOKEN set every request needs
+    # "Authorization: Bearer <token>"; keep the default loopback host without one
+    HTTP_HOST: str = "127.0.0.1"
+    HTTP_PORT: int = 8503
+    HTTP_TOKEN: str = ""
+
+    # Timeouts
+    SENSOR_TIME_OUT: int = 5
+    CAPTURE_TIME_OUT: int = 20
+
+    # Capture polling (seconds): fast right after a prompt, backing off while no finger is present
+    CAPTURE_POLL_MIN: float = 0.05
+    CAPTURE_POLL_MAX: float = 0.5
+    CAPTURE_POLL_BACKOFF: float = 1.5
+
+    # LED Modes
+    LED: dict = {
+        "start": {"color": 7, "mode": 1, "cycle": 0, "speed": 250},
+        "fail": {"color": 1, "mode": 2, "cycle": 20, "speed": 128},
+        "p_finger": {"color": 2, "mode": 3, "cycle": 0, "speed": 128},
+        "r_finger": {"color": 6, "mode": 2, "cycle": 0, "speed": 128},
+        "process": {"color": 3, "mode": 1, "cycle": 0, "speed": 128},
+        "off": {"color": 5, "mode": 4, "cycle": 0, "speed": 128},
+        "success": {"color": 4, "mode": 3, "cycle": 20, "speed": 128},
+    }
+    # Seconds the final status LED stays on before an idle pooled sensor is switched off (-1: never)
+    LED_IDLE_OFF_DELAY: float = 3.0
+    # Secret Info
+    SECRET_KEY: str
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+
+    @property
+    def sensor_ports(self) -> List[str]:
+        """Ports of all readers served by this host."""
+        return list(self.PORTS) or [self.PORT]
@@ -0,0 +1,272 @@
+# Standard Library
+import asyncio
+import functools
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+# Third Library
+import adafruit_fingerprint
+
+from src.core import protocol
+from src.core.transport import SerialStream, open_serial_stream
+
+
+def _uninterruptible(method):
+    """
+    Let a started request/reply exchange finish even when the awaiting task is cancelled.
+    Abandoning it halfway would leave its reply (or the rest of a data transfer) on the
+    link for the next exchange to read; the caller still gets the CancelledError at once.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        exchange = asyncio.ensure_future(method(*args, **kwargs))
+        exchange.add_done_callback(_consume_result)
+        return await asyncio.shield(exchange)
+
+    return wrapper
+
+
+def _consume_result(exchange: asyncio.Future) -> None:
+    # an orphaned exchange's error has nobody to report to
+    if not exchange.cancelled():
+        exchange.exception()
+
+
+class AsyncFingerprint:
+    """
+    Coroutine implementation of the R503 packet protocol.
+
+    Mirrors the subset of `adafruit_fingerprint.Adafruit_Fingerprint` used by the services
+    (same method names, return codes and attributes), but every exchange is awaited on
+    an asyncio stream instead of blocking a thread. Replies are checksum-verified.
+    """
+
+    def __init__(self, stream: SerialStream, password: Tuple[int, int, int, int] = (0, 0, 0, 0)):
+        self._stream = stream
+        self.password = password
+        self.address = protocol.DEFAULT_ADDRESS
+        self.finger_id: Optional[int] = None
+        self.confidence: Optional[int] = None
+        self.templates: List[int] = []
+        self.template_count: Optional[int] = None
+        self.library_size: Optional[int] = None
+        self.security_level: Optional[int] = None
+        self.device_address: Optional[bytes] = None
+        self.data_packet_size: Optional[int] = None
+        self.baudrate: Optional[int] = None
+        self.system_id: Optional[int] = None
+        self.status_register: Optional[int] = None
+        # one request/reply exchange at a time on the link
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, port: str, baudrate: int) -> "AsyncFingerprint":
+        """Open port and perform the handshake (verify password + read system parameters)."""
+        stream = await open_serial_stream(port, baudrate)
+        sensor = cls(stream)
+        try:
+            if await sensor.verify_password() != adafruit_fingerprint.OK:
+                raise RuntimeError("Failed to find sensor, check wiring!")
+            await sensor.read_sysparam()
+        except Exception:
+            stream.close()
+            raise
+        return sensor
+
+    @property
+    def stream(self) -> SerialStream:
+        return self._stream
+
+    # -------------------------
+    #   Packet exchange
+    # -------------------------
+    async def _send_packet(self, data: Sequence[int]) -> None:
+        await self._stream.write(protocol.encode_packet(protocol.COMMANDPACKET, data, self.address))
+
+    async def _read_packet(self) -> Tuple[int, bytes]:
+        header = await self._stream.read_exactly(protocol.HEADER_SIZE)
+        packet_type, length = protocol.decode_header(header, self.address)
+        body = await self._stream.read_exactly(length)
+        return packet_type, protocol.verify_body(packet_type, length, body)
+
+    async def _get_packet(self) -> bytes:
+        packet_type, payload = await self._read_packet()
+        if packet_type != protocol.ACKPACKET:
+            raise RuntimeError("Incorrect packet data")
+        return payload
+
+    @_uninterruptible
+    async def _command(self, data: Sequence[int]) -> bytes:
+        async with self._lock:
+            await self._send_packet(data)
+            return await self._get_packet()
+
+    async def _get_data(self) -> bytearray:
+        data = bytearray()
+        while True:
+            packet_type, payload = await self._read_packet()
+            if packet_type not in (protocol.DATAPACKET, protocol.ENDDATAPACKET):
+                raise RuntimeError("Incorrect packet data")
+            data += payload
+            if packet_type == protocol.ENDDATAPACKET:
+                return data
+
+    async def _send_data(self, data: bytes) -> None:
+        size = protocol.PACKET_SIZES.get(self.data_packet_size, 32)
+        for packet in protocol.encode_data(data, size, self.address):
+            await self._stream.write(packet)
+
+    # -------------------------
+    #   Commands
+    # -------------------------
+    async def verify_password(self) -> int:
+        return (await self._command([protocol.VERIFYPASSWORD, *self.password]))[0]
+
+    async def check_module(self) -> bool:
+        if (await self._command([protocol.GETECHO]))[0] != adafruit_fingerprint.MODULEOK:
+            raise RuntimeError("Something is wrong with the sensor.")
+        return True
+
+    async def count_templates(self) -> int:
+        r = await self._command([protocol.TEMPLATECOUNT])
+        self.template_count = struct.unpack(">H", r[1:3])[0]
+        return r[0]
+
+    async def read_sysparam(self) -> int:
+        r = await self._command([protocol.READSYSPARA])
+        if r[0] != adafruit_fingerprint.OK:
+            raise RuntimeError("Command failed.")
+        (
+            self.status_register,
+            self.system_id,
+            self.library_size,
+            self.security_level,
+        ) = struct.unpack(">HHHH", r[1:9])
+        self.device_address = bytes(r[9:13])
+        self.data_packet_size, self.baudrate = struct.unpack(">HH", r[13:17])
+        return r[0]
+
+    async def set_sysparam(self, param_num: int, param_val: int) -> int:
+        r = await self._command([protocol.SETSYSPARA, param_num, param_val])
+        if r[0] != adafruit_fingerprint.OK:
+            raise RuntimeError("Command failed.")
+        if param_num == protocol.PARAM_BAUDRATE:
+            self.baudrate = param_val
+        elif param_num == protocol.PARAM_SECURITY_LEVEL:
+            self.security_level = param_val
+        elif param_num == protocol.PARAM_PACKET_SIZE:
+            self.data_packet_size = param_val
+        return r[0]
+
+    async def tune_link(self, baudrate: int, packet_size: int) -> Tuple[int, int]:
+        """Coroutine version of R503Fingerprint.tune_link."""
+        size_code = protocol.packet_size_code(packet_size)
+        rate_code = protocol.baudrate_code(baudrate)
+        if size_code > self.data_packet_size:
+            await self.set_sysparam(protocol.PARAM_PACKET_SIZE, size_code)
+        if rate_code > self.baudrate:
+            previous = self._stream.baudrate
+            await self.set_sysparam(protocol.PARAM_BAUDRATE, rate_code)
+            self._stream.set_baudrate(baudrate)
+            if not await self._answers():
+                self._stream.set_baudrate(previous)
+                if not await self._answers():
+                    raise RuntimeError("Sensor not answering after baud rate change")
+                await self.read_sysparam()
+        return self._stream.baudrate, protocol.PACKET_SIZES.get(self.data_packet_size, 32)
+
+    async def _answers(self) -> bool:
+        self._stream.reset_input_buffer()
+        try:
+            return await self.verify_password() == adafruit_fingerprint.OK
+        except RuntimeError:
+            return False
+
+    async def get_image(self) -> int:
+        return (await self._command([protocol.GETIMAGE]))[0]
+
+    async def image_2_tz(self, slot: int = 1) -> int:
+        return (await self._command([protocol.IMAGE2TZ, slot]))[0]
+
+    async def create_model(self) -> int:
+        return (await self._command([protocol.REGMODEL]))[0]
+
+    async def store_model(self, location: int, slot: int = 1) -> int:
+        return (await self._command([protocol.STORE, slot, location >> 8, location & 0xFF]))[0]
+
+    async def delete_model(self, location: int) -> int:
+        return (await self._command([protocol.DELETE, location >> 8, location & 0xFF, 0x00, 0x01]))[0]
+
+    async def load_model(self, location: int, slot: int = 1) -> int:
+        return (await self._command([protocol.LOAD, slot, location >> 8, location & 0xFF]))[0]
+
+    @_uninterruptible
+    async def get_fpdata(self, sensorbuffer: str = "char", slot: int = 1) -> bytes:
+        if slot not in {1, 2}:
+            slot = 2
+        if sensorbuffer == "image":
+            command = [protocol.UPLOADIMAGE]
+        elif sensorbuffer == "char":
+            command = [protocol.UPLOAD, slot]
+        else:
+            raise RuntimeError("Unknown sensor buffer type")
+        async with self._lock:
+            await self._send_packet(command)
+            if (await self._get_packet())[0] != adafruit_fingerprint.OK:
+                raise RuntimeError("Failed to read data from sensor")
+            return bytes(await self._get_data())
+
+    @_uninterruptible
+    async def send_fpdata(self, data: bytes, sensorbuffer: str = "char", slot: int = 1) -> bool:
+        if slot not in {1, 2}:
+            slot = 2
+        if sensorbuffer == "image":
+            command = [protocol.DOWNLOADIMAGE]
+        elif sensorbuffer == "char":
+            command = [protocol.DOWNLOAD, slot]
+        else:
+            raise RuntimeError("Unknown sensor buffer type")
+        async with self._lock:
+            await self._send_packet(command)
+            if (await self._get_packet())[0] != adafruit_fingerprint.OK:
+                return False
+            await self._send_data(data)
+        return True
+
+    async def empty_library(self) -> int:
+        return (await self._command([protocol.EMPTY]))[0]
+
+    async def read_templates(self) -> int:
+        self.templates = []
+        await self.read_sysparam()
+        result = adafruit_fingerprint.OK
+        for page in range(protocol.template_pages(self.library_size)):
+            r = await self._command([protocol.TEMPLATEREAD, page])
+            result = r[0]
+            if r[0] == adafruit_fingerprint.OK:
+                self.templates.extend(protocol.parse_index_page(page, r[1:33]))
+        return result
+
+    async def finger_search(self) -> int:
+        capacity = self.library_size
+        r = await self._command([protocol.FINGERPRINTSEARCH, 0x01, 0x00, 0x00, capacity >> 8, capacity & 0xFF])
+        self.finger_id, self.confidence = struct.unpack(">HH", r[1:5])
+        return r[0]
+
+    async def finger_fast_search(self) -> int:
+        capacity = self.library_size
+        r = await self._command([protocol.HISPEEDSEARCH, 0x01, 0x00, 0x00, capacity >> 8, capacity & 0xFF])
+        self.finger_id, self.confidence = struct.unpack(">HH", r[1:5])
+        return r[0]
+
+    async def compare_templates(self) -> int:
+        r = await self._command([protocol.COMPARE])
+        self.confidence = struct.unpack(">H", r[1:3])[0]
+        return r[0]
+
+    async def set_led(self, color: int = 1, mode: int = 3, speed: int = 0x80, cycles: int = 0) -> int:
+        return (await self._command([protocol.SETAURA, mode, speed, color, cycles]))[0]
+
+    def close_uart(self) -> None:
+        self._stream.close()
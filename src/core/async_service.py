@@ -0,0 +1,140 @@
+# Standard Library
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.core.async_sensor import AsyncFingerprint
+from src.core.enroll_service import FingerEnrollService
+from src.core.flow import Flow, Op, T
+from src.core.identify_service import GalleryEntry, IdentifyService, TemplateLoader
+from src.core.sensor_service import FingerprintSensorError, FingerprintSensorService
+from src.core.status import SensorStatus
+from src.core.template import Template
+from src.utils.logger import setup_logger
+
+
+class AsyncFingerprintSensorService(FingerprintSensorService):
+    """
+    Coroutine counterpart of FingerprintSensorService for an `AsyncFingerprint` sensor.
+
+    The flows (capture, enrollment, identification; see src/core/flow.py) are the ones of
+    the threaded services, only run by a driver that awaits their I/O, so a waiting
+    capture holds no thread. The connection itself is owned by the session pool.
+    """
+
+    def __init__(
+        self,
+        port: Optional[str] = None,
+        baudrate: Optional[int] = None,
+        on_status: Optional[Callable[[SensorStatus], None]] = None,
+        sensor: Optional[AsyncFingerprint] = None,
+    ):
+        if sensor is None:
+            raise FingerprintSensorError("Async services need an open AsyncFingerprint sensor")
+        super().__init__(port=port, baudrate=baudrate, on_status=on_status, sensor=sensor)
+        self.logger = setup_logger("AsyncFingerprintSensor")
+
+    # -------------------------
+    #   Flow Driver
+    # -------------------------
+    async def _run(self, steps: Flow[T]) -> T:
+        """Run a flow awaiting its I/O; cancelling the task cancels the exchange in progress."""
+        result, error = None, None
+        while True:
+            try:
+                op = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = await self._perform(op), None
+            except BaseException as e:
+                result, error = None, e
+
+    async def _perform(self, op: Op):
+        if op.kind == "sensor":
+            return await getattr(self._sensor, op.target)(*op.args)
+        if op.kind == "sleep":
+            return await asyncio.sleep(*op.args)
+        if op.kind == "flush_led":
+            return await self.led.flush_async()
+        if op.kind == "blocking":
+            return await asyncio.to_thread(op.target, *op.args)
+        if op.kind == "start":
+            return asyncio.ensure_future(asyncio.to_thread(op.target, *op.args))
+        if op.kind == "wait":
+            return await op.target
+        raise ValueError(f"Unknown flow op {op.kind!r}")
+
+    # -------------------------
+    #   Sensor Core Methods
+    # -------------------------
+    async def capture(
+        self,
+        timeout: int = 5,
+        buffer: int = 1,
+        prompted: bool = False,
+        idle: Optional[Callable[[], Flow[bool]]] = None,
+    ) -> bool:
+        return await self._run(self._capture(timeout, buffer, prompted, idle))
+
+    async def wait_for_lift(self, timeout: int = 5) -> bool:
+        return await self._run(self._wait_for_lift(timeout))
+
+    async def sync_library(self, force: bool = False) -> None:
+        return await self._run(self._sync_library(force))
+
+    async def config_led(self, mode: Dict) -> None:
+        await self.led.apply_async(mode)
+
+    async def clear_library(self) -> bool:
+        return await self._run(self._clear_library())
+
+    async def close(self):
+        """Show the last queued status; the pooled connection stays open."""
+        try:
+            await self.led.flush_async()
+        except Exception:
+            pass
+
+    def __del__(self):
+        pass
+
+
+class AsyncEnrollService(AsyncFingerprintSensorService, FingerEnrollService):
+    """Coroutine counterpart of FingerEnrollService."""
+
+    async def enroll_finger(self) -> Dict:
+        return await self._run(self._enroll_finger())
+
+
+class AsyncIdentifyService(AsyncFingerprintSensorService, IdentifyService):
+    """Coroutine counterpart of IdentifyService; loaders and the gallery iterator run in a thread."""
+
+    async def upload_to_sensor(self, template: Template):
+        return await self._run(self._upload_to_sensor(template))
+
+    async def load_template(
+        self,
+        key: str,
+        content_hash: str,
+        loader: TemplateLoader,
+        evict: bool = True,
+    ):
+        return await self._run(self._load_template(key, content_hash, loader, evict))
+
+    async def occupied_slots(self) -> List[int]:
+        return await self._run(self._occupied_slots())
+
+    async def download_slot(self, loc_id: int) -> Optional[Template]:
+        return await self._run(self._download_slot(loc_id))
+
+    async def authenticate(self):
+        return await self._run(self._authenticate())
+
+    async def verify(self, loader: TemplateLoader, key: Optional[str] = None, content_hash: Optional[str] = None):
+        return await self._run(self._verify(loader, key, content_hash))
+
+    async def capture_probe(self):
+        return await self._run(self._capture_probe())
+
+    async def identify(self, gallery: Iterable[GalleryEntry]):
+        return await self._run(self._identify(gallery))
@@ -0,0 +1,40 @@
+# Standard Library
+import threading
+
+
+class OperationCancelled(BaseException):
+    """
+    Raised inside a sensor service once its cancel token is set. Like asyncio.CancelledError
+    it is a BaseException, so the services' `except Exception` handlers do not turn an abort
+    into a FAIL response.
+    """
+
+
+class CancelToken:
+    """
+    Cooperative cancel flag of one sensor service (thread-safe).
+
+    Blocking services check it between sensor commands and wait on it instead of
+    sleeping, so a cancelled request stops within one poll interval instead of running
+    until its capture timeout. Set by `session_pool.call` when the awaiting task is cancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        """Raise OperationCancelled if the token was cancelled."""
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def sleep(self, seconds: float) -> None:
+        """time.sleep that ends early, with OperationCancelled, when the token is cancelled."""
+        if self._event.wait(seconds):
+            raise OperationCancelled()
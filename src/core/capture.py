@@ -0,0 +1,47 @@
+# Standard Library
+from dataclasses import dataclass
+from typing import Optional
+
+from src.config import settings
+
+
+class PollSchedule:
+    """
+    Adaptive delay between `get_image` polls.
+
+    Polling starts fast right after the user is prompted (when a finger is most likely
+    to arrive) and backs off geometrically up to `maximum` while nobody shows up.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[float] = None,
+        maximum: Optional[float] = None,
+        backoff: Optional[float] = None,
+    ):
+        self.initial = settings.CAPTURE_POLL_MIN if initial is None else initial
+        self.maximum = settings.CAPTURE_POLL_MAX if maximum is None else maximum
+        self.backoff = settings.CAPTURE_POLL_BACKOFF if backoff is None else backoff
+        self._delay = self.initial
+
+    def reset(self):
+        """Go back to fast polling (e.g. after a new prompt)."""
+        self._delay = self.initial
+
+    def next_delay(self) -> float:
+        delay = self._delay
+        self._delay = min(self._delay * self.backoff, self.maximum)
+        return delay
+
+
+@dataclass
+class CaptureStats:
+    """Timing of one `capture` call, in seconds since the call started."""
+
+    buffer: int
+    success: bool = False
+    polls: int = 0
+    nofinger_polls: int = 0
+    prompts: int = 0
+    first_image: Optional[float] = None  # time-to-first-image (capture latency)
+    duration: Optional[float] = None
@@ -1,14 +1,18 @@
 # Standard Library
-import time
 from typing import Callable, Dict, Optional
 
 # Third Library
 import adafruit_fingerprint
 
 from src.config import settings
+from src.core import flow
+from src.core.enrollment import EnrollmentPlan
+from src.core.flow import Flow
 from src.core.sensor_service import FingerprintSensorError, FingerprintSensorService
 from src.core.status import SensorStatus
+from src.core.template import Template, get_template_format
 from src.utils.logger import setup_logger
+from src.utils.metrics import metrics
 
 
 class FingerEnrollService(FingerprintSensorService):
@@ -22,8 +26,9 @@ class FingerEnrollService(FingerprintSensorService):
         port: Optional[str] = None,
         baudrate: Optional[int] = None,
         on_status: Optional[Callable] = None,
+        sensor: Optional[adafruit_fingerprint.Adafruit_Fingerprint] = None,
     ):
-        super().__init__(port, baudrate, on_status)
+        super().__init__(port, baudrate, on_status, sensor)
         self.logger = setup_logger("FingerEnrollService")
 
     # -----------------------------
@@ -32,35 +37,41 @@ class FingerEnrollService(FingerprintSensorService):
 
     def enroll_finger(self) -> Dict:
         """
-        Enroll fingerprint.
+        Enroll fingerprint: settings.ENROLL_SAMPLES captures of the same finger, lifted in
+        between, merged into one model (see src/core/enrollment.py).
 
-        Returns a dict with status and message.
+        Returns a dict with status and message. On success `template` holds the model
+        template (or the raw image, depending on settings.TEMPLATE_FORMAT) as a Template.
         """
-        try:
-            self.logger.info("🟢 Starting fingerprint enrollment")
-
-            # Step 1 - Ask to place finger
-            self.send(SensorStatus.PLACE_FINGER, message="Place your finger on the sensor")
-
-            if not self.capture(settings.CAPTURE_TIME_OUT, buffer=1):
-                return self.send(SensorStatus.FAIL, "Failed to read first image")
-            # Step 2: Remove finger
-            self.send(SensorStatus.REMOVE_FINGER, message="Remove your finger")
-            time.sleep(2)
+        return self._run(self._enroll_finger())
 
-            # Step 3: Place same finger again
-            self.send(SensorStatus.PLACE_SAME_FINGER, message="Place the same finger again")
+    def _enroll_finger(self) -> Flow[Dict]:
+        try:
+            plan = EnrollmentPlan.from_settings()
+            self.logger.info("🟢 Starting fingerprint enrollment (%d samples)", plan.samples)
 
-            if not self.capture(settings.CAPTURE_TIME_OUT, buffer=2):
-                return self.send(SensorStatus.FAIL, message="Failed to read second image")
+            for sample in range(1, plan.samples + 1):
+                if sample > 1:
+                    self.send(SensorStatus.REMOVE_FINGER, message="Remove your finger")
+                    if not (yield from self._wait_for_lift(settings.CAPTURE_TIME_OUT)):
+                        return self.send(SensorStatus.FAIL, message="Finger was not removed")
+                failed = yield from self._take_sample(plan, sample)
+                if failed:
+                    return failed
 
-            # Step 4: Combine model
+            # Combine the samples into the model
             self.send(SensorStatus.PROCESSING, message="Combining fingerprint images...")
-            status = self._sensor.create_model()
-            # Step 5: Handle results
+            with self.span("create_model"):
+                status = yield flow.sensor("create_model")
             if status == adafruit_fingerprint.OK:
-                raw_data = self._sensor.get_fpdata("image", slot=1)
-                return self.send(SensorStatus.SUCCESS, message="Enrollment successful", data=raw_data)
+                data_format = get_template_format(settings.TEMPLATE_FORMAT)
+                with self.span("transfer_from_sensor"):
+                    raw_data = yield flow.sensor("get_fpdata", data_format.sensor_buffer, 1)
+                return self.send(
+                    SensorStatus.SUCCESS,
+                    message="Enrollment successful",
+                    template=Template(raw_data, data_format),
+                )
             if status == adafruit_fingerprint.ENROLLMISMATCH:
                 return self.send(SensorStatus.ENROLLMISMATCH, message="Fingerprints not matched")
             return self.send(SensorStatus.FAIL, message=f"Model creation failed (code: {status})")
@@ -70,3 +81,53 @@ class FingerEnrollService(FingerprintSensorService):
 
         except Exception as e:
             return self.send(SensorStatus.FAIL, message=f"Unexpected error: {e}")
+
+    def _take_sample(self, plan: EnrollmentPlan, sample: int) -> Flow[Optional[Dict]]:
+        """
+        Capture sample into its char buffer; a later sample that does not match the first
+        one is retaken (plan.retries times). Returns the failure response, None on success.
+        """
+        attempts = plan.attempts(sample)
+        for attempt in range(attempts):
+            status, message = plan.prompt(sample)
+            if not (yield from self._capture_sample(plan.capture_buffer(sample), status, message)):
+                return self.send(SensorStatus.FAIL, message=f"Failed to read image {sample} of {plan.samples}")
+            if plan.checked(sample) and not (yield from self._matches_first()):
+                metrics.inc("enroll_retakes_total", port=self._port)
+                if attempt + 1 == attempts:
+                    return self.send(SensorStatus.ENROLLMISMATCH, message="Fingerprints not matched")
+                self.send(SensorStatus.REMOVE_FINGER, message="Not the same finger, remove your finger")
+                if not (yield from self._wait_for_lift(settings.CAPTURE_TIME_OUT)):
+                    return self.send(SensorStatus.FAIL, message="Finger was not removed")
+                continue
+            keep = plan.keep_buffer(sample)
+            if keep is not None and not (yield from self._template(keep)):
+                return self.send(SensorStatus.FAIL, message=f"Failed to keep image {sample} of {plan.samples}")
+            return None
+
+    def _matches_first(self) -> Flow[bool]:
+        """Compare the sample in char buffer 2 with the first one in buffer 1."""
+        with self.span("compare"):
+            return (yield flow.sensor("compare_templates")) == adafruit_fingerprint.OK
+
+    def _capture_sample(self, buffer: int, prompt: SensorStatus, message: str) -> Flow[bool]:
+        """
+        Prompt and capture into char `buffer`. With settings.ENROLL_QUALITY_CHECK the image
+        is read back and graded on the host, and a poor one is taken again.
+        """
+        attempts = 1 + (settings.ENROLL_QUALITY_RETRIES if settings.ENROLL_QUALITY_CHECK else 0)
+        for attempt in range(attempts):
+            self.send(prompt, message=message)
+            if not (yield from self._capture(settings.CAPTURE_TIME_OUT, buffer=buffer, prompted=True)):
+                return False
+            if not settings.ENROLL_QUALITY_CHECK:
+                return True
+            with self.span("transfer_from_sensor"):
+                data = yield flow.sensor("get_fpdata", "image")
+            problems = yield flow.blocking(self._image_problems, data)
+            if not problems:
+                return True
+            self.send(SensorStatus.REMOVE_FINGER, message=f"Poor image ({', '.join(problems)}), remove your finger")
+            if attempt + 1 < attempts and not (yield from self._wait_for_lift(settings.CAPTURE_TIME_OUT)):
+                return False
+        return False
@@ -0,0 +1,59 @@
+"""
+Multi-sample enrollment plan shared by the threaded and asyncio enroll services.
+
+REGMODEL merges the char buffers filled during an enrollment into one model; the R503
+has six (CharBuffer1-6; keep ENROLL_SAMPLES=2 on firmware that only merges buffers 1
+and 2). Every sample after the first is extracted into buffer 2 and compared with sample
+1 (COMPARE only sees buffers 1 and 2), so a sample of another finger or a bad placement
+is retaken on its own instead of failing the whole enrollment at REGMODEL. An accepted
+sample that is not the last one is extracted again, from the image buffer, into a buffer
+of its own (3-6) to free buffer 2 for the next one.
+"""
+
+# Standard Library
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from src.config import settings
+from src.core.status import SensorStatus
+
+MAX_SAMPLES = 6
+
+
+@dataclass(frozen=True)
+class EnrollmentPlan:
+    """How many samples an enrollment takes, which char buffer each ends up in and how it is prompted."""
+
+    samples: int = 2
+    retries: int = 2  # retakes of a sample that does not match the first one (0: not compared)
+
+    def __post_init__(self):
+        if not 2 <= self.samples <= MAX_SAMPLES:
+            raise ValueError(f"ENROLL_SAMPLES must be between 2 and {MAX_SAMPLES}, got {self.samples}")
+
+    @classmethod
+    def from_settings(cls) -> "EnrollmentPlan":
+        return cls(settings.ENROLL_SAMPLES, max(settings.ENROLL_SAMPLE_RETRIES, 0))
+
+    @staticmethod
+    def capture_buffer(sample: int) -> int:
+        """Char buffer sample (1-based) is extracted into."""
+        return 1 if sample == 1 else 2
+
+    def checked(self, sample: int) -> bool:
+        """Whether sample is compared with the first one."""
+        return sample > 1 and self.retries > 0
+
+    def keep_buffer(self, sample: int) -> Optional[int]:
+        """Buffer an accepted sample is moved to (None: it stays in its capture buffer)."""
+        return sample + 1 if 1 < sample < self.samples else None
+
+    def attempts(self, sample: int) -> int:
+        return 1 + (self.retries if self.checked(sample) else 0)
+
+    def prompt(self, sample: int) -> Tuple[SensorStatus, str]:
+        if sample == 1:
+            return SensorStatus.PLACE_FINGER, "Place your finger on the sensor"
+        if self.samples == 2:
+            return SensorStatus.PLACE_SAME_FINGER, "Place the same finger again"
+        return SensorStatus.PLACE_SAME_FINGER, f"Place the same finger again ({sample}/{self.samples})"
@@ -1,22 +1,41 @@
 # Standard Library
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+import functools
+import hashlib
+import json
+import os
 from pathlib import Path
 import re
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+import zipfile
 
 from src.config import settings
 from src.core.enroll_service import FingerEnrollService
 from src.core.identify_service import IdentifyService
+from src.core.session_pool import call, sensor_pool
 from src.core.status import SensorStatus
-from src.utils.encrypt import Encrypt
+from src.core.template import Template
 from src.utils.logger import setup_logger
+from src.utils.metrics import metrics
+from src.utils.lazy import once
+from src.utils.template_store import TemplateStore, open_store
+
+if TYPE_CHECKING:
+    from src.core.matcher import GalleryIndex
+    from src.utils.encrypt import Encrypt
 
 logger = setup_logger("FingerprintManager")
-encryptor = Encrypt()
 
 USER_ID_RE = re.compile(r"^[a-zA-Z0-9_\-]+$")
 
+# on_status(status, message): called for every SensorStatus the sensor services send,
+# from a worker thread with the "thread" transport
+StatusCallback = Callable[[SensorStatus, str], None]
+
 
 # -------------------------------------------------------------------
 # Custom Exceptions
@@ -34,38 +53,163 @@ class FingerprintError(Exception):
 # -------------------------------------------------------------------
 # Utility Functions
 # -------------------------------------------------------------------
-def _ensure_path(path: Path):
-    """Make sure parent directories exist."""
-    path.parent.mkdir(parents=True, exist_ok=True)
+@once
+def _encryptor() -> "Encrypt":
+    # cryptography is only imported once something is encrypted or decrypted
+    from src.utils.encrypt import Encrypt
 
+    return Encrypt()
 
-@asynccontextmanager
-async def _fingerprint_service(service_cls):
-    """Async context manager for safe use of fingerprint services."""
-    service = None
+
+@once
+def _template_store() -> TemplateStore:
+    return open_store(settings.TEMPLATE_STORE, settings.ENCRYPTED_PATH)
+
+
+def _stored_user_ids(user_ids: Optional[Iterable[str]] = None) -> List[str]:
+    """Stored users among user_ids (invalid ids skipped), or all of them. Blocking: scans the store."""
+    store = _template_store()
+    if user_ids is None:
+        return store.user_ids()
+    return [user_id for user_id in user_ids if USER_ID_RE.match(user_id) and user_id in store]
+
+
+def _decrypt_template(blob: bytes, source: object) -> Template:
+    with metrics.span("decrypt"):
+        data_format, data = _encryptor().decrypt_bytes(blob, settings.SECRET_KEY, source=source)
+    return Template(data, data_format)
+
+
+def _iter_gallery():
+    """Yield (user_id, template) for every stored template, decrypting lazily."""
+    for user_id, blob in _template_store().items():
+        try:
+            template = _decrypt_template(blob, user_id)
+        except Exception:
+            logger.exception("Skipping unreadable template of %s", user_id)
+            continue
+        yield user_id, template
+
+
+# Host matching index (IDENTIFY_MODE = "host"), built from the store on first use and kept
+# in step with every template saved afterwards
+_gallery: Optional["GalleryIndex"] = None
+_gallery_lock = threading.Lock()
+
+
+def check_host_matching() -> None:
+    """
+    With IDENTIFY_MODE = "host", make sure HOST_MATCH_LAYOUT can be decoded: run at startup
+    so a missing decoder or "match" extra fails there rather than on every identification.
+    """
+    if settings.IDENTIFY_MODE != "host":
+        return
     try:
-        service = service_cls()
-        yield service
-    finally:
-        if service:
+        # optional dependency ("match" extra)
+        from src.core.matcher import get_decoder, load_decoders
+
+        load_decoders(settings.HOST_MATCH_DECODERS)
+        get_decoder(settings.HOST_MATCH_LAYOUT)
+    except (ImportError, ValueError) as e:
+        raise FingerprintError(f"IDENTIFY_MODE=host is not usable: {e}", 500)
+
+
+def _index_template(index: "GalleryIndex", user_id: str, template: Template) -> bool:
+    try:
+        index.put(user_id, template)
+        return True
+    except ValueError as e:
+        # a re-enrolled user must not keep matching with the template it replaced
+        index.remove(user_id)
+        logger.warning("Template of %s not indexed for host matching: %s", user_id, e)
+        return False
+
+
+def _gallery_index() -> "GalleryIndex":
+    global _gallery
+    # held while building so templates saved meanwhile are indexed once it is ready
+    with _gallery_lock:
+        if _gallery is None:
+            check_host_matching()
+            from src.core.matcher import GalleryIndex
+
+            index = GalleryIndex(settings.HOST_MATCH_LAYOUT, workers=settings.HOST_MATCH_WORKERS)
+            with metrics.span("index_gallery"):
+                skipped = sum(not _index_template(index, *entry) for entry in _iter_gallery())
+            logger.info("Host matching index built: %d users, %d skipped", len(index), skipped)
+            _gallery = index
+        return _gallery
+
+
+def _update_gallery_index(user_id: str, template: Template):
+    with _gallery_lock:
+        if _gallery is not None:
+            _index_template(_gallery, user_id, template)
+
+
+def _store_template(user_id: str, template: Template, overwrite: bool = True) -> bool:
+    """Encrypt template and save it for user_id; False when it exists and overwrite is off."""
+    if not overwrite and user_id in _template_store():
+        return False
+    with metrics.span("encrypt"):
+        blob = _encryptor().encrypt_bytes(template.data, settings.SECRET_KEY, template.format)
+    _template_store().put(user_id, blob)
+    _update_gallery_index(user_id, template)
+    return True
+
+
+def _tracked(operation: str):
+    """Count (requests_total) and time (stage_seconds) a public operation by result status."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            status = "error"
             try:
-                await asyncio.to_thread(service.close)
-            except Exception:
-                logger.exception("Error closing fingerprint service (ignored).")
+                with metrics.span(operation):
+                    result = await func(*args, **kwargs)
+                status = result.get("status", "ok")
+                return result
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                metrics.inc("requests_total", operation=operation, status=status)
+
+        return wrapper
+
+    return decorator
+
+
+@asynccontextmanager
+async def _fingerprint_service(service_cls, port: Optional[str] = None, on_status: Optional[StatusCallback] = None):
+    """
+    Async context manager handing out a service bound to a pooled sensor session.
+    Without a port the least busy reader (settings.sensor_ports) is used.
+    """
+    async with sensor_pool.checkout(service_cls, port, on_status) as service:
+        yield service
+
+
+async def close_sensors():
+    """Close every pooled sensor connection (call on shutdown)."""
+    # on the event loop thread: asyncio transports must be closed by their own loop
+    sensor_pool.close_all()
 
 
 # -------------------------------------------------------------------
 # 1. Check Sensor Connection
 # -------------------------------------------------------------------
-async def check_sensor():
+@_tracked("check_sensor")
+async def check_sensor(port: Optional[str] = None, on_status: Optional[StatusCallback] = None):
     """
     Check if the fingerprint sensor is connected and responding.
     """
     try:
-        async with _fingerprint_service(FingerEnrollService) as service:
-            templates = await asyncio.to_thread(service._sensor.read_templates)
+        async with _fingerprint_service(FingerEnrollService, port, on_status) as service:
+            templates = await call(service._sensor.read_templates)
             connected = templates is not None
-            info = await asyncio.to_thread(service.get_sensor_info) if connected else None
+            info = await call(service.get_sensor_info) if connected else None
             return {"status": "ok" if connected else "error", "sensor": info}
     except Exception as e:
         logger.exception("Sensor status check failed: %s", e)
@@ -75,44 +219,42 @@ async def check_sensor():
 # -------------------------------------------------------------------
 # 2. Capture fingerprint and encrypt it
 # -------------------------------------------------------------------
-async def enroll_fingerprint(user_id: str):
+async def _capture_enrollment(service, user_id: str) -> Template:
+    """Run the enrollment flow on service and return the template; raises FingerprintError."""
+    result = await call(service.enroll_finger)
+
+    status = result.get("status")
+    if status != SensorStatus.SUCCESS:
+        msg = result.get("message") or status
+        logger.warning("Enrollment failed for user %s: %s", user_id, msg)
+        raise FingerprintError(f"Enrollment failed: {msg}", 400)
+
+    template = result.get("template")
+    if not template:
+        raise FingerprintError("No fingerprint data returned from sensor", 500)
+    return template
+
+
+@_tracked("enroll")
+async def enroll_fingerprint(user_id: str, port: Optional[str] = None, on_status: Optional[StatusCallback] = None):
     """
     Capture fingerprint from sensor and return encrypted data.
-    File saved at `encrypted/user_<id>.bin`
+    Saved in the template store (`encrypted/user_<id>.bin` with the "files" backend).
     """
     if not USER_ID_RE.match(user_id):
         raise FingerprintError("Invalid user_id format", 400)
 
-    filepath = Path(settings.ENCRYPTED_PATH) / f"user_{user_id}.bin"
-    _ensure_path(filepath)
-
     try:
-        async with _fingerprint_service(FingerEnrollService) as service:
-            result = await asyncio.to_thread(service.enroll_finger)
-
-            status = result.get("status")
-            if status != SensorStatus.SUCCESS:
-                msg = result.get("message") or status
-                logger.warning("Enrollment failed for user %s: %s", user_id, msg)
-                raise FingerprintError(f"Enrollment failed: {msg}", 400)
-
-            fingerprint_data = result.get("data")
-            if not fingerprint_data:
-                raise FingerprintError("No fingerprint data returned from sensor", 500)
-
-            fingerprint_bytes = bytes(fingerprint_data)
-            await asyncio.to_thread(
-                encryptor.encrypt_to_file,
-                filepath,
-                fingerprint_bytes,
-                settings.SECRET_KEY,
-            )
-
-            logger.info("Encrypted fingerprint saved for user %s at %s", user_id, str(filepath))
+        async with _fingerprint_service(FingerEnrollService, port, on_status) as service:
+            template = await _capture_enrollment(service, user_id)
+            await asyncio.to_thread(_store_template, user_id, template)
+
+            location = _template_store().location(user_id)
+            logger.info("Encrypted fingerprint saved for user %s at %s", user_id, location)
             return {
                 "status": "ok",
                 "user_id": user_id,
-                "encrypted_path": str(filepath.name),
+                "encrypted_path": location,
             }
     except FingerprintError:
         raise
@@ -124,15 +266,19 @@ async def enroll_fingerprint(user_id: str):
 # -------------------------------------------------------------------
 # 3. Authenticate user by encrypted fingerprint
 # -------------------------------------------------------------------
+@_tracked("authenticate")
 async def authenticate_with_encrypted(
     user_id: Optional[str] = None,
     file_path: Optional[str] = None,
+    port: Optional[str] = None,
+    on_status: Optional[StatusCallback] = None,
 ):
     """
     Authenticate fingerprint using encrypted file.
     Provide either:
       - user_id (for server-stored file)
       - OR file_path (path to encrypted file)
+    settings.AUTH_MODE picks the 1:1 buffer compare ("verify") or a library search.
     """
     if not (user_id or file_path):
         raise FingerprintError("Provide either user_id or file_path", 400)
@@ -142,27 +288,57 @@ async def authenticate_with_encrypted(
         if user_id:
             if not USER_ID_RE.match(user_id):
                 raise FingerprintError("Invalid user_id format", 400)
-            file_path = Path(settings.ENCRYPTED_PATH) / f"user_{user_id}.bin"
+            blob = await asyncio.to_thread(_template_store().get, user_id)
+            cache_key = user_id
         else:
             file_path = Path(file_path)
+            blob = await asyncio.to_thread(file_path.read_bytes) if file_path.exists() else None
+            cache_key = f"file:{file_path.resolve()}"
 
-        if not file_path.exists():
+        if blob is None:
             raise FingerprintError("Encrypted fingerprint file not found", 404)
 
-        decrypted_data = await asyncio.to_thread(encryptor.decrypt_from_file, file_path, settings.SECRET_KEY)
-        if not decrypted_data:
-            raise FingerprintError("Decryption failed or file invalid", 500)
+        content_hash = hashlib.sha256(blob).hexdigest()
+
+        def _load():
+            template = _decrypt_template(blob, cache_key)
+            if not template:
+                raise FingerprintError("Decryption failed or file invalid", 500)
+            return template
 
-        # --- Upload + Authenticate ---
-        async with _fingerprint_service(IdentifyService) as identify:
-            result = await asyncio.to_thread(identify.upload_to_sensor, decrypted_data)
+        if settings.AUTH_MODE == "verify":
+            # --- Capture while decrypting + uploading, then 1:1 compare ---
+            async with _fingerprint_service(IdentifyService, port, on_status) as identify:
+                auth_result = await call(identify.verify, _load, cache_key, content_hash)
+            if auth_result.get("status") == SensorStatus.SUCCESS:
+                # matched_id: the resident slot compared against, None when only staged in a buffer
+                return {
+                    "status": "ok",
+                    "matched_id": auth_result.get("loc_id"),
+                    "confidence": auth_result.get("confidence"),
+                }
+            if auth_result.get("status") == SensorStatus.NOT_FOUND:
+                return {"status": "not found"}
+            return {"status": "failed", "reason": auth_result.get("message")}
+
+        # --- Upload (skipped when already resident) + Authenticate ---
+        async with _fingerprint_service(IdentifyService, port, on_status) as identify:
+            result = await call(identify.load_template, cache_key, content_hash, _load)
 
             if result.get("status") != SensorStatus.SUCCESS:
                 raise FingerprintError(f"Failed to upload fingerprint: {result.get('message')}", 400)
 
-            auth_result = await asyncio.to_thread(identify.authenticate)
+            auth_result = await call(identify.authenticate)
             if auth_result.get("status") == SensorStatus.SUCCESS:
-                return {"status": "ok", "matched_id": auth_result.get("loc_id")}
+                # other users' templates may be resident too; only the claimed slot counts
+                if auth_result.get("loc_id") != result.get("loc_id"):
+                    logger.info("Fingerprint matched location %s, not the claimed one", auth_result.get("loc_id"))
+                    return {"status": "not found"}
+                return {
+                    "status": "ok",
+                    "matched_id": auth_result.get("loc_id"),
+                    "confidence": auth_result.get("confidence"),
+                }
             if auth_result.get("status") == SensorStatus.NOT_FOUND:
                 return {"status": "not found"}
             else:
@@ -176,15 +352,309 @@ async def authenticate_with_encrypted(
 
 
 # -------------------------------------------------------------------
-# 4. Empty library in sensor memory
+# 4. Identify user (1:N) against all encrypted fingerprints
+# -------------------------------------------------------------------
+@_tracked("identify")
+async def identify_fingerprint(port: Optional[str] = None, on_status: Optional[StatusCallback] = None):
+    """
+    Capture a fingerprint and find the matching user among all encrypted files.
+    Note: in "sensor" mode the sensor library is used as scratch space and is overwritten.
+    """
+    if not await asyncio.to_thread(_stored_user_ids):
+        raise FingerprintError("No enrolled fingerprints found", 404)
+    if settings.IDENTIFY_MODE == "host":
+        return await _identify_on_host(port, on_status)
+
+    try:
+        async with _fingerprint_service(IdentifyService, port, on_status) as identify:
+            result = await call(identify.identify, _iter_gallery())
+            if result.get("status") == SensorStatus.SUCCESS:
+                return {"status": "ok", "user_id": result.get("user_id"), "confidence": result.get("confidence")}
+            if result.get("status") == SensorStatus.NOT_FOUND:
+                return {"status": "not found"}
+            return {"status": "failed", "reason": result.get("message")}
+    except FingerprintError:
+        raise
+    except Exception as e:
+        logger.exception("Identification failed: %s", e)
+        raise FingerprintError("Internal server error during identification", 500)
+
+
+async def _identify_on_host(port: Optional[str], on_status: Optional[StatusCallback]):
+    """Capture the probe on the sensor and search the whole gallery in memory."""
+    try:
+        index = await asyncio.to_thread(_gallery_index)
+        async with _fingerprint_service(IdentifyService, port, on_status) as identify:
+            result = await call(identify.capture_probe)
+            if result.get("status") != SensorStatus.SUCCESS:
+                return {"status": "failed", "reason": result.get("message")}
+            with metrics.span("host_match"):
+                matches = await asyncio.to_thread(index.search, result["template"], settings.HOST_MATCH_THRESHOLD)
+            if not matches:
+                identify.send(SensorStatus.NOT_FOUND, "No matching fingerprint found.")
+                return {"status": "not found"}
+            user_id, score = matches[0]
+            identify.send(SensorStatus.SUCCESS, "Fingerprint identified.")
+            return {"status": "ok", "user_id": user_id, "confidence": round(score)}
+    except ValueError as e:
+        # an undecodable probe
+        logger.error("Host matching failed: %s", e)
+        raise FingerprintError(f"Host matching failed: {e}", 500)
+    except FingerprintError:
+        raise
+    except Exception as e:
+        logger.exception("Identification failed: %s", e)
+        raise FingerprintError("Internal server error during identification", 500)
+
+
+# -------------------------------------------------------------------
+# 5. Empty library in sensor memory
 # -------------------------------------------------------------------
-async def reset_sensor():
+@_tracked("reset")
+async def reset_sensor(port: Optional[str] = None, on_status: Optional[StatusCallback] = None):
     """Clear all stored templates from sensor memory."""
     try:
-        async with _fingerprint_service(FingerEnrollService) as service:
-            success = await asyncio.to_thread(service.clear_library)
-            info = await asyncio.to_thread(service.get_sensor_info)
+        async with _fingerprint_service(FingerEnrollService, port, on_status) as service:
+            success = await call(service.clear_library)
+            info = await call(service.get_sensor_info)
             return {"status": "ok" if success else "failed", "sensor": info}
     except Exception as e:
         logger.exception("Sensor reset failed: %s", e)
         raise FingerprintError("Failed to reset sensor", 500)
+
+
+# -------------------------------------------------------------------
+# 6. Sensor pool status
+# -------------------------------------------------------------------
+async def list_sensors():
+    """Queue depth and connection state of every configured reader."""
+    return {"status": "ok", "sensors": sensor_pool.status()}
+
+
+# -------------------------------------------------------------------
+# 7. Metrics
+# -------------------------------------------------------------------
+def metrics_text() -> str:
+    """
+    Prometheus text dump of stage timings, poll/retry/LED counters and UART bytes.
+    For push-style export register a hook with `src.utils.metrics.metrics.add_hook`.
+    """
+    return metrics.render_prometheus()
+
+
+# -------------------------------------------------------------------
+# 8. Bulk operations (one sensor session, crypto on a worker pool)
+# -------------------------------------------------------------------
+ARCHIVE_MANIFEST = "manifest.json"
+ARCHIVE_VERSION = 1
+ARCHIVE_ENTRY_RE = re.compile(r"^user_([a-zA-Z0-9_\-]+)\.bin$")
+
+
+def _read_template(user_id: str) -> Tuple[str, Template]:
+    """(content hash, template) of a stored template."""
+    blob = _template_store().get(user_id)
+    if blob is None:
+        raise FileNotFoundError(f"no template stored for {user_id}")
+    return hashlib.sha256(blob).hexdigest(), _decrypt_template(blob, user_id)
+
+
+@_tracked("enroll_batch")
+async def enroll_batch(user_ids: Iterable[str], port: Optional[str] = None):
+    """
+    Enroll several users one after another on the same sensor session. Encrypting and
+    saving a template runs on the crypto pool while the next user is being captured.
+    """
+    user_ids = list(user_ids)
+    invalid = [user_id for user_id in user_ids if not USER_ID_RE.match(user_id)]
+    if invalid:
+        raise FingerprintError(f"Invalid user_id format: {', '.join(invalid)}", 400)
+
+    loop = asyncio.get_running_loop()
+    enrolled, failed, saving = [], {}, []
+    with ThreadPoolExecutor(settings.BULK_WORKERS) as pool:
+        try:
+            async with _fingerprint_service(FingerEnrollService, port) as service:
+                for user_id in user_ids:
+                    try:
+                        template = await _capture_enrollment(service, user_id)
+                    except FingerprintError as e:
+                        failed[user_id] = e.message
+                        continue
+                    future = loop.run_in_executor(pool, _store_template, user_id, template)
+                    saving.append((user_id, future))
+        except Exception as e:
+            logger.exception("Batch enrollment aborted: %s", e)
+            failed.update({user_id: "aborted" for user_id in user_ids if user_id not in failed})
+        for user_id, future in saving:
+            try:
+                await future
+                enrolled.append(user_id)
+                failed.pop(user_id, None)
+            except Exception as e:
+                logger.exception("Saving template of %s failed: %s", user_id, e)
+                failed[user_id] = "could not save template"
+    return {"status": "ok" if not failed else "partial", "enrolled": enrolled, "failed": failed}
+
+
+@_tracked("export_sensor")
+async def export_sensor_templates(port: Optional[str] = None, overwrite: bool = False):
+    """
+    Read every occupied sensor slot back (LOAD + UPLOAD of the char template) and save it
+    encrypted to the host store. Slots loaded by this service for a user keep their user_id;
+    others are saved as `slot_<n>`. Existing files are kept unless overwrite is set.
+    """
+    loop = asyncio.get_running_loop()
+    exported, skipped, failed, saving = [], [], [], []
+    try:
+        with ThreadPoolExecutor(settings.BULK_WORKERS) as pool:
+            async with _fingerprint_service(IdentifyService, port) as identify:
+                for loc_id in await call(identify.occupied_slots):
+                    template = await call(identify.download_slot, loc_id)
+                    if not template:
+                        failed.append(loc_id)
+                        continue
+                    key = identify.template_cache.key_at(loc_id) if identify.template_cache is not None else None
+                    # other cache keys (e.g. "file:<path>" of file authentication) are no user ids
+                    user_id = key if key and USER_ID_RE.match(key) else f"slot_{loc_id}"
+                    future = loop.run_in_executor(pool, _store_template, user_id, template, overwrite)
+                    saving.append((user_id, future))
+            for user_id, future in saving:
+                (exported if await future else skipped).append(user_id)
+    except Exception as e:
+        logger.exception("Sensor export failed: %s", e)
+        raise FingerprintError("Failed to export sensor templates", 500)
+    return {"status": "ok" if not failed else "partial", "exported": exported, "skipped": skipped, "failed": failed}
+
+
+@_tracked("import_sensor")
+async def import_templates_to_sensor(user_ids: Optional[Iterable[str]] = None, port: Optional[str] = None):
+    """
+    Load many templates from the host store into the sensor library over one session.
+    Up to settings.BULK_PREFETCH templates are decrypted ahead on the crypto pool while the
+    UART uploads. Templates already resident are skipped; loading stops (nothing is
+    evicted) once the library is full.
+    """
+    user_ids = await asyncio.to_thread(_stored_user_ids, user_ids)
+
+    loop = asyncio.get_running_loop()
+    loaded, failed, not_loaded = {}, {}, []
+    try:
+        with ThreadPoolExecutor(settings.BULK_WORKERS) as pool:
+            pending = iter(user_ids)
+            window = []
+
+            def _prefetch():
+                while len(window) < settings.BULK_PREFETCH:
+                    user_id = next(pending, None)
+                    if user_id is None:
+                        return
+                    window.append((user_id, loop.run_in_executor(pool, _read_template, user_id)))
+
+            async with _fingerprint_service(IdentifyService, port) as identify:
+                _prefetch()
+                while window:
+                    user_id, future = window.pop(0)
+                    _prefetch()
+                    try:
+                        content_hash, template = await future
+                    except Exception as e:
+                        logger.warning("Skipping unreadable template of %s: %s", user_id, e)
+                        failed[user_id] = "decryption failed"
+                        continue
+                    result = await call(identify.load_template, user_id, content_hash, lambda t=template: t, False)
+                    status = result.get("status")
+                    if status == SensorStatus.SUCCESS:
+                        loaded[user_id] = result.get("loc_id")
+                    elif status == SensorStatus.STORAGE_FULL:
+                        not_loaded = [user_id] + [queued for queued, _ in window] + list(pending)
+                        break
+                    else:
+                        failed[user_id] = result.get("message")
+                for _, future in window:
+                    future.cancel()
+    except Exception as e:
+        logger.exception("Sensor import failed: %s", e)
+        raise FingerprintError("Failed to import templates to sensor", 500)
+    status = "ok" if not (failed or not_loaded) else "partial"
+    return {"status": status, "loaded": loaded, "failed": failed, "library_full": not_loaded}
+
+
+def _export_archive(archive_path: Path) -> List[str]:
+    users = []
+    tmp = archive_path.with_name(f".{archive_path.name}.tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as archive:
+        for user_id, blob in _template_store().items():
+            archive.writestr(f"user_{user_id}.bin", bytes(blob))
+            users.append(user_id)
+        manifest = {"version": ARCHIVE_VERSION, "created": int(time.time()), "count": len(users)}
+        archive.writestr(ARCHIVE_MANIFEST, json.dumps(manifest))
+    os.replace(tmp, archive_path)
+    return users
+
+
+def _verify_and_store(user_id: str, blob: bytes):
+    # only templates encrypted with our key are accepted
+    template = _decrypt_template(blob, user_id)
+    _template_store().put(user_id, blob)
+    _update_gallery_index(user_id, template)
+
+
+def _import_archive(archive_path: Path, overwrite: bool):
+    imported, skipped, failed = [], [], []
+    with zipfile.ZipFile(archive_path) as archive, ThreadPoolExecutor(settings.BULK_WORKERS) as pool:
+        manifest = json.loads(archive.read(ARCHIVE_MANIFEST)) if ARCHIVE_MANIFEST in archive.namelist() else {}
+        if manifest.get("version", ARCHIVE_VERSION) > ARCHIVE_VERSION:
+            raise FingerprintError("Archive was written by a newer version", 400)
+        jobs = []
+        for name in archive.namelist():
+            match = ARCHIVE_ENTRY_RE.match(name)
+            if not match:
+                continue
+            user_id = match.group(1)
+            if user_id in _template_store() and not overwrite:
+                skipped.append(user_id)
+                continue
+            jobs.append((user_id, pool.submit(_verify_and_store, user_id, archive.read(name))))
+        for user_id, job in jobs:
+            try:
+                job.result()
+                imported.append(user_id)
+            except Exception as e:
+                logger.warning("Rejected archived template of %s: %s", user_id, e)
+                failed.append(user_id)
+    return imported, skipped, failed
+
+
+@_tracked("export_archive")
+async def export_archive(archive_path: str):
+    """Pack the whole encrypted store into one archive (templates stay encrypted)."""
+    try:
+        users = await asyncio.to_thread(_export_archive, Path(archive_path))
+    except Exception as e:
+        logger.exception("Archive export failed: %s", e)
+        raise FingerprintError("Failed to export archive", 500)
+    return {"status": "ok", "archive": str(archive_path), "count": len(users)}
+
+
+@_tracked("import_archive")
+async def import_archive(archive_path: str, overwrite: bool = False):
+    """
+    Unpack an archive written by export_archive into the template store (also the way to
+    move templates between the "files" and "packed" backends). Every template is checked
+    to decrypt with the current key (in parallel) before it is written.
+    """
+    if not Path(archive_path).exists():
+        raise FingerprintError("Archive not found", 404)
+    try:
+        imported, skipped, failed = await asyncio.to_thread(_import_archive, Path(archive_path), overwrite)
+    except FingerprintError:
+        raise
+    except Exception as e:
+        logger.exception("Archive import failed: %s", e)
+        raise FingerprintError("Failed to import archive", 400)
+    return {
+        "status": "ok" if not failed else "partial",
+        "imported": imported,
+        "skipped": skipped,
+        "failed": failed,
+    }
@@ -0,0 +1,54 @@
+"""
+Sensor flows written once for both transports.
+
+A flow is a generator method of a sensor service that yields the I/O it needs as an `Op`
+and is sent each result back (exceptions are thrown in at the yield); flows call each
+other with `yield from`. `FingerprintSensorService._run` performs the ops with blocking
+calls ("thread" transport), `AsyncFingerprintSensorService._run` awaits them ("asyncio"
+transport), so polling, prompting, retries and grading are decided in one place and only
+the I/O differs.
+"""
+
+# Standard Library
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Tuple, TypeVar
+
+T = TypeVar("T")
+Flow = Generator["Op", Any, T]
+
+
+@dataclass(frozen=True)
+class Op:
+    kind: str
+    target: Any = None
+    args: Tuple = ()
+
+
+def sensor(method: str, *args) -> Op:
+    """Call sensor method (a packet exchange); the result is its return value."""
+    return Op("sensor", method, args)
+
+
+def sleep(seconds: float) -> Op:
+    """Wait between polls (cancellable)."""
+    return Op("sleep", None, (seconds,))
+
+
+def flush_led() -> Op:
+    """Write the LED state queued by `send` (see LedController)."""
+    return Op("flush_led")
+
+
+def blocking(func: Callable, *args) -> Op:
+    """Host work that may block (decrypt, store reads, image grading); kept off the event loop."""
+    return Op("blocking", func, args)
+
+
+def start(func: Callable, *args) -> Op:
+    """Run func on a helper thread; the result is a future (done/exception/result/cancel)."""
+    return Op("start", func, args)
+
+
+def wait(future) -> Op:
+    """Result of a future returned by `start` (its exception is raised)."""
+    return Op("wait", future)
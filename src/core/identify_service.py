@@ -1,14 +1,28 @@
 # Standard Library
-from typing import Callable, List, Optional, Tuple
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Third Library
 import adafruit_fingerprint
 
 from src.config import settings
+from src.core import flow
+from src.core.flow import Flow
 from src.core.sensor_service import FingerprintSensorService
 from src.core.status import SensorStatus
+from src.core.template import Template, TemplateFormat
 from src.utils.logger import setup_logger
 
+# (user_id, template) as loaded from the encrypted store
+GalleryEntry = Tuple[str, Template]
+TemplateLoader = Callable[[], Template]
+
+
+def _batched(entries: Iterable[GalleryEntry], size: int) -> Iterator[List[GalleryEntry]]:
+    iterator = iter(entries)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class IdentifyService(FingerprintSensorService):
     """
@@ -21,63 +35,194 @@ class IdentifyService(FingerprintSensorService):
         on_status: Optional[Callable[[SensorStatus], None]] = None,
         port: Optional[str] = None,
         baudrate: Optional[int] = None,
+        sensor: Optional[adafruit_fingerprint.Adafruit_Fingerprint] = None,
     ):
-        super().__init__(port, baudrate, on_status)
+        super().__init__(port, baudrate, on_status, sensor)
         self.logger = setup_logger("IdentifyService")
 
     # -----------------------
     # Upload external data to sensor memory
     # -----------------------
-    def upload_to_sensor(self, finger_data: List[int]) -> Tuple[SensorStatus, Optional[int]]:
+    def upload_to_sensor(self, template: Template) -> Tuple[SensorStatus, Optional[int]]:
         """
-        Upload fingerprint image data to an empty location in the sensor’s memory.
+        Upload fingerprint data to an empty location in the sensor’s memory.
+        Templates go straight into char buffer 2; images are downloaded to the
+        image buffer and converted with image_2_tz first.
 
-        :param finger_data: Raw fingerprint image data as list of ints.
+        :param template: Fingerprint template or raw image.
         :return: (SensorStatus, stored_location)
         """
+        return self._run(self._upload_to_sensor(template))
+
+    def _upload_to_sensor(self, template: Template) -> Flow[Dict]:
         try:
             self.logger.info("upload finger print file to sensor")
-            # ensure templates info is up-to-date
-            if hasattr(self._sensor, "read_templates"):
-                self._sensor.read_templates()
-
-            templates = getattr(self._sensor, "templates", [])
-            free_locs = [i for i in range(self._sensor.library_size) if i not in templates]
-            if not free_locs:
+            loc_id = yield from self._allocate_slot()
+            if loc_id is None:
                 self.logger.error("No free locations available in sensor.")
                 return self.response(SensorStatus.STORAGE_FULL)
 
-            loc_id = free_locs[0]
             self.logger.info("Uploading fingerprint to location %d", loc_id)
+            stored = False
+            try:
+                error = yield from self._store_template(loc_id, template)
+                stored = not error
+            finally:
+                # also when cancelled (OperationCancelled / CancelledError skip `except Exception`)
+                if not stored:
+                    self._release_slot(loc_id)
+            if error:
+                self.logger.error(error)
+                return self.response(SensorStatus.FAIL, message=error)
+
+            self.logger.info("Fingerprint successfully stored at location %d", loc_id)
+            return self.response(SensorStatus.SUCCESS, loc_id=loc_id)
 
-            ok = self._sensor.send_fpdata(finger_data, "image")
-            if not ok:
-                self.logger.error("Failed to send fingerprint data to sensor.")
-                return self.response(SensorStatus.FAIL)
+        except Exception as e:
+            self.logger.exception("Error during fingerprint upload: %s", e)
+            return self.response(SensorStatus.FAIL, message=f"Error during fingerprint upload: {e}")
 
-            if self._sensor.image_2_tz(2) != adafruit_fingerprint.OK:
-                self.logger.error("Failed to convert uploaded image to template.")
-                return self.response(SensorStatus.FAIL)
+    def _allocate_slot(self) -> Flow[Optional[int]]:
+        """Next free library slot, from the slot allocator when available."""
+        if self.slot_allocator is not None:
+            yield from self._sync_library()
+            return self.slot_allocator.allocate()
+        # standalone service: one index-table read, set lookup
+        yield flow.sensor("read_templates")
+        used = set(self._sensor.templates)
+        return next((i for i in range(self._sensor.library_size) if i not in used), None)
 
-            store_status = self._sensor.store_model(loc_id, 2)
-            if store_status != adafruit_fingerprint.OK:
-                self.logger.error(
-                    "Failed to store uploaded fingerprint at location %d (code: %s)",
-                    loc_id,
-                    store_status,
-                )
-                return self.response(SensorStatus.FAIL)
+    def _release_slot(self, loc_id: int):
+        if self.slot_allocator is not None:
+            self.slot_allocator.release(loc_id)
 
-            # refresh template list if possible
-            if hasattr(self._sensor, "read_templates"):
-                self._sensor.read_templates()
+    def _stage_template(self, template: Template) -> Flow[Optional[str]]:
+        """Put template into char buffer 2 (images via the image buffer). Returns an error message on failure."""
+        with self.span("transfer_to_sensor"):
+            sent = yield flow.sensor("send_fpdata", template.data, template.format.sensor_buffer, 2)
+        if not sent:
+            return "Failed to send fingerprint data to sensor."
+        if template.format == TemplateFormat.IMAGE and (yield flow.sensor("image_2_tz", 2)) != adafruit_fingerprint.OK:
+            return "Failed to convert uploaded image to template."
+        return None
 
-            self.logger.info("Fingerprint successfully stored at location %d", loc_id)
-            return self.response(SensorStatus.SUCCESS, loc_id=loc_id)
+    def _store_template(self, loc_id: int, template: Template) -> Flow[Optional[str]]:
+        """Send template through char buffer 2 and store it at loc_id. Returns an error message on failure."""
+        error = yield from self._stage_template(template)
+        if error:
+            return error
+        with self.span("store"):
+            store_status = yield flow.sensor("store_model", loc_id, 2)
+        if store_status != adafruit_fingerprint.OK:
+            return f"Failed to store uploaded fingerprint at location {loc_id} (code: {store_status})"
+        return None
+
+    # -----------------------
+    # Resident templates (upload only when not cached on the sensor)
+    # -----------------------
+    def load_template(
+        self,
+        key: str,
+        content_hash: str,
+        loader: TemplateLoader,
+        evict: bool = True,
+    ):
+        """
+        Make sure the template identified by key is stored in the sensor library.
+
+        If the template cache already maps key (with the same content hash) to a slot,
+        nothing is sent to the sensor. Otherwise `loader` is called to decrypt the data,
+        which is uploaded; when the library is full the least recently used slots are
+        deleted until it fits.
+
+        :param key: Cache key, usually the user_id.
+        :param content_hash: Hash of the stored (encrypted) file, used to detect re-enrollment.
+        :param loader: Returns the Template; only called on a cache miss.
+        :param evict: When False a full library fails with STORAGE_FULL instead of evicting.
+        :return: response with loc_id and cached flag.
+        """
+        return self._run(self._load_template(key, content_hash, loader, evict))
+
+    def _load_template(self, key: str, content_hash: str, loader: TemplateLoader, evict: bool) -> Flow[Dict]:
+        cache = self.template_cache
+        if cache is None:
+            return (yield from self._upload_to_sensor((yield flow.blocking(loader))))
+
+        try:
+            yield from self._sync_library()
+
+            loc_id = cache.lookup(key, content_hash)
+            if loc_id is not None:
+                self.logger.info("Template %s already resident at location %d", key, loc_id)
+                return self.response(SensorStatus.SUCCESS, loc_id=loc_id, cached=True)
 
+            stale = cache.get(key)
+            if stale is not None and not (yield from self._evict(stale.slot)):
+                return self.response(SensorStatus.FAIL, message="Failed to delete outdated template")
         except Exception as e:
-            self.logger.exception("Error during fingerprint upload: %s", e)
-            return self.response(SensorStatus.FAIL, None)
+            self.logger.exception("Error looking up template %s: %s", key, e)
+            cache.invalidate()
+            return self.response(SensorStatus.FAIL, message=f"Error looking up template: {e}")
+        except BaseException:
+            # cancelled mid-exchange: the library is read again on next use
+            cache.invalidate()
+            raise
+
+        # Loader errors (e.g. decryption) are left to the caller
+        template = yield flow.blocking(loader)
+
+        try:
+            result = yield from self._upload_to_sensor(template)
+            while evict and result.get("status") == SensorStatus.STORAGE_FULL:
+                victim = cache.eviction_candidate()
+                if victim is None or not (yield from self._evict(victim.slot)):
+                    break
+                result = yield from self._upload_to_sensor(template)
+
+            if result.get("status") == SensorStatus.SUCCESS:
+                cache.put(key, result["loc_id"], content_hash)
+                result["cached"] = False
+            return result
+
+        except Exception as e:
+            self.logger.exception("Error loading template %s: %s", key, e)
+            cache.invalidate()
+            return self.response(SensorStatus.FAIL, message=f"Error loading template: {e}")
+        except BaseException:
+            # cancelled, possibly between an eviction and the upload
+            cache.invalidate()
+            raise
+
+    # -----------------------
+    # Bulk transfer (library <-> host)
+    # -----------------------
+    def occupied_slots(self) -> List[int]:
+        """Read the index table and return the occupied library slots."""
+        return self._run(self._occupied_slots())
+
+    def _occupied_slots(self) -> Flow[List[int]]:
+        yield from self._sync_library(force=True)
+        return list(self._sensor.templates)
+
+    def download_slot(self, loc_id: int) -> Optional[Template]:
+        """Read the template stored at loc_id back to the host (LOAD into char buffer 1 + UPLOAD)."""
+        return self._run(self._download_slot(loc_id))
+
+    def _download_slot(self, loc_id: int) -> Flow[Optional[Template]]:
+        if (yield flow.sensor("load_model", loc_id, 1)) != adafruit_fingerprint.OK:
+            self.logger.error("Failed to load template at location %d", loc_id)
+            return None
+        with self.span("transfer_from_sensor"):
+            return Template((yield flow.sensor("get_fpdata", "char", 1)), TemplateFormat.CHAR)
+
+    def _evict(self, loc_id: int) -> Flow[bool]:
+        self.logger.info("Evicting template at location %d", loc_id)
+        if (yield flow.sensor("delete_model", loc_id)) != adafruit_fingerprint.OK:
+            self.logger.error("Failed to delete template at location %d", loc_id)
+            return False
+        self.template_cache.remove_slot(loc_id)
+        self._release_slot(loc_id)
+        return True
 
     # -----------------------
     # Authenticate (live capture + search)
@@ -88,15 +233,19 @@ class IdentifyService(FingerprintSensorService):
 
         :return: (SensorStatus, finger_id if found)
         """
+        return self._run(self._authenticate())
+
+    def _authenticate(self) -> Flow[Dict]:
         try:
             # Step 1 - Ask to place finger
             self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
-            if not self.capture(timeout=settings.CAPTURE_TIME_OUT):
+            if not (yield from self._capture(timeout=settings.CAPTURE_TIME_OUT, prompted=True)):
                 return self.send(SensorStatus.FAIL, "Failed to read image")
 
             self.send(SensorStatus.REMOVE_FINGER, "Remove your finger")
             self.send(SensorStatus.PROCESSING, "Searching for fingerprint...")
-            search_result = self._sensor.finger_search()
+            with self.span("search"):
+                search_result = yield flow.sensor("finger_search")
             if search_result == adafruit_fingerprint.OK:
                 loc_id = getattr(self._sensor, "finger_id", None)
                 auth_confidence = getattr(self._sensor, "confidence", None)
@@ -113,3 +262,197 @@ class IdentifyService(FingerprintSensorService):
 
         except Exception as e:
             return self.send(SensorStatus.FAIL, f"Error during authentication: {e}")
+
+    # -----------------------
+    # Verify (1:1 buffer match; decrypt + upload overlap the live capture)
+    # -----------------------
+    def verify(self, loader: TemplateLoader, key: Optional[str] = None, content_hash: Optional[str] = None):
+        """
+        Verify a live finger against one claimed template with a direct buffer compare.
+
+        The claimed template goes to char buffer 2 and the live finger to char buffer 1,
+        then the sensor compares the two (constant time, no store_model, no library
+        search, so no other user's slot can match). When the template cache holds key
+        with the same content hash it is loaded from its slot; otherwise the user is
+        prompted at once and `loader` (the decrypt) runs on a helper thread while the
+        finger is polled, the data being sent between no-finger polls. The time at the
+        reader is the capture plus one compare. Loader errors are left to the caller.
+
+        :param loader: Returns the claimed user's Template.
+        :param key: Cache key of the template (user_id), to reuse a resident copy.
+        :param content_hash: Hash of the stored (encrypted) file.
+        :return: response with confidence and loc_id (the resident slot compared against, None
+            when the template was only staged into the buffer) on a match, NOT_FOUND when the
+            finger differs.
+        """
+        return self._run(self._verify(loader, key, content_hash))
+
+    def _verify(self, loader: TemplateLoader, key: Optional[str], content_hash: Optional[str]) -> Flow[Dict]:
+        pending = None
+        resident = yield from self._load_resident(key, content_hash)
+        staged, error = resident is not None, None
+        if not staged:
+            pending = yield flow.start(loader)
+
+        def _stage_when_ready() -> Flow[bool]:
+            nonlocal staged, error
+            if staged or not pending.done():
+                return False
+            if pending.exception() is not None:
+                # stop waiting for a finger that cannot be verified
+                raise pending.exception()
+            staged = True
+            error = yield from self._stage_template(pending.result())
+            return True
+
+        try:
+            self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
+            captured = yield from self._capture(
+                timeout=settings.CAPTURE_TIME_OUT, buffer=1, prompted=True, idle=_stage_when_ready
+            )
+            # raises the loader error, if any, before reporting the capture result
+            template = (yield flow.wait(pending)) if pending is not None else None
+            if not captured:
+                return self.send(SensorStatus.FAIL, "Failed to read image")
+
+            self.send(SensorStatus.REMOVE_FINGER, "Remove your finger")
+            self.send(SensorStatus.PROCESSING, "Matching fingerprint...")
+            if not staged:
+                error = yield from self._stage_template(template)
+            if error:
+                return self.send(SensorStatus.FAIL, error)
+            return (yield from self._match_buffers(resident))
+
+        except Exception as e:
+            if pending is not None and pending.done() and not pending.cancelled() and pending.exception() is e:
+                raise
+            return self.send(SensorStatus.FAIL, f"Error during authentication: {e}")
+        finally:
+            if pending is not None:
+                # a loader still queued is no longer needed
+                pending.cancel()
+
+    def _load_resident(self, key: Optional[str], content_hash: Optional[str]) -> Flow[Optional[int]]:
+        """Load key's template from its library slot into char buffer 2 if it is resident; returns the slot."""
+        cache = self.template_cache
+        if cache is None or key is None or not cache.synced:
+            return None
+        loc_id = cache.lookup(key, content_hash)
+        if loc_id is None:
+            return None
+        if (yield flow.sensor("load_model", loc_id, 2)) != adafruit_fingerprint.OK:
+            self.logger.warning("Failed to load resident template %s from location %d", key, loc_id)
+            return None
+        self.logger.info("Template %s loaded from location %d", key, loc_id)
+        return loc_id
+
+    def _match_buffers(self, loc_id: Optional[int] = None) -> Flow[Dict]:
+        """Compare char buffers 1 and 2 on the sensor (loc_id: library slot buffer 2 was loaded from)."""
+        with self.span("compare"):
+            result = yield flow.sensor("compare_templates")
+        if result == adafruit_fingerprint.OK:
+            confidence = self._sensor.confidence
+            if confidence < settings.VERIFY_MIN_CONFIDENCE:
+                self.logger.info("Match confidence %s below %s", confidence, settings.VERIFY_MIN_CONFIDENCE)
+                self.send(SensorStatus.NOT_FOUND, "Fingerprint does not match.")
+                return self.response(SensorStatus.NOT_FOUND, confidence=confidence)
+            return self.send(SensorStatus.SUCCESS, "Fingerprint matched", loc_id=loc_id, confidence=confidence)
+        if result == adafruit_fingerprint.NOMATCH:
+            self.send(SensorStatus.NOT_FOUND, "Fingerprint does not match.")
+            return self.response(SensorStatus.NOT_FOUND)
+        return self.send(SensorStatus.FAIL, f"Unexpected result from compare_templates(): {result}")
+
+    # -----------------------
+    # Identify (live capture + 1:N search over a host-side gallery)
+    # -----------------------
+    def capture_probe(self):
+        """
+        Capture one fingerprint and read its char template back to the host, for matching
+        there (see src.core.matcher).
+
+        :return: response with the probe `template` on success.
+        """
+        return self._run(self._capture_probe())
+
+    def _capture_probe(self) -> Flow[Dict]:
+        try:
+            self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
+            if not (yield from self._capture(timeout=settings.CAPTURE_TIME_OUT, buffer=1, prompted=True)):
+                return self.send(SensorStatus.FAIL, "Failed to read image")
+
+            self.send(SensorStatus.REMOVE_FINGER, "Remove your finger")
+            self.send(SensorStatus.PROCESSING, "Searching gallery...")
+            with self.span("transfer_from_sensor"):
+                data = yield flow.sensor("get_fpdata", "char", 1)
+            return self.response(SensorStatus.SUCCESS, template=Template(data, TemplateFormat.CHAR))
+
+        except Exception as e:
+            return self.send(SensorStatus.FAIL, f"Error during probe capture: {e}")
+
+    def identify(self, gallery: Iterable[GalleryEntry]):
+        """
+        Capture one fingerprint and search it against a whole gallery of stored templates.
+
+        The probe stays in char buffer 1 while the gallery is loaded into the sensor
+        library `library_size` templates at a time (through char buffer 2), with one
+        finger_search per batch. The sensor library is used as scratch space and is
+        emptied before every batch.
+
+        :param gallery: Iterable of (user_id, template); consumed lazily batch by batch.
+        :return: response with user_id and confidence when found.
+        """
+        return self._run(self._identify(gallery))
+
+    def _identify(self, gallery: Iterable[GalleryEntry]) -> Flow[Dict]:
+        try:
+            self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
+            if not (yield from self._capture(timeout=settings.CAPTURE_TIME_OUT, buffer=1, prompted=True)):
+                return self.send(SensorStatus.FAIL, "Failed to read image")
+
+            self.send(SensorStatus.REMOVE_FINGER, "Remove your finger")
+            self.send(SensorStatus.PROCESSING, "Searching gallery...")
+            batches = _batched(gallery, self._sensor.library_size)
+            batch_no = 0
+            # the gallery decrypts lazily: every batch is read as blocking host work
+            while batch := (yield flow.blocking(next, batches, None)):
+                self.logger.info("Loading gallery batch %d (%d templates)", batch_no, len(batch))
+                if not (yield from self._load_batch(batch)):
+                    return self.send(SensorStatus.FAIL, f"Failed to load gallery batch {batch_no}")
+
+                with self.span("search"):
+                    search_result = yield flow.sensor("finger_search")
+                if search_result == adafruit_fingerprint.OK:
+                    loc_id = self._sensor.finger_id
+                    user_id = batch[loc_id][0]
+                    return self.send(
+                        SensorStatus.SUCCESS,
+                        "Fingerprint identified",
+                        user_id=user_id,
+                        confidence=self._sensor.confidence,
+                    )
+                if search_result != adafruit_fingerprint.NOTFOUND:
+                    return self.send(SensorStatus.FAIL, f"Unexpected result from finger_search(): {search_result}")
+                batch_no += 1
+
+            self.logger.info("Fingerprint not found in gallery.")
+            self.send(SensorStatus.NOT_FOUND, "Fingerprint not found in gallery.")
+            return self.response(SensorStatus.NOT_FOUND)
+
+        except Exception as e:
+            return self.send(SensorStatus.FAIL, f"Error during identification: {e}")
+
+    def _load_batch(self, batch: List[GalleryEntry]) -> Flow[bool]:
+        """Replace the sensor library with batch; slot i holds batch[i]."""
+        if self.template_cache is not None:
+            self.template_cache.invalidate()
+        if self.slot_allocator is not None:
+            self.slot_allocator.invalidate()
+        if (yield flow.sensor("empty_library")) != adafruit_fingerprint.OK:
+            self.logger.error("Failed to empty sensor library.")
+            return False
+        for loc_id, (user_id, template) in enumerate(batch):
+            error = yield from self._store_template(loc_id, template)
+            if error:
+                self.logger.error("Gallery template of user %s: %s", user_id, error)
+                return False
+        return True
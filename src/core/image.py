@@ -0,0 +1,121 @@
+"""
+Raw sensor images (`get_fpdata("image")`): unpacking, quality grading and export.
+
+The R503 sends its 256 x 288 image with 4 bits per pixel, two pixels per byte (high
+nibble first). `unpack` turns the buffer into a 2-D uint8 array scaled to 0-255 and
+`assess` grades it, so a poor capture can be taken again before it is spent on
+create_model (settings.ENROLL_QUALITY_CHECK).
+
+Requires NumPy (the "match" extra).
+"""
+
+# Standard Library
+from dataclasses import dataclass
+from pathlib import Path
+import struct
+from typing import List, Union
+import zlib
+
+# Third Library
+import numpy as np
+
+WIDTH, HEIGHT = 256, 288
+# Side of the square blocks the image is graded in (pixels)
+BLOCK = 16
+# Grey-level standard deviation above which a block shows ridges rather than background
+RIDGE_STD = 12.0
+
+
+def unpack(data, width: int = WIDTH, height: int = HEIGHT) -> np.ndarray:
+    """(height, width) uint8 image of a packed 4-bit buffer (any bytes-like object or list)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        packed = np.frombuffer(data, np.uint8)
+    else:
+        packed = np.asarray(data, np.uint8)
+    if packed.size != width * height // 2:
+        raise ValueError(f"Image buffer has {packed.size} bytes, expected {width * height // 2}")
+    pixels = np.empty(packed.size * 2, np.uint8)
+    pixels[0::2] = packed >> 4
+    pixels[1::2] = packed & 0x0F
+    pixels *= 17  # 0x0 -> 0, 0xF -> 255
+    return pixels.reshape(height, width)
+
+
+@dataclass(frozen=True)
+class ImageQuality:
+    """Quality metrics of one image, taken over the blocks showing ridges."""
+
+    coverage: float  # share of BLOCK x BLOCK blocks showing ridges (low: finger partly placed)
+    contrast: float  # median grey-level standard deviation of the ridge blocks / 128
+    # median mean-square Laplacian of the ridge blocks relative to their variance: the
+    # share of fine detail, which a blurred, wet or smudged print loses
+    sharpness: float
+
+    def problems(self, min_coverage: float, min_contrast: float, min_sharpness: float) -> List[str]:
+        """Why the image is not good enough; empty when it is."""
+        problems = []
+        if self.coverage < min_coverage:
+            problems.append(f"finger covers {self.coverage:.0%} of the sensor")
+        if self.contrast < min_contrast:
+            problems.append(f"low contrast ({self.contrast:.2f})")
+        if self.sharpness < min_sharpness:
+            problems.append(f"blurred ({self.sharpness:.2f})")
+        return problems
+
+
+def assess(image: np.ndarray) -> ImageQuality:
+    rows, cols = image.shape[0] // BLOCK, image.shape[1] // BLOCK
+    pixels = image[: rows * BLOCK, : cols * BLOCK].astype(np.float32)
+    laplacian = np.zeros_like(pixels)
+    laplacian[1:-1, 1:-1] = (
+        4 * pixels[1:-1, 1:-1] - pixels[:-2, 1:-1] - pixels[2:, 1:-1] - pixels[1:-1, :-2] - pixels[1:-1, 2:]
+    )
+    variance = pixels.reshape(rows, BLOCK, cols, BLOCK).var(axis=(1, 3))
+    ridges = variance > RIDGE_STD**2
+    if not ridges.any():
+        return ImageQuality(coverage=0.0, contrast=0.0, sharpness=0.0)
+    detail = np.square(laplacian).reshape(rows, BLOCK, cols, BLOCK).mean(axis=(1, 3))
+    return ImageQuality(
+        coverage=float(ridges.mean()),
+        contrast=float(np.median(np.sqrt(variance[ridges]))) / 128,
+        sharpness=float(np.median(detail[ridges] / variance[ridges])),
+    )
+
+
+# -------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------
+def to_pgm(image: np.ndarray) -> bytes:
+    height, width = image.shape
+    return b"P5\n%d %d\n255\n" % (width, height) + np.ascontiguousarray(image, np.uint8).tobytes()
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def to_png(image: np.ndarray) -> bytes:
+    """8-bit greyscale PNG."""
+    height, width = image.shape
+    # every scanline starts with its filter type (0: none)
+    scanlines = np.hstack((np.zeros((height, 1), np.uint8), np.asarray(image, np.uint8)))
+    return b"".join(
+        (
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)),
+            _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6)),
+            _png_chunk(b"IEND", b""),
+        )
+    )
+
+
+def save(image: np.ndarray, path: Union[str, Path]) -> Path:
+    """Write image as PNG or PGM, chosen by the file suffix."""
+    path = Path(path)
+    if path.suffix.lower() == ".png":
+        path.write_bytes(to_png(image))
+    elif path.suffix.lower() == ".pgm":
+        path.write_bytes(to_pgm(image))
+    else:
+        raise ValueError(f"Unsupported image format {path.suffix!r} (use .png or .pgm)")
+    return path
@@ -0,0 +1,122 @@
+# Standard Library
+import threading
+from typing import Dict, Optional, Tuple
+
+# Third Library
+import adafruit_fingerprint
+
+from src.config import settings
+from src.utils.logger import setup_logger
+from src.utils.metrics import metrics
+
+# R503 aura modes that run a finite animation (breathing / flashing with cycles > 0)
+_ANIMATED_MODES = (1, 2)
+
+
+class LedController:
+    """
+    Remembers the active LED mode of one sensor and coalesces updates.
+
+    - `set()` only queues the latest requested mode; nothing is written to the UART.
+    - `flush()` writes the queued mode at a point where the UART is idle (e.g. while
+      waiting between capture polls), so status changes never delay capture or search.
+    - A mode that is already active is not written again. Finite animations are not
+      remembered, since the sensor returns to idle once they finish.
+    """
+
+    def __init__(self, sensor: adafruit_fingerprint.Adafruit_Fingerprint, port: Optional[str] = None):
+        self.logger = setup_logger("LedController")
+        self._sensor = sensor
+        self._port = port
+        self._current: Optional[Tuple[int, int, int, int]] = None
+        self._pending: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(mode: Dict) -> Tuple[int, int, int, int]:
+        return (
+            mode.get("color", 0),
+            mode.get("mode", 2),
+            mode.get("cycle", 20),
+            mode.get("speed", 128),
+        )
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def set(self, mode: Dict) -> None:
+        """Queue mode; replaces any update that was not flushed yet."""
+        if not mode:
+            return
+        with self._lock:
+            self._pending = mode
+
+    def flush(self) -> None:
+        """Write the queued mode, if any."""
+        mode = self._take_pending()
+        if mode is not None:
+            self.apply(mode)
+
+    def apply(self, mode: Dict) -> None:
+        """Write mode now unless it is already active. Never sleeps."""
+        key = self._key(mode)
+        if key == self._current:
+            self._skip()
+            return
+        color, led_mode, cycles, speed = key
+        try:
+            self._sensor.set_led(color=color, mode=led_mode, cycles=cycles, speed=speed)
+            self._written(key)
+        except Exception as e:
+            self._failed(e)
+
+    def off(self) -> None:
+        """Drop queued updates and switch the LED off."""
+        self._take_pending()
+        self.apply(settings.LED.get("off", {"mode": 4}))
+
+    # Coroutine variants for AsyncFingerprint sensors
+    async def flush_async(self) -> None:
+        mode = self._take_pending()
+        if mode is not None:
+            await self.apply_async(mode)
+
+    async def apply_async(self, mode: Dict) -> None:
+        key = self._key(mode)
+        if key == self._current:
+            self._skip()
+            return
+        color, led_mode, cycles, speed = key
+        try:
+            await self._sensor.set_led(color=color, mode=led_mode, cycles=cycles, speed=speed)
+            self._written(key)
+        except Exception as e:
+            self._failed(e)
+
+    async def off_async(self) -> None:
+        self._take_pending()
+        await self.apply_async(settings.LED.get("off", {"mode": 4}))
+
+    def forget(self) -> None:
+        """The LED state is unknown (the sensor may have restarted): write the next mode even if it looks active."""
+        self._current = None
+
+    def _take_pending(self) -> Optional[Dict]:
+        with self._lock:
+            mode, self._pending = self._pending, None
+        return mode
+
+    def _skip(self) -> None:
+        metrics.inc("led_writes_total", port=self._port, result="skipped")
+
+    def _written(self, key: Tuple[int, int, int, int]) -> None:
+        metrics.inc("led_writes_total", port=self._port, result="written")
+        animated = key[1] in _ANIMATED_MODES and key[2] > 0
+        self._current = None if animated else key
+        self.logger.debug("LED configured: %s", key)
+
+    def _failed(self, error: Exception) -> None:
+        self._current = None
+        metrics.inc("led_writes_total", port=self._port, result="failed")
+        self.logger.warning("⚠️ Failed to configure LED: %s", error)
@@ -0,0 +1,210 @@
+"""
+Host-side 1:N matching (settings.IDENTIFY_MODE = "host"): the sensor only captures the
+probe and extracts its char template, the search over all users runs here.
+
+- Char templates are decoded into minutiae arrays (x, y, direction). The R503 char/model
+  template layout is not published, so decoders are registered per layout with
+  `register_decoder` by the modules listed in settings.HOST_MATCH_DECODERS (the
+  simulator's: `src.sim.minutiae`).
+- Every minutia is described by its nearest neighbours (distances and directions relative
+  to its own), which does not change when the finger is shifted or rotated on the
+  sensor, so no alignment search is needed.
+- `GalleryIndex` keeps the descriptors of every user in one padded float16 array. A probe
+  is scored against a block of users with one matrix product; blocks run in parallel on
+  a thread pool (NumPy releases the GIL in the product and the reductions).
+
+Requires NumPy (the "match" extra).
+"""
+
+# Standard Library
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import importlib
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Third Library
+import numpy as np
+
+from src.core.template import Template, TemplateFormat
+
+# Minutiae kept per template (the rest are dropped) and neighbours per descriptor
+MAX_MINUTIAE = 64
+NEIGHBOURS = 3
+# Per neighbour: distance / DISTANCE_SCALE, cos/sin of its direction and cos/sin of the
+# bearing to it, both relative to the minutia's own direction
+FEATURES = 5
+DESCRIPTOR_SIZE = NEIGHBOURS * FEATURES
+DISTANCE_SCALE = 32.0
+# Squared descriptor distance under which two minutiae count as the same one
+MATCH_TOLERANCE = 0.15
+# Stored rows are [descriptor, |descriptor|^2, 1] so that one product with a probe row
+# [-2 * descriptor, 1, |descriptor|^2] gives the squared distance. Padding rows are
+# zero with a huge norm: far from everything.
+_ROW_SIZE = DESCRIPTOR_SIZE + 2
+_PADDING_NORM = 1e4
+
+# decoder(template data) -> (n, 3) float32 array of x, y (pixels) and direction (radians)
+MinutiaeDecoder = Callable[[bytes], np.ndarray]
+_decoders: Dict[str, MinutiaeDecoder] = {}
+
+
+def register_decoder(layout: str, decoder: MinutiaeDecoder) -> None:
+    """Make char templates of layout decodable (e.g. for a sensor firmware's template layout)."""
+    _decoders[layout] = decoder
+
+
+def load_decoders(modules: Iterable[str]) -> None:
+    """Import decoder modules (settings.HOST_MATCH_DECODERS); each registers its layouts."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+def get_decoder(layout: str) -> MinutiaeDecoder:
+    decoder = _decoders.get(layout)
+    if decoder is None:
+        raise ValueError(
+            f"No minutiae decoder for template layout {layout!r} (known: {', '.join(sorted(_decoders)) or 'none'}). "
+            "The R503 char template layout is vendor specific; list a module that registers one in "
+            "HOST_MATCH_DECODERS."
+        )
+    return decoder
+
+
+def decode_minutiae(template: Template, layout: str) -> np.ndarray:
+    if template.format != TemplateFormat.CHAR:
+        raise ValueError("Host matching needs char templates, not raw images")
+    return get_decoder(layout)(template.data)
+
+
+def describe(minutiae: np.ndarray) -> np.ndarray:
+    """(n, DESCRIPTOR_SIZE) float32 neighbourhood descriptors of (n, 3) minutiae."""
+    minutiae = np.asarray(minutiae, np.float32)[:MAX_MINUTIAE]
+    n = len(minutiae)
+    if n <= NEIGHBOURS:
+        raise ValueError(f"Too few minutiae to match ({n})")
+    xy, direction = minutiae[:, :2], minutiae[:, 2]
+    delta = xy[None, :, :] - xy[:, None, :]  # delta[i, j]: from minutia i to j
+    distance = np.hypot(delta[..., 0], delta[..., 1])
+    np.fill_diagonal(distance, np.inf)
+    rows = np.arange(n)[:, None]
+    nearest = np.argsort(distance, axis=1)[:, :NEIGHBOURS]
+    relative = direction[nearest] - direction[:, None]
+    bearing = np.arctan2(delta[rows, nearest, 1], delta[rows, nearest, 0]) - direction[:, None]
+    features = np.stack(
+        (
+            distance[rows, nearest] / DISTANCE_SCALE,
+            np.cos(relative),
+            np.sin(relative),
+            np.cos(bearing),
+            np.sin(bearing),
+        ),
+        axis=-1,
+    )
+    return features.reshape(n, DESCRIPTOR_SIZE).astype(np.float32)
+
+
+def _resized(array: np.ndarray, rows: int) -> np.ndarray:
+    grown = np.empty((rows,) + array.shape[1:], array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class GalleryIndex:
+    """
+    Minutiae descriptors of every enrolled user, searched with `search()`.
+
+    Users are rows of one (capacity, MAX_MINUTIAE, DESCRIPTOR_SIZE + 2) float16 array,
+    about 2 KB per user (100k users: ~220 MB), so a block of users is scored against the
+    probe with a single matrix product.
+    """
+
+    def __init__(self, layout: str, workers: int = 0, block_size: int = 1024):
+        get_decoder(layout)  # fail early on an unknown layout
+        self.layout = layout
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="gallery-match") if self.workers > 1 else None
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._descriptors = np.empty((0, MAX_MINUTIAE, _ROW_SIZE), np.float16)
+        self._counts = np.empty(0, np.int32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._rows
+
+    def put(self, user_id: str, template: Template) -> None:
+        """Add or replace the template of user_id; ValueError when it cannot be decoded."""
+        descriptors = describe(decode_minutiae(template, self.layout))
+        rows = np.zeros((MAX_MINUTIAE, _ROW_SIZE), np.float16)
+        rows[:, DESCRIPTOR_SIZE] = _PADDING_NORM
+        rows[: len(descriptors), :DESCRIPTOR_SIZE] = descriptors
+        rows[: len(descriptors), DESCRIPTOR_SIZE] = np.einsum("kd,kd->k", descriptors, descriptors)
+        rows[: len(descriptors), DESCRIPTOR_SIZE + 1] = 1
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._counts):
+                    capacity = max(64, 2 * row)
+                    self._descriptors = _resized(self._descriptors, capacity)
+                    self._counts = _resized(self._counts, capacity)
+                self._ids.append(user_id)
+                self._rows[user_id] = row
+            self._descriptors[row] = rows
+            self._counts[row] = len(descriptors)
+
+    def remove(self, user_id: str) -> bool:
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if row != last:
+                # move the last user into the hole
+                moved = self._ids[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+                self._descriptors[row] = self._descriptors[last]
+                self._counts[row] = self._counts[last]
+            self._ids.pop()
+            return True
+
+    def search(self, probe: Template, threshold: float, top: int = 1) -> List[Tuple[str, float]]:
+        """
+        Users whose score against probe reaches threshold, best first (at most top).
+        The score is the share of minutiae found in both templates, 0-100.
+        """
+        descriptors = describe(decode_minutiae(probe, self.layout))
+        columns = np.empty((_ROW_SIZE, len(descriptors)), np.float32)
+        columns[:DESCRIPTOR_SIZE] = -2 * descriptors.T
+        columns[DESCRIPTOR_SIZE] = 1
+        columns[DESCRIPTOR_SIZE + 1] = np.einsum("md,md->m", descriptors, descriptors)
+        with self._lock:
+            count = len(self._ids)
+            if not count:
+                return []
+            blocks = [(start, min(start + self.block_size, count)) for start in range(0, count, self.block_size)]
+            score = functools.partial(self._score_block, columns)
+            mapper = self._pool.map if self._pool is not None and len(blocks) > 1 else map
+            scores = np.concatenate(list(mapper(score, blocks)))
+            best = np.argsort(scores)[::-1][:top] if top > 1 else [int(np.argmax(scores))]
+            return [(self._ids[row], float(scores[row])) for row in best if scores[row] >= threshold]
+
+    def _score_block(self, probe: np.ndarray, bounds: Tuple[int, int]) -> np.ndarray:
+        start, end = bounds
+        gallery = self._descriptors[start:end].reshape(-1, _ROW_SIZE).astype(np.float32)
+        # squared distance between every gallery descriptor (rows) and probe descriptor (columns)
+        distances = gallery @ probe
+        nearest = distances.reshape(end - start, MAX_MINUTIAE, probe.shape[1]).min(axis=1)
+        matched = np.count_nonzero(nearest < MATCH_TOLERANCE, axis=1)
+        return 200.0 * matched / (probe.shape[1] + self._counts[start:end])
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
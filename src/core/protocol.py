@@ -0,0 +1,132 @@
+"""R503 / ZFM packet protocol helpers shared by the async client and the simulator.
+
+Packet layout (big endian):
+    start code (2) | address (4) | packet type (1) | length (2) | payload (length - 2) | checksum (2)
+The checksum is the 16-bit sum of packet type, length bytes and payload.
+"""
+
+# Standard Library
+import struct
+from typing import Iterator, List, Sequence, Tuple
+
+STARTCODE = 0xEF01
+DEFAULT_ADDRESS = b"\xff\xff\xff\xff"
+HEADER_SIZE = 9
+
+# Packet types
+COMMANDPACKET = 0x01
+DATAPACKET = 0x02
+ACKPACKET = 0x07
+ENDDATAPACKET = 0x08
+
+# Instruction codes
+GETIMAGE = 0x01
+IMAGE2TZ = 0x02
+COMPARE = 0x03
+FINGERPRINTSEARCH = 0x04
+REGMODEL = 0x05
+STORE = 0x06
+LOAD = 0x07
+UPLOAD = 0x08
+DOWNLOAD = 0x09
+UPLOADIMAGE = 0x0A
+DOWNLOADIMAGE = 0x0B
+DELETE = 0x0C
+EMPTY = 0x0D
+SETSYSPARA = 0x0E
+READSYSPARA = 0x0F
+VERIFYPASSWORD = 0x13
+HISPEEDSEARCH = 0x1B
+TEMPLATECOUNT = 0x1D
+TEMPLATEREAD = 0x1F
+SETAURA = 0x35
+SOFTRESET = 0x3D
+GETECHO = 0x53
+
+# System parameter numbers for SETSYSPARA
+PARAM_BAUDRATE = 4
+PARAM_SECURITY_LEVEL = 5
+PARAM_PACKET_SIZE = 6
+
+# Data packet size codes (system parameter) -> payload bytes per data packet
+PACKET_SIZES = {0: 32, 1: 64, 2: 128, 3: 256}
+# Baud rate system parameter N: the link runs at N * 9600 baud
+BAUDRATE_UNIT = 9600
+MAX_BAUDRATE_CODE = 12
+
+
+def baudrate_code(baudrate: int) -> int:
+    """SETSYSPARA value for baudrate (a multiple of 9600 up to 115200)."""
+    code, remainder = divmod(baudrate, BAUDRATE_UNIT)
+    if remainder or not 1 <= code <= MAX_BAUDRATE_CODE:
+        raise ValueError(f"Unsupported baud rate: {baudrate}")
+    return code
+
+
+def packet_size_code(size: int) -> int:
+    """SETSYSPARA value for a data packet payload of size bytes (32, 64, 128 or 256)."""
+    for code, payload in PACKET_SIZES.items():
+        if payload == size:
+            return code
+    raise ValueError(f"Unsupported data packet size: {size}")
+
+
+def checksum(packet_type: int, length: int, payload: bytes) -> int:
+    return (packet_type + (length >> 8) + (length & 0xFF) + sum(payload)) & 0xFFFF
+
+
+def encode_packet(packet_type: int, payload: Sequence[int], address: bytes = DEFAULT_ADDRESS) -> bytes:
+    payload = bytes(payload)
+    length = len(payload) + 2
+    return (
+        struct.pack(">H", STARTCODE)
+        + address
+        + struct.pack(">BH", packet_type, length)
+        + payload
+        + struct.pack(">H", checksum(packet_type, length, payload))
+    )
+
+
+def decode_header(header: bytes, address: bytes = DEFAULT_ADDRESS) -> Tuple[int, int]:
+    """Validate a 9-byte header and return (packet_type, payload length incl. checksum)."""
+    if len(header) != HEADER_SIZE:
+        raise RuntimeError("Failed to read data from sensor")
+    start = struct.unpack(">H", header[0:2])[0]
+    if start != STARTCODE:
+        raise RuntimeError("Incorrect packet data")
+    if header[2:6] != address:
+        raise RuntimeError("Incorrect address")
+    packet_type, length = struct.unpack(">BH", header[6:9])
+    return packet_type, length
+
+
+def verify_body(packet_type: int, length: int, body: bytes) -> bytes:
+    """Check the checksum of a packet body (payload + checksum) and return the payload."""
+    payload, received = body[:-2], struct.unpack(">H", body[-2:])[0]
+    if checksum(packet_type, length, payload) != received:
+        raise RuntimeError("Packet checksum mismatch")
+    return payload
+
+
+def encode_data(data: bytes, packet_size: int, address: bytes = DEFAULT_ADDRESS) -> Iterator[bytes]:
+    """Split data into DATA packets of packet_size bytes, the last one typed END."""
+    view = memoryview(data)
+    for start in range(0, len(view), packet_size):
+        chunk = view[start : start + packet_size]
+        last = start + packet_size >= len(view)
+        yield encode_packet(ENDDATAPACKET if last else DATAPACKET, chunk, address)
+
+
+def template_pages(library_size: int) -> int:
+    """Number of TEMPLATEREAD index pages (256 slots each)."""
+    return (library_size + 255) // 256
+
+
+def parse_index_page(page: int, bitmap: Sequence[int]) -> List[int]:
+    """Occupied slots from one 32-byte TEMPLATEREAD bitmap."""
+    slots = []
+    for i, byte in enumerate(bitmap[:32]):
+        for bit in range(8):
+            if byte & (1 << bit):
+                slots.append(page * 256 + i * 8 + bit)
+    return slots
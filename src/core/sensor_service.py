@@ -1,30 +1,126 @@
 # Standard Library
+from concurrent.futures import ThreadPoolExecutor
 import time
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 # Third Library
 import adafruit_fingerprint
-import serial
 from serial import SerialException
 
 from src.config import settings
+from src.core import flow, protocol
+from src.core.cancel import CancelToken
+from src.core.capture import CaptureStats, PollSchedule
+from src.core.flow import Flow, Op, T
+from src.core.led import LedController
+from src.core.slot_allocator import SlotAllocator
 from src.core.status import SensorStatus, get_led_mode
+from src.core.template_cache import SensorTemplateCache
+from src.core.transport import open_uart
 from src.utils.logger import setup_logger
+from src.utils.metrics import metrics
+
+# Decrypts stored templates while the sensor is capturing (flow.start, pipelined verify)
+_loader_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="template-loader")
 
 
 class FingerprintSensorError(Exception):
     """Base exception for fingerprint sensor errors."""
 
 
+class R503Fingerprint(adafruit_fingerprint.Adafruit_Fingerprint):
+    """
+    adafruit_fingerprint driver with fixes for the calls the services rely on.
+    Data transfers move bytes (checksum-verified) instead of lists of ints.
+    """
+
+    def get_fpdata(self, sensorbuffer: str = "char", slot: int = 1) -> bytes:
+        """Upload the image or char buffer `slot` from the sensor."""
+        if sensorbuffer == "image":
+            self._send_packet([protocol.UPLOADIMAGE])
+        elif sensorbuffer == "char":
+            self._send_packet([protocol.UPLOAD, slot if slot in (1, 2) else 2])
+        else:
+            raise RuntimeError("Unknown sensor buffer type")
+        if self._get_packet(12)[0] != adafruit_fingerprint.OK:
+            raise RuntimeError("Failed to read data from sensor")
+        address = bytes(self.address)
+        data = bytearray()
+        while True:
+            packet_type, length = protocol.decode_header(self._uart.read(protocol.HEADER_SIZE), address)
+            if packet_type not in (protocol.DATAPACKET, protocol.ENDDATAPACKET):
+                raise RuntimeError("Incorrect packet data")
+            body = self._uart.read(length)
+            if len(body) != length:
+                raise RuntimeError("Failed to read data from sensor")
+            data += protocol.verify_body(packet_type, length, body)
+            if packet_type == protocol.ENDDATAPACKET:
+                return bytes(data)
+
+    def send_fpdata(self, data, sensorbuffer: str = "char", slot: int = 1) -> bool:
+        """Download data (any bytes-like object) into the image or char buffer `slot`."""
+        if sensorbuffer == "image":
+            self._send_packet([protocol.DOWNLOADIMAGE])
+        elif sensorbuffer == "char":
+            self._send_packet([protocol.DOWNLOAD, slot if slot in (1, 2) else 2])
+        else:
+            raise RuntimeError("Unknown sensor buffer type")
+        if self._get_packet(12)[0] != adafruit_fingerprint.OK:
+            return False
+        size = protocol.PACKET_SIZES.get(self.data_packet_size, 32)
+        self._uart.write(b"".join(protocol.encode_data(data, size, bytes(self.address))))
+        return True
+
+    def tune_link(self, baudrate: int, packet_size: int) -> Tuple[int, int]:
+        """
+        Raise the data packet length and the baud rate (never lowers either) and switch
+        the port to the new rate. If the sensor does not answer at the new rate the port
+        goes back to the old one; RuntimeError when it answers at neither.
+        Returns the (baud rate, data packet bytes) in effect.
+        """
+        size_code = protocol.packet_size_code(packet_size)
+        rate_code = protocol.baudrate_code(baudrate)
+        if size_code > self.data_packet_size:
+            self.set_sysparam(protocol.PARAM_PACKET_SIZE, size_code)
+        if rate_code > self.baudrate:
+            previous = self._uart.baudrate
+            # acknowledged at the old rate, then the sensor switches
+            self.set_sysparam(protocol.PARAM_BAUDRATE, rate_code)
+            self._uart.baudrate = baudrate
+            if not self._answers():
+                self._uart.baudrate = previous
+                if not self._answers():
+                    raise RuntimeError("Sensor not answering after baud rate change")
+                self.read_sysparam()
+        return self._uart.baudrate, protocol.PACKET_SIZES.get(self.data_packet_size, 32)
+
+    def _answers(self) -> bool:
+        self._uart.reset_input_buffer()
+        try:
+            return self.verify_password() == adafruit_fingerprint.OK
+        except RuntimeError:
+            return False
+
+    def compare_templates(self) -> int:
+        result = super().compare_templates()
+        # upstream stores the unpacked 1-tuple instead of the score
+        if isinstance(self.confidence, tuple):
+            self.confidence = self.confidence[0]
+        return result
+
+
 class FingerprintSensorService:
     def __init__(
         self,
         port: Optional[str] = None,
         baudrate: Optional[str] = None,
         on_status: Optional[Callable[[SensorStatus], None]] = None,
+        sensor: Optional[adafruit_fingerprint.Adafruit_Fingerprint] = None,
     ):
         """
         Initialize fingerprint sensor over UART.
+        When an already connected `sensor` is given (e.g. from the session pool) it is
+        reused as-is and its UART is left open on close().
         Raises FingerprintSensorError if connection fails.
         """
         self.logger = setup_logger("FingerprintSensor")
@@ -32,12 +128,24 @@ class FingerprintSensorService:
         self._baudrate = baudrate or settings.BAUDRATE
         self._timeout = settings.SENSOR_TIME_OUT
         self.on_status = on_status or (lambda status, msg=None: None)
+        self._owns_uart = sensor is None
+        # Slot bookkeeping shared by every service on the same sensor (set by the session pool)
+        self.template_cache: Optional[SensorTemplateCache] = None
+        self.slot_allocator: Optional[SlotAllocator] = None
+        # Set when the request running on this service is cancelled (see session_pool.call)
+        self.cancel_token = CancelToken()
+
+        if sensor is not None:
+            self._sensor = sensor
+            self.led = LedController(sensor, self._port)
+            return
 
         try:
-            uart = serial.Serial(self._port, baudrate=self._baudrate, timeout=self._timeout)
+            uart = open_uart(self._port, self._baudrate, self._timeout)
             if not uart.is_open:
                 raise FingerprintSensorError("UART port not open")
-            self._sensor = adafruit_fingerprint.Adafruit_Fingerprint(uart)
+            self._sensor = R503Fingerprint(uart)
+            self.led = LedController(self._sensor, self._port)
             self.logger.info("Fingerprint sensor initialized successfully.")
         except SerialException as e:
             self.logger.exception("SerialException: Could not connect to sensor.")
@@ -46,13 +154,26 @@ class FingerprintSensorService:
             self.logger.exception("Unexpected error initializing sensor.")
             raise FingerprintSensorError("Unknown sensor error") from e
 
+    def bind_session(
+        self,
+        template_cache: Optional[SensorTemplateCache] = None,
+        slot_allocator: Optional[SlotAllocator] = None,
+        led: Optional[LedController] = None,
+    ) -> None:
+        """Share per-sensor state kept by the session pool across services."""
+        self.template_cache = template_cache
+        self.slot_allocator = slot_allocator
+        if led is not None:
+            self.led = led
+
     def send(self, status: SensorStatus, message: str = "", **kwargs) -> dict:
         """
         Send sensor status to callback and return a standardized response.
+        The LED change is queued and written at the next idle point (see LedController).
         """
         # Log for debugging or traceability
         self.logger.info(f"[{status.name}] {message}")
-        self.config_led(get_led_mode(status))
+        self.led.set(get_led_mode(status))
         # Optional: trigger external callback (for UI feedback, etc.)
         if self.on_status:
             try:
@@ -86,33 +207,175 @@ class FingerprintSensorService:
 
         return response
 
+    # -------------------------
+    #   Flow Driver
+    # -------------------------
+    def _run(self, steps: Flow[T]) -> T:
+        """Run a flow (see src/core/flow.py) with blocking I/O; returns its result."""
+        result, error = None, None
+        while True:
+            try:
+                op = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = self._perform(op), None
+            except BaseException as e:
+                result, error = None, e
+
+    def _perform(self, op: Op):
+        """
+        Blocking version of op. Raises OperationCancelled before every exchange with the
+        sensor once `self.cancel_token` is cancelled.
+        """
+        if op.kind == "sensor":
+            self.cancel_token.check()
+            return getattr(self._sensor, op.target)(*op.args)
+        if op.kind == "sleep":
+            return self.cancel_token.sleep(*op.args)
+        if op.kind == "flush_led":
+            self.cancel_token.check()
+            return self.led.flush()
+        if op.kind == "blocking":
+            return op.target(*op.args)
+        if op.kind == "start":
+            return _loader_pool.submit(op.target, *op.args)
+        if op.kind == "wait":
+            return op.target.result()
+        raise ValueError(f"Unknown flow op {op.kind!r}")
+
+    # -------------------------
+    #   Instrumentation
+    # -------------------------
+    def span(self, stage: str):
+        """Time a block into the stage_seconds histogram of this sensor."""
+        return metrics.span(stage, port=self._port)
+
+    def _record_capture(self, stats: CaptureStats) -> None:
+        outcome = "ok" if stats.success else "error"
+        metrics.observe("stage_seconds", stats.duration, stage="capture", outcome=outcome, port=self._port)
+        if stats.first_image is not None:
+            # capture latency: from the start of polling (the prompt) to the first image
+            metrics.observe("stage_seconds", stats.first_image, stage="first_image", outcome="ok", port=self._port)
+        metrics.inc("capture_polls_total", stats.nofinger_polls, port=self._port, result="nofinger")
+        metrics.inc("capture_polls_total", stats.polls - stats.nofinger_polls, port=self._port, result="image")
+
+    def _image_problems(self, data) -> List[str]:
+        """Grade a raw image read back from the sensor against settings.IMAGE_MIN_*."""
+        from src.core import image  # optional dependency ("match" extra)
+
+        with self.span("grade_image"):
+            quality = image.assess(image.unpack(data))
+        problems = quality.problems(
+            settings.IMAGE_MIN_COVERAGE, settings.IMAGE_MIN_CONTRAST, settings.IMAGE_MIN_SHARPNESS
+        )
+        self.logger.info("Image quality: %s", quality)
+        metrics.inc("image_quality_total", port=self._port, result="rejected" if problems else "ok")
+        return problems
+
     # -------------------------
     #   Sensor Core Methods
     # -------------------------
-    def capture(self, timeout: int = 5, buffer: int = 1) -> bool:
+    def capture(
+        self,
+        timeout: int = 5,
+        buffer: int = 1,
+        prompted: bool = False,
+        idle: Optional[Callable[[], Flow[bool]]] = None,
+    ) -> bool:
+        """
+        Poll for a finger and convert the image into char `buffer`.
+
+        Polls fast right after the prompt and backs off while no finger is present.
+        PLACE_FINGER is only emitted when the sensor goes into the no-finger state
+        (not on every poll); pass prompted=True when the caller already prompted.
+        The `idle` flow runs between no-finger polls to use the otherwise idle UART; when
+        it returns True (it did sensor work) the next poll follows without a delay.
+        Duration and time to the first image go to stage_seconds. Raises OperationCancelled
+        (within one poll interval) once `self.cancel_token` is cancelled.
+        """
+        return self._run(self._capture(timeout, buffer, prompted, idle))
+
+    def _capture(
+        self,
+        timeout: int = 5,
+        buffer: int = 1,
+        prompted: bool = False,
+        idle: Optional[Callable[[], Flow[bool]]] = None,
+    ) -> Flow[bool]:
         self.logger.info("capture finger image... ")
-        start_time = time.time()
-        while (time.time() - start_time) <= timeout:
-            status = self._sensor.get_image()
-            if status == adafruit_fingerprint.OK:
-                self.logger.info("Fingerprint image captured successfully.")
-                if self._template(buffer):
-                    return True
-            if status == adafruit_fingerprint.NOFINGER:
-                self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
-                time.sleep(0.8)
-                continue
-            if status == adafruit_fingerprint.IMAGEFAIL:
-                self.logger.error("Imaging error.")
+        schedule = PollSchedule()
+        stats = CaptureStats(buffer=buffer)
+        waiting = prompted
+        start_time = time.monotonic()
+        try:
+            while (time.monotonic() - start_time) <= timeout:
+                yield flow.flush_led()
+                status = yield flow.sensor("get_image")
+                stats.polls += 1
+                if status == adafruit_fingerprint.OK:
+                    if stats.first_image is None:
+                        stats.first_image = time.monotonic() - start_time
+                    self.logger.info("Fingerprint image captured successfully.")
+                    waiting = False
+                    if (yield from self._template(buffer)):
+                        stats.success = True
+                        return True
+                    schedule.reset()
+                    continue
+                if status == adafruit_fingerprint.NOFINGER:
+                    stats.nofinger_polls += 1
+                    if not waiting:
+                        self.send(SensorStatus.PLACE_FINGER, "Place your finger on the sensor")
+                        stats.prompts += 1
+                        waiting = True
+                        schedule.reset()
+                    yield flow.flush_led()
+                    if idle is not None and (yield from idle()):
+                        continue
+                    yield flow.sleep(schedule.next_delay())
+                    continue
+                if status == adafruit_fingerprint.IMAGEFAIL:
+                    self.logger.error("Imaging error.")
+                    break
+                self.logger.error("Unknown error while capturing image.")
                 break
-            self.logger.error("Unknown error while capturing image.")
-            break
-        self.logger.error("Timeout or failed to read finger.")
+            self.logger.error("Timeout or failed to read finger.")
+            return False
+        finally:
+            stats.duration = time.monotonic() - start_time
+            self._record_capture(stats)
+            self.logger.info(
+                "Capture buffer=%d success=%s polls=%d first_image=%s duration=%.3fs",
+                buffer,
+                stats.success,
+                stats.polls,
+                f"{stats.first_image:.3f}s" if stats.first_image is not None else "-",
+                stats.duration,
+            )
+
+    def wait_for_lift(self, timeout: int = 5) -> bool:
+        """
+        Poll until no finger is on the sensor, instead of pausing a fixed time between
+        captures. False when the finger is still there after timeout seconds.
+        """
+        return self._run(self._wait_for_lift(timeout))
+
+    def _wait_for_lift(self, timeout: int = 5) -> Flow[bool]:
+        start_time = time.monotonic()
+        with self.span("lift"):
+            while (time.monotonic() - start_time) <= timeout:
+                yield flow.flush_led()
+                if (yield flow.sensor("get_image")) == adafruit_fingerprint.NOFINGER:
+                    return True
+                yield flow.sleep(settings.CAPTURE_POLL_MIN)
+        self.logger.error("Finger not removed.")
         return False
 
-    def _template(self, buffer: int = 1):
+    def _template(self, buffer: int = 1) -> Flow[bool]:
         self.logger.info("Templating...")
-        status = self._sensor.image_2_tz(buffer)
+        with self.span("template"):
+            status = yield flow.sensor("image_2_tz", buffer)
         if status == adafruit_fingerprint.OK:
             self.logger.info("Templated")
             return True
@@ -136,30 +399,45 @@ class FingerprintSensorService:
             "library_size": getattr(self._sensor, "library_size", None),
         }
 
+    def sync_library(self, force: bool = False) -> None:
+        """
+        Read the sensor index table once and sync the slot bookkeeping (template cache
+        and slot allocator). Does nothing when both are already in sync.
+        """
+        return self._run(self._sync_library(force))
+
+    def _sync_library(self, force: bool = False) -> Flow[None]:
+        cache, slots = self.template_cache, self.slot_allocator
+        if not force and (cache is None or cache.synced) and (slots is None or slots.synced):
+            return
+        yield flow.sensor("read_templates")
+        templates = self._sensor.templates
+        if cache is not None:
+            cache.sync(templates)
+        if slots is not None:
+            slots.sync(self._sensor.library_size, templates)
+
     # -------------------------
     #   LED Control
     # -------------------------
 
     def config_led(self, mode: Dict) -> None:
-        """Configure the sensor LED according to given mode dict."""
-        try:
-            self._sensor.set_led(
-                color=mode.get("color", 0),
-                mode=mode.get("mode", 2),
-                cycles=mode.get("cycle", 20),
-                speed=mode.get("speed", 128),
-            )
-            self.logger.debug("LED configured: %s", mode)
-            time.sleep(0.2)
-        except Exception as e:
-            self.logger.warning("⚠️ Failed to configure LED: %s", e)
+        """Configure the sensor LED according to given mode dict (written immediately)."""
+        self.led.apply(mode)
 
     # -------------------------
     #   Cleanup
     # -------------------------
-    def clear_library(self):
+    def clear_library(self) -> bool:
+        return self._run(self._clear_library())
+
+    def _clear_library(self) -> Flow[bool]:
         try:
-            if self._sensor.empty_library() == adafruit_fingerprint.OK:
+            if (yield flow.sensor("empty_library")) == adafruit_fingerprint.OK:
+                if self.template_cache is not None:
+                    self.template_cache.clear()
+                if self.slot_allocator is not None:
+                    self.slot_allocator.sync(self._sensor.library_size, ())
                 self.logger.info("🔴 Sensor connection closed.")
                 return True
             return False
@@ -168,9 +446,16 @@ class FingerprintSensorService:
             return False
 
     def close(self):
-        """Safely turn off LED and close UART connection."""
+        """
+        Safely turn off LED and close UART connection.
+        Pooled connections stay open and only show the last queued status; the pool
+        switches the LED off once the sensor has been idle for a while.
+        """
         try:
-            self._sensor.set_led(mode=4)  # LED off
+            if not self._owns_uart:
+                self.led.flush()
+                return
+            self.led.off()
             self.__del__()
             self.logger.info("🔴 Sensor connection closed.")
         except Exception:
@@ -178,6 +463,8 @@ class FingerprintSensorService:
 
     def __del__(self):
         """Destructor to ensure safe resource cleanup."""
+        if not getattr(self, "_owns_uart", False):
+            return
         try:
             self._sensor.close_uart()
         except Exception as e:
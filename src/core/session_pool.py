@@ -0,0 +1,398 @@
+# Standard Library
+import asyncio
+from contextlib import asynccontextmanager
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Type
+
+# Third Library
+import adafruit_fingerprint
+import serial
+from serial import SerialException
+
+from src.config import settings
+from src.core.async_sensor import AsyncFingerprint
+from src.core.async_service import AsyncEnrollService, AsyncIdentifyService
+from src.core.cancel import OperationCancelled
+from src.core.enroll_service import FingerEnrollService
+from src.core.identify_service import IdentifyService
+from src.core.led import LedController
+from src.core.sensor_service import FingerprintSensorError, FingerprintSensorService, R503Fingerprint
+from src.core.slot_allocator import SlotAllocator
+from src.core.status import SensorStatus
+from src.core.template_cache import SensorTemplateCache
+from src.core.transport import open_uart
+from src.utils.logger import setup_logger
+from src.utils.metrics import metrics
+
+
+# Service classes used instead of the threaded ones when a session runs the asyncio transport
+ASYNC_SERVICES = {
+    FingerEnrollService: AsyncEnrollService,
+    IdentifyService: AsyncIdentifyService,
+}
+
+
+async def call(func: Callable, *args):
+    """
+    Await coroutine functions directly; run blocking ones in a worker thread.
+
+    A thread cannot be interrupted, so when the awaiting task is cancelled the service's
+    cancel token is set and the worker is still awaited: it stops at its next check (within
+    one poll interval) and the session stays locked until the sensor is no longer in use.
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    worker = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        token = getattr(getattr(func, "__self__", None), "cancel_token", None)
+        if token is not None:
+            token.cancel()
+        while not worker.done():
+            try:
+                await asyncio.wait({worker})
+            except asyncio.CancelledError:
+                pass
+        if not worker.cancelled():
+            worker.exception()  # OperationCancelled (or whatever ended the call) is not reported
+        raise
+
+
+class SensorSession:
+    """
+    Long-lived UART connection to a single sensor port.
+    The connection is opened on first use, health-checked with one handshake packet
+    on every checkout and only re-opened after a SerialException.
+
+    With settings.LINK_TUNING the baud rate and data packet length are raised right after
+    opening. The sensor keeps its rate across power cycles, so a port that gets no answer
+    at the session's baud rate is retried at the other known rates.
+    """
+
+    def __init__(self, port: str, baudrate: int, transport: Optional[str] = None):
+        self.logger = setup_logger("SensorSession")
+        self.port = port
+        self.baudrate = baudrate
+        self.transport = transport or settings.SENSOR_TRANSPORT  # "thread" or "asyncio"
+        self.lock = asyncio.Lock()
+        self.cache = SensorTemplateCache()
+        self.slots = SlotAllocator()
+        self.led: Optional[LedController] = None
+        self.generation = 0  # bumped on every checkout, used to cancel stale idle LED-off
+        self.queue_depth = 0  # requests waiting for or holding this session
+        self.last_checkout = 0.0
+        self._uart: Optional[serial.SerialBase] = None
+        self._sensor: Optional[adafruit_fingerprint.Adafruit_Fingerprint] = None
+
+    @property
+    def is_async(self) -> bool:
+        return self.transport == "asyncio"
+
+    @property
+    def is_open(self) -> bool:
+        if self.is_async:
+            return self._sensor is not None and not self._sensor.stream.closed
+        return self._sensor is not None and self._uart is not None and self._uart.is_open
+
+    def _baudrates(self) -> List[int]:
+        """Rates to try when opening: the last working one first."""
+        return list(dict.fromkeys([self.baudrate, settings.BAUDRATE, settings.LINK_BAUDRATE]))
+
+    def _connect(self) -> R503Fingerprint:
+        for baudrate in self._baudrates():
+            self._uart = open_uart(self.port, baudrate, settings.SENSOR_TIME_OUT)
+            if not self._uart.is_open:
+                raise FingerprintSensorError("UART port not open")
+            try:
+                sensor = R503Fingerprint(self._uart)
+            except RuntimeError:
+                self.logger.warning("No answer from sensor on %s at %d baud.", self.port, baudrate)
+                self._uart.close()
+                continue
+            self.baudrate = baudrate
+            return sensor
+        self._uart = None
+        raise FingerprintSensorError("Sensor not answering")
+
+    def _tune_link(self) -> None:
+        try:
+            baudrate, packet_size = self._sensor.tune_link(settings.LINK_BAUDRATE, settings.LINK_PACKET_SIZE)
+        except ValueError as e:
+            self.logger.error("Link tuning on %s skipped: %s", self.port, e)
+            return
+        except RuntimeError as e:
+            self.logger.warning("Link tuning on %s failed, reconnecting untuned: %s", self.port, e)
+            metrics.inc("retries_total", port=self.port, kind="link_tuning")
+            self._uart.close()
+            self._sensor = self._connect()
+            return
+        self.baudrate = baudrate
+        self.logger.info("Link on %s: %d baud, %d byte data packets", self.port, baudrate, packet_size)
+
+    def open(self) -> adafruit_fingerprint.Adafruit_Fingerprint:
+        """Open UART and perform the sensor handshake (and link tuning when enabled)."""
+        try:
+            self._sensor = self._connect()
+            if settings.LINK_TUNING:
+                self._tune_link()
+            self.led = LedController(self._sensor, self.port)
+            self.logger.info("Sensor session opened on %s", self.port)
+            return self._sensor
+        except SerialException as e:
+            self.close()
+            self.logger.exception("SerialException: Could not connect to sensor on %s.", self.port)
+            raise FingerprintSensorError("Sensor not connected") from e
+        except FingerprintSensorError:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            self.logger.exception("Unexpected error opening sensor session on %s.", self.port)
+            raise FingerprintSensorError("Unknown sensor error") from e
+
+    def ensure_open(self) -> adafruit_fingerprint.Adafruit_Fingerprint:
+        """
+        Return a healthy sensor connection, opening or re-opening it when needed.
+        A stale reply left in the input buffer is flushed and the handshake retried once.
+        """
+        if not self.is_open:
+            return self.open()
+        try:
+            if self._handshake():
+                return self._sensor
+            metrics.inc("retries_total", port=self.port, kind="handshake")
+            # the sensor may have restarted (LED off) behind the still open port
+            self.led.forget()
+            self._uart.reset_input_buffer()
+            if self._handshake():
+                return self._sensor
+            raise FingerprintSensorError("Sensor handshake failed")
+        except SerialException:
+            self.logger.warning("Sensor session on %s lost, reconnecting.", self.port)
+            metrics.inc("retries_total", port=self.port, kind="reconnect")
+            self.invalidate()
+            return self.open()
+
+    async def _connect_async(self) -> AsyncFingerprint:
+        for baudrate in self._baudrates():
+            try:
+                sensor = await AsyncFingerprint.open(self.port, baudrate)
+            except RuntimeError:
+                self.logger.warning("No answer from sensor on %s at %d baud.", self.port, baudrate)
+                continue
+            self.baudrate = baudrate
+            return sensor
+        raise FingerprintSensorError("Sensor not answering")
+
+    async def _tune_link_async(self) -> None:
+        try:
+            baudrate, packet_size = await self._sensor.tune_link(settings.LINK_BAUDRATE, settings.LINK_PACKET_SIZE)
+        except ValueError as e:
+            self.logger.error("Link tuning on %s skipped: %s", self.port, e)
+            return
+        except RuntimeError as e:
+            self.logger.warning("Link tuning on %s failed, reconnecting untuned: %s", self.port, e)
+            metrics.inc("retries_total", port=self.port, kind="link_tuning")
+            self._sensor.stream.close()
+            self._sensor = await self._connect_async()
+            return
+        self.baudrate = baudrate
+        self.logger.info("Link on %s: %d baud, %d byte data packets", self.port, baudrate, packet_size)
+
+    async def open_async(self) -> AsyncFingerprint:
+        """Open the port as an asyncio stream and perform the sensor handshake (and link tuning when enabled)."""
+        try:
+            self._sensor = await self._connect_async()
+            if settings.LINK_TUNING:
+                await self._tune_link_async()
+            self.led = LedController(self._sensor, self.port)
+            self.logger.info("Async sensor session opened on %s", self.port)
+            return self._sensor
+        except OSError as e:
+            self.close()
+            self.logger.exception("Could not connect to sensor on %s.", self.port)
+            raise FingerprintSensorError("Sensor not connected") from e
+        except Exception as e:
+            self.close()
+            self.logger.exception("Unexpected error opening async sensor session on %s.", self.port)
+            raise FingerprintSensorError("Unknown sensor error") from e
+
+    async def ensure_open_async(self) -> AsyncFingerprint:
+        """Coroutine version of ensure_open for the asyncio transport."""
+        if not self.is_open:
+            return await self.open_async()
+        try:
+            for attempt in range(2):
+                if attempt:
+                    metrics.inc("retries_total", port=self.port, kind="handshake")
+                    self.led.forget()
+                try:
+                    if await self._sensor.verify_password() == adafruit_fingerprint.OK:
+                        return self._sensor
+                except RuntimeError:
+                    pass
+                self._sensor.stream.reset_input_buffer()
+            raise FingerprintSensorError("Sensor handshake failed")
+        except OSError:
+            self.logger.warning("Sensor session on %s lost, reconnecting.", self.port)
+            metrics.inc("retries_total", port=self.port, kind="reconnect")
+            self.invalidate()
+            return await self.open_async()
+
+    def _handshake(self) -> bool:
+        try:
+            return self._sensor.verify_password() == adafruit_fingerprint.OK
+        except RuntimeError:
+            return False
+
+    def invalidate(self):
+        """Drop the connection (and slot bookkeeping) so the next checkout reconnects and resyncs."""
+        self.close()
+        self.cache.invalidate()
+        self.slots.invalidate()
+
+    def close(self):
+        handle = self._sensor.stream if self.is_async and self._sensor is not None else self._uart
+        if handle is not None:
+            try:
+                handle.close()
+            except Exception as e:
+                self.logger.warning("Failed to close sensor session on %s: %s", self.port, e)
+        self._uart = None
+        self._sensor = None
+        self.led = None
+
+
+class SensorSessionPool:
+    """Keeps one `SensorSession` per serial port and hands out services bound to it."""
+
+    def __init__(self):
+        self.logger = setup_logger("SensorSessionPool")
+        self._sessions: Dict[str, SensorSession] = {}
+        self._guard = threading.Lock()
+        self._background: Set[asyncio.Task] = set()
+
+    def least_busy(self) -> SensorSession:
+        """Configured session with the shortest queue; ties go to the least recently used one."""
+        sessions = [self.get(port) for port in settings.sensor_ports]
+        return min(sessions, key=lambda s: (s.queue_depth, s.last_checkout))
+
+    def status(self) -> List[Dict]:
+        """Per-device queue depth and connection state."""
+        return [
+            {
+                "port": session.port,
+                "queue_depth": session.queue_depth,
+                "busy": session.lock.locked(),
+                "open": session.is_open,
+                "transport": session.transport,
+            }
+            for session in (self.get(port) for port in settings.sensor_ports)
+        ]
+
+    def get(self, port: Optional[str] = None, baudrate: Optional[int] = None) -> SensorSession:
+        port = port or settings.PORT
+        with self._guard:
+            session = self._sessions.get(port)
+            if session is None:
+                session = SensorSession(port, baudrate or settings.BAUDRATE)
+                self._sessions[port] = session
+            return session
+
+    @asynccontextmanager
+    async def checkout(
+        self,
+        service_cls: Type[FingerprintSensorService],
+        port: Optional[str] = None,
+        on_status: Optional[Callable[[SensorStatus], None]] = None,
+    ):
+        """
+        Lock the port's session, make sure it is healthy and yield a service bound to it.
+        Without a port the request goes to the least busy configured reader.
+        The UART stays open for the next request; the LED keeps showing the final status
+        and is switched off after settings.LED_IDLE_OFF_DELAY seconds without a new checkout.
+        """
+        session = self.get(port) if port else self.least_busy()
+        session.queue_depth += 1
+        session.last_checkout = time.monotonic()
+        try:
+            async with self._locked(session, service_cls, on_status) as service:
+                yield service
+        finally:
+            session.queue_depth -= 1
+        self._schedule_led_off(session)
+
+    @asynccontextmanager
+    async def _locked(
+        self,
+        session: SensorSession,
+        service_cls: Type[FingerprintSensorService],
+        on_status: Optional[Callable[[SensorStatus], None]],
+    ):
+        async with session.lock:
+            session.generation += 1
+            if session.is_async:
+                sensor = await session.ensure_open_async()
+                service_cls = ASYNC_SERVICES.get(service_cls, service_cls)
+            else:
+                sensor = await call(session.ensure_open)
+            service = service_cls(port=session.port, baudrate=session.baudrate, on_status=on_status, sensor=sensor)
+            service.bind_session(session.cache, session.slots, session.led)
+            try:
+                yield service
+            except (SerialException, ConnectionError):
+                session.invalidate()
+                raise
+            except (asyncio.CancelledError, OperationCancelled):
+                # the request was abandoned mid-operation: do not leave the LED prompting
+                self.logger.info("Request on %s cancelled.", session.port)
+                if session.led is not None:
+                    try:
+                        await call(session.led.off_async if session.is_async else session.led.off)
+                    except Exception:
+                        self.logger.exception("Failed to switch LED off (ignored).")
+                raise
+            finally:
+                try:
+                    await call(service.close)
+                except Exception:
+                    self.logger.exception("Error releasing sensor session (ignored).")
+
+    def _schedule_led_off(self, session: SensorSession):
+        delay = settings.LED_IDLE_OFF_DELAY
+        if delay < 0:
+            return
+        generation = session.generation
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self._spawn, self._led_off, session, generation)
+
+    def _spawn(self, func, *args):
+        task = asyncio.ensure_future(func(*args))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _led_off(self, session: SensorSession, generation: int):
+        """Switch the LED off unless the session was used again in the meantime."""
+        if session.lock.locked() or session.generation != generation:
+            return
+        async with session.lock:
+            if session.generation != generation or not session.is_open or session.led is None:
+                return
+            try:
+                await call(session.led.off_async if session.is_async else session.led.off)
+            except Exception:
+                self.logger.exception("Failed to switch LED off (ignored).")
+
+    def close_all(self):
+        with self._guard:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# Instance
+sensor_pool = SensorSessionPool()
@@ -0,0 +1,52 @@
+# Standard Library
+from collections import deque
+import threading
+from typing import Iterable, Optional
+
+
+class SlotAllocator:
+    """
+    Host-side view of which sensor library slots are free.
+
+    An occupancy bitmap and a FIFO free-list hand out and release slots in O(1).
+    The allocator is synced once from `read_templates` and then kept up to date locally
+    on every store/delete, so uploads never rescan the sensor index table.
+    """
+
+    def __init__(self):
+        self._used = bytearray()
+        self._free: deque[int] = deque()
+        self._lock = threading.Lock()
+        self.synced = False
+
+    def sync(self, library_size: int, occupied_slots: Iterable[int]):
+        """Rebuild from the library size and the slots reported by `read_templates`."""
+        used = bytearray(library_size)
+        for slot in occupied_slots:
+            if 0 <= slot < library_size:
+                used[slot] = 1
+        with self._lock:
+            self._used = used
+            self._free = deque(slot for slot in range(library_size) if not used[slot])
+            self.synced = True
+
+    def allocate(self) -> Optional[int]:
+        """Reserve the next free slot, or return None when the library is full."""
+        with self._lock:
+            while self._free:
+                slot = self._free.popleft()
+                if not self._used[slot]:
+                    self._used[slot] = 1
+                    return slot
+            return None
+
+    def release(self, slot: int):
+        with self._lock:
+            if self._used[slot]:
+                self._used[slot] = 0
+                self._free.append(slot)
+
+    def invalidate(self):
+        """Forget the state; the next upload resyncs from the sensor."""
+        with self._lock:
+            self.synced = False
@@ -17,17 +17,18 @@ class SensorStatus(Enum):
     NOT_FOUND = auto()
 
 
+# settings.LED entry shown for each status (looked up when used, so importing reads no settings)
 LED_MAP = {
-    SensorStatus.PLACE_FINGER: settings.LED.get("p_finger", {}),
-    SensorStatus.REMOVE_FINGER: settings.LED.get("r_finger", {}),
-    SensorStatus.PLACE_SAME_FINGER: settings.LED.get("p_finger", {}),
-    SensorStatus.PROCESSING: settings.LED.get("process", {}),
-    SensorStatus.SUCCESS: settings.LED.get("success", {}),
-    SensorStatus.ENROLLMISMATCH: settings.LED.get("error", {}),
-    SensorStatus.FAIL: settings.LED.get("error", {}),
-    SensorStatus.STORAGE_FULL: settings.LED.get("error", {}),
-    SensorStatus.LOCATION_OCCUPIED: settings.LED.get("error", {}),
-    SensorStatus.NOT_FOUND: settings.LED.get("error", {}),
+    SensorStatus.PLACE_FINGER: "p_finger",
+    SensorStatus.REMOVE_FINGER: "r_finger",
+    SensorStatus.PLACE_SAME_FINGER: "p_finger",
+    SensorStatus.PROCESSING: "process",
+    SensorStatus.SUCCESS: "success",
+    SensorStatus.ENROLLMISMATCH: "error",
+    SensorStatus.FAIL: "error",
+    SensorStatus.STORAGE_FULL: "error",
+    SensorStatus.LOCATION_OCCUPIED: "error",
+    SensorStatus.NOT_FOUND: "error",
 }
 
 
@@ -36,4 +37,5 @@ def get_led_mode(status: SensorStatus) -> dict:
     Return LED mode dict for the given sensor status.
     Falls back to empty dict if undefined.
     """
-    return LED_MAP.get(status, {})
+    name = LED_MAP.get(status)
+    return settings.LED.get(name, {}) if name else {}
@@ -0,0 +1,59 @@
+# Standard Library
+from enum import IntEnum
+from typing import Sequence, Union
+
+
+class TemplateFormat(IntEnum):
+    """
+    Kind of fingerprint data stored in an encrypted file.
+    The value is written as the format byte of the file header.
+    """
+
+    IMAGE = 0  # raw 4-bit image from the image buffer (~36 KB), legacy files
+    CHAR = 1  # model template from a char buffer (a few hundred bytes)
+
+    @property
+    def sensor_buffer(self) -> str:
+        """Buffer name understood by `get_fpdata` / `send_fpdata`."""
+        return "image" if self is TemplateFormat.IMAGE else "char"
+
+
+def get_template_format(name: str) -> TemplateFormat:
+    """Map a settings value ("image" / "char") to a TemplateFormat."""
+    try:
+        return TemplateFormat[name.upper()]
+    except KeyError as e:
+        raise ValueError(f"Unknown template format: {name}") from e
+
+
+class Template:
+    """
+    Fingerprint data (model template or raw image) together with its format.
+
+    Backed by one immutable `bytes` (or a read-only view into a mapped store), so a
+    36 KB image stays 36 KB in memory instead of a list of Python ints. The sensor
+    drivers, `Encrypt` and the store all take it as a plain buffer.
+    """
+
+    __slots__ = ("data", "format")
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview, Sequence[int]], data_format: TemplateFormat):
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        elif not isinstance(data, (bytes, memoryview)):
+            # list of ints from older callers
+            data = bytes(data)
+        self.data = data
+        self.format = TemplateFormat(data_format)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __bytes__(self) -> bytes:
+        return self.data if isinstance(self.data, bytes) else bytes(self.data)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Template) and self.format == other.format and self.data == other.data
+
+    def __repr__(self) -> str:
+        return f"<Template {self.format.name} {len(self.data)} bytes>"
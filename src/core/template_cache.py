@@ -0,0 +1,100 @@
+# Standard Library
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+from typing import Dict, Iterable, Optional
+
+
+@dataclass
+class CacheEntry:
+    key: Optional[str]  # user_id (or file key); None for slots occupied by unknown templates
+    slot: int
+    content_hash: Optional[str]
+
+
+class SensorTemplateCache:
+    """
+    Tracks which template lives in which sensor library slot.
+
+    Entries are kept in least-recently-used order so that, once the library is full,
+    the caller can evict the stalest slot with `delete_model`. Slots that were already
+    occupied when the cache was synced are tracked as anonymous entries and are evicted
+    first.
+    """
+
+    def __init__(self):
+        self._slots: OrderedDict[int, CacheEntry] = OrderedDict()
+        self._keys: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self.synced = False
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def sync(self, occupied_slots: Iterable[int]):
+        """Reconcile with the slots reported by `read_templates`."""
+        occupied = set(occupied_slots)
+        with self._lock:
+            for slot in [slot for slot in self._slots if slot not in occupied]:
+                self._drop(slot)
+            unknown = [slot for slot in sorted(occupied) if slot not in self._slots]
+            for slot in unknown:
+                self._slots[slot] = CacheEntry(None, slot, None)
+                self._slots.move_to_end(slot, last=False)
+            self.synced = True
+
+    def lookup(self, key: str, content_hash: str) -> Optional[int]:
+        """Return the resident slot of key if its content is unchanged, marking it as used."""
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is None or entry.content_hash != content_hash:
+                return None
+            self._slots.move_to_end(entry.slot)
+            return entry.slot
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            return self._keys.get(key)
+
+    def put(self, key: str, slot: int, content_hash: str):
+        with self._lock:
+            self._drop(slot)
+            old = self._keys.get(key)
+            if old is not None:
+                self._drop(old.slot)
+            entry = CacheEntry(key, slot, content_hash)
+            self._slots[slot] = entry
+            self._keys[key] = entry
+
+    def eviction_candidate(self) -> Optional[CacheEntry]:
+        """Least recently used entry, or None if nothing is tracked."""
+        with self._lock:
+            return next(iter(self._slots.values()), None)
+
+    def key_at(self, slot: int) -> Optional[str]:
+        with self._lock:
+            entry = self._slots.get(slot)
+            return entry.key if entry else None
+
+    def remove_slot(self, slot: int):
+        with self._lock:
+            self._drop(slot)
+
+    def clear(self):
+        """Forget every entry; the library is known to be empty."""
+        with self._lock:
+            self._slots.clear()
+            self._keys.clear()
+            self.synced = True
+
+    def invalidate(self):
+        """Forget every entry; the library content is unknown until the next sync."""
+        with self._lock:
+            self._slots.clear()
+            self._keys.clear()
+            self.synced = False
+
+    def _drop(self, slot: int):
+        entry = self._slots.pop(slot, None)
+        if entry is not None and entry.key is not None and self._keys.get(entry.key) is entry:
+            del self._keys[entry.key]
@@ -0,0 +1,198 @@
+# Standard Library
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+
+# Third Library
+import serial
+
+from src.config import settings
+from src.utils.metrics import metrics
+
+# "sim://<name>" ports open a simulated sensor (src/sim/protocol_sim.py)
+SIM_SCHEME = "sim://"
+# UART framing: start bit + 8 data bits + stop bit
+BITS_PER_BYTE = 10
+if "src.sim" not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append("src.sim")
+
+
+class MeteredSerial:
+    """Delegates to a pyserial port and counts the bytes moved (uart_bytes_total)."""
+
+    def __init__(self, uart: serial.SerialBase, port: str):
+        self._uart = uart
+        self._port = port
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._uart.read(size)
+        metrics.inc("uart_bytes_total", len(data), port=self._port, direction="rx")
+        return data
+
+    def write(self, data) -> Optional[int]:
+        written = self._uart.write(data)
+        metrics.inc("uart_bytes_total", len(data), port=self._port, direction="tx")
+        return written
+
+    @property
+    def baudrate(self) -> int:
+        return self._uart.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baudrate: int) -> None:
+        # pyserial reconfigures an open port in place
+        self._uart.baudrate = baudrate
+
+    def __getattr__(self, name):
+        return getattr(self._uart, name)
+
+
+def open_uart(port: str, baudrate: int, timeout: Optional[float]) -> MeteredSerial:
+    """Open a blocking pyserial port; URL handlers such as "sim://" are supported."""
+    return MeteredSerial(serial.serial_for_url(port, baudrate=baudrate, timeout=timeout), port)
+
+
+class SerialStream:
+    """Minimal async byte stream over a serial port (or pty)."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        port: str,
+        baudrate: int,
+        on_close=None,
+        on_baudrate=None,
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.port = port
+        self.baudrate = baudrate
+        self._on_close = on_close
+        self._on_baudrate = on_baudrate
+        self._line_busy_until = 0.0
+        self.closed = False
+
+    async def read_exactly(self, size: int, timeout: Optional[float] = None) -> bytes:
+        """
+        Read exactly size bytes; raises RuntimeError like the Adafruit driver on timeout/EOF.
+        The timeout starts once everything written so far has left the wire.
+        """
+        timeout = (timeout or settings.SENSOR_TIME_OUT) + max(0.0, self._line_busy_until - time.monotonic())
+        try:
+            data = await asyncio.wait_for(self.reader.readexactly(size), timeout)
+            metrics.inc("uart_bytes_total", len(data), port=self.port, direction="rx")
+            return data
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            raise RuntimeError("Failed to read data from sensor") from e
+
+    async def write(self, data: bytes) -> None:
+        # drain() returns once the OS has buffered the data, long before a large image
+        # download has been transmitted: keep track of when the line is free again
+        start = max(time.monotonic(), self._line_busy_until)
+        self._line_busy_until = start + len(data) * BITS_PER_BYTE / self.baudrate
+        self.writer.write(data)
+        metrics.inc("uart_bytes_total", len(data), port=self.port, direction="tx")
+        await self.writer.drain()
+
+    def set_baudrate(self, baudrate: int) -> None:
+        """Switch the port to baudrate (the line must be idle: call between exchanges)."""
+        if self._on_baudrate:
+            self._on_baudrate(baudrate)
+        self.baudrate = baudrate
+
+    def reset_input_buffer(self) -> None:
+        """Drop bytes already received but not read yet."""
+        buffered = getattr(self.reader, "_buffer", None)
+        if buffered is not None:
+            buffered.clear()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.close()
+        if self._on_close:
+            self._on_close()
+
+
+async def open_serial_stream(port: str, baudrate: int) -> SerialStream:
+    """
+    Open port as an asyncio stream.
+
+    Uses pyserial-asyncio when installed (works on Windows); otherwise, on POSIX, the
+    port is configured with pyserial and its file descriptor is driven by the event
+    loop directly, so waiting for sensor replies costs no thread. Simulated "sim://"
+    sensors are served on a pty for this transport.
+    """
+    device = port
+    if port.startswith(SIM_SCHEME):
+        from src.sim.pty_server import serve_pty
+
+        device = serve_pty(port).path
+
+    try:
+        import serial_asyncio  # optional dependency ("async" extra)
+    except ImportError:
+        serial_asyncio = None
+
+    if serial_asyncio is not None:
+        reader, writer = await serial_asyncio.open_serial_connection(url=device, baudrate=baudrate)
+
+        def _set_baudrate(rate: int):
+            writer.transport.serial.baudrate = rate
+
+        return SerialStream(reader, writer, port, baudrate, on_baudrate=_set_baudrate)
+
+    if sys.platform == "win32":
+        raise RuntimeError("Async transport on Windows requires the pyserial-asyncio package")
+    return await _open_fd_stream(device, baudrate, port)
+
+
+async def _open_fd_stream(device: str, baudrate: int, port: str) -> SerialStream:
+    uart = serial.Serial(device, baudrate=baudrate, timeout=0)
+    loop = asyncio.get_running_loop()
+    try:
+        read_pipe = os.fdopen(os.dup(uart.fileno()), "rb", buffering=0)
+        write_pipe = os.fdopen(os.dup(uart.fileno()), "wb", buffering=0)
+        reader = asyncio.StreamReader(limit=2**20)
+        read_transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), read_pipe)
+        write_transport, write_protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, write_pipe)
+        writer = asyncio.StreamWriter(write_transport, write_protocol, reader, loop)
+    except Exception:
+        uart.close()
+        raise
+
+    def _close():
+        read_transport.close()
+        write_transport.close()
+        uart.close()
+
+    def _set_baudrate(rate: int):
+        # the pipes use duplicates of uart's descriptor, so they follow its termios settings
+        uart.baudrate = rate
+
+    return SerialStream(reader, writer, port, baudrate, on_close=_close, on_baudrate=_set_baudrate)
+
+
+class PtyPair:
+    """
+    Pseudo-terminal in raw mode. A software sensor serves on `controller_fd` while the
+    code under test opens `path` like a real serial port (POSIX only).
+    """
+
+    def __init__(self):
+        import tty  # POSIX only
+
+        self.controller_fd, self._device_fd = os.openpty()
+        tty.setraw(self._device_fd)
+        self.path = os.ttyname(self._device_fd)
+
+    def close(self):
+        for fd in (self.controller_fd, self._device_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
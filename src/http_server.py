@@ -0,0 +1,328 @@
+"""
+HTTP front-end for the fingerprint service (asyncio, standard library only).
+
+One process serves every configured reader through the session pool, so many kiosks can
+drive their readers concurrently; requests for a busy reader wait in its queue.
+
+    POST /check          {"port": ...}                       check_sensor
+    POST /enroll         {"user_id": ..., "port": ...}        enroll_fingerprint
+    POST /authenticate   {"user_id": ..., "port": ...}        authenticate_with_encrypted
+    POST /identify       {"port": ...}                       identify_fingerprint
+    POST /reset          {"port": ...}                       reset_sensor
+    GET  /sensors                                            list_sensors
+    GET  /metrics                                            Prometheus text
+
+"port" is optional (default: the least busy reader) and must be one of the configured
+ports. Results are JSON; a FingerprintError becomes its HTTP code with {"error": message}.
+With `Accept: text/event-stream` (or `?stream=1`) the response is a server-sent event
+stream instead: a `status` event per SensorStatus transition ({"status": "PLACE_FINGER",
+"message": ...}), then one `result` or `error` event.
+
+    python -m src.http_server --host 0.0.0.0 --port 8503
+"""
+
+# Standard Library
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import hmac
+from http import HTTPStatus
+import json
+import signal
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.config import settings
+from src.core.fingerprint_service import (
+    FingerprintError,
+    authenticate_with_encrypted,
+    check_host_matching,
+    check_sensor,
+    close_sensors,
+    enroll_fingerprint,
+    identify_fingerprint,
+    list_sensors,
+    metrics_text,
+    reset_sensor,
+)
+from src.core.status import SensorStatus
+from src.utils.logger import setup_logger
+
+logger = setup_logger("HttpServer")
+
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 64
+# Seconds to receive a whole request, and between SSE keep-alive comments
+REQUEST_TIMEOUT = 10.0
+KEEPALIVE_INTERVAL = 15.0
+
+# path -> (operation, required body fields, optional body fields)
+OPERATIONS: Dict[str, Tuple[Callable[..., Awaitable[dict]], Tuple[str, ...], Tuple[str, ...]]] = {
+    "/check": (check_sensor, (), ("port",)),
+    "/enroll": (enroll_fingerprint, ("user_id",), ("port",)),
+    "/authenticate": (authenticate_with_encrypted, ("user_id",), ("port",)),
+    "/identify": (identify_fingerprint, (), ("port",)),
+    "/reset": (reset_sensor, (), ("port",)),
+}
+
+
+class HttpError(Exception):
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.message = message
+        super().__init__(message)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    @property
+    def wants_stream(self) -> bool:
+        return "text/event-stream" in self.headers.get("accept", "") or self.query.get("stream") == ["1"]
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return data
+
+
+# -------------------------------------------------------------------
+# HTTP/1.1 plumbing
+# -------------------------------------------------------------------
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    url = urlsplit(target)
+    request = Request(method.upper(), url.path, parse_qs(url.query))
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(request.headers) >= MAX_HEADERS:
+            raise HttpError(431, "Too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        request.headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "Request body too large")
+    if length:
+        request.body = await reader.readexactly(length)
+    return request
+
+
+def _head(code: int, content_type: str, length: Optional[int] = None) -> bytes:
+    lines = [f"HTTP/1.1 {code} {HTTPStatus(code).phrase}", f"Content-Type: {content_type}", "Connection: close"]
+    if length is None:
+        lines += ["Cache-Control: no-cache", "X-Accel-Buffering: no"]
+    else:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _respond(writer: asyncio.StreamWriter, code: int, payload, content_type: str = "application/json"):
+    body = payload.encode() if isinstance(payload, str) else json.dumps(payload, default=str).encode()
+    writer.write(_head(code, content_type, len(body)) + body)
+    await writer.drain()
+
+
+def _event(kind: str, payload: dict) -> bytes:
+    return f"event: {kind}\ndata: {json.dumps(payload, default=str)}\n\n".encode()
+
+
+# -------------------------------------------------------------------
+# Operations
+# -------------------------------------------------------------------
+def _arguments(path: str, request: Request) -> dict:
+    _operation, required, optional = OPERATIONS[path]
+    body = request.json()
+    unknown = set(body) - set(required) - set(optional)
+    if unknown:
+        raise HttpError(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not all(isinstance(value, str) for value in body.values()):
+        raise HttpError(400, "Fields must be strings")
+    missing = [name for name in required if not body.get(name)]
+    if missing:
+        raise HttpError(400, f"Missing fields: {', '.join(missing)}")
+    if body.get("port") and body["port"] not in settings.sensor_ports:
+        # only configured readers: the port is opened as given
+        raise HttpError(400, f"Unknown sensor port {body['port']!r}")
+    return body
+
+
+async def _outcome(operation: Awaitable[dict]) -> Tuple[int, dict]:
+    """(HTTP code, JSON payload) of a service call."""
+    try:
+        return 200, await operation
+    except FingerprintError as e:
+        return e.code, {"error": e.message}
+    except Exception as e:
+        logger.exception("Request failed: %s", e)
+        return 500, {"error": "Internal server error"}
+
+
+async def _watch_hangup(reader: asyncio.StreamReader, events: asyncio.Queue):
+    # the client sends nothing after its request, so end of input means it hung up
+    try:
+        await reader.read()
+    except ConnectionError:
+        pass
+    events.put_nowait(("hangup", None))
+
+
+async def _stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, arguments: dict):
+    """
+    Run the operation, sending its SensorStatus transitions and then the result as SSE.
+    The operation is cancelled as soon as the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_status(status: SensorStatus, message: str = ""):
+        # sensor services send from worker threads
+        loop.call_soon_threadsafe(events.put_nowait, ("status", {"status": status.name, "message": message}))
+
+    operation = OPERATIONS[path][0]
+    task = asyncio.ensure_future(_outcome(operation(**arguments, on_status=on_status)))
+    task.add_done_callback(lambda _: events.put_nowait(None))
+    watcher = asyncio.ensure_future(_watch_hangup(reader, events))
+
+    writer.write(_head(200, "text/event-stream"))
+    connected = True
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                event = ("keepalive", None)
+            if event is None:
+                if task.cancelled():
+                    return
+                code, payload = task.result()
+                event = ("result", payload) if code == 200 else ("error", {"code": code, **payload})
+            kind, payload = event
+            if connected and kind != "hangup":
+                try:
+                    writer.write(b": keep-alive\n\n" if kind == "keepalive" else _event(kind, payload))
+                    await writer.drain()
+                except ConnectionError:
+                    kind = "hangup"
+            if connected and kind == "hangup":
+                # nobody is waiting for the result: abort the operation and free its reader
+                logger.info("Event stream client for %s went away, cancelling", path)
+                connected = False
+                task.cancel()
+            if kind in ("result", "error"):
+                return
+    finally:
+        watcher.cancel()
+
+
+async def _dispatch(request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    if request.method == "GET" and request.path == "/sensors":
+        return await _respond(writer, 200, await list_sensors())
+    if request.method == "GET" and request.path == "/metrics":
+        return await _respond(writer, 200, metrics_text(), "text/plain; version=0.0.4")
+    if request.path not in OPERATIONS:
+        raise HttpError(404, "Not found")
+    if request.method != "POST":
+        raise HttpError(405, "Use POST")
+    arguments = _arguments(request.path, request)
+    if request.wants_stream:
+        return await _stream(reader, writer, request.path, arguments)
+    code, payload = await _outcome(OPERATIONS[request.path][0](**arguments))
+    await _respond(writer, code, payload)
+
+
+def _authorized(request: Request) -> bool:
+    if not settings.HTTP_TOKEN:
+        return True
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied.encode(), settings.HTTP_TOKEN.encode())
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve one request per connection."""
+    try:
+        try:
+            request = await asyncio.wait_for(_read_request(reader), REQUEST_TIMEOUT)
+        except HttpError as e:
+            request = e
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            # ValueError: a line over the StreamReader limit
+            request = HttpError(400, "Bad request")
+        try:
+            if request is None:
+                return
+            if isinstance(request, HttpError):
+                raise request
+            if not _authorized(request):
+                raise HttpError(401, "Missing or invalid token")
+            logger.info("%s %s", request.method, request.path)
+            await _dispatch(request, reader, writer)
+        except HttpError as e:
+            await _respond(writer, e.code, {"error": e.message})
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+# -------------------------------------------------------------------
+# Entry point
+# -------------------------------------------------------------------
+async def serve(host: Optional[str] = None, port: Optional[int] = None):
+    """Serve until SIGINT/SIGTERM, then close the sensor sessions."""
+    check_host_matching()
+    server = await asyncio.start_server(
+        handle_connection, host or settings.HTTP_HOST, port if port is not None else settings.HTTP_PORT
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    if not settings.HTTP_TOKEN and (host or settings.HTTP_HOST) not in ("127.0.0.1", "localhost", "::1"):
+        logger.warning("Serving on a non-loopback address without HTTP_TOKEN")
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    logger.info("Serving on %s", addresses)
+    async with server:
+        await stop.wait()
+    await close_sensors()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", help="default: settings.HTTP_HOST")
+    parser.add_argument("--port", type=int, help="default: settings.HTTP_PORT")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except FingerprintError as e:
+        parser.exit(1, f"{e.message}\n")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Minutiae decoder of the simulator's char templates (layout "sim", see `src.sim.r503`) for
+host-side matching. Importing the module registers it with `src.core.matcher`; list it in
+settings.HOST_MATCH_DECODERS to identify simulated fingers with IDENTIFY_MODE = "host".
+
+Requires NumPy (the "match" extra).
+"""
+
+# Third Library
+import numpy as np
+
+from src.core.matcher import register_decoder
+from src.sim.r503 import MINUTIA, MINUTIAE_OFFSET
+
+LAYOUT = "sim"
+
+_MINUTIA = np.dtype([("x", ">u2"), ("y", ">u2"), ("direction", "u1")])
+
+
+def decode(data: bytes) -> np.ndarray:
+    count = data[MINUTIAE_OFFSET]
+    if len(data) < MINUTIAE_OFFSET + 1 + count * MINUTIA.size:
+        raise ValueError("Truncated minutiae block")
+    records = np.frombuffer(data, _MINUTIA, count=count, offset=MINUTIAE_OFFSET + 1)
+    return np.column_stack(
+        (records["x"], records["y"], records["direction"] * (2 * np.pi / 256)),
+    ).astype(np.float32)
+
+
+register_decoder(LAYOUT, decode)
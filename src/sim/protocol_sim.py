@@ -0,0 +1,130 @@
+"""
+pyserial URL handler for simulated sensors: ``sim://<name>[?option=value&...]``.
+
+Registered by `src.core.transport`, so any PORT of the form "sim://gate1" opens the shared
+`SimulatedR503` called "gate1" instead of a real device. Options (applied when the device
+is first created): library_size, baudrate, packet_size, retouch_polls, time_scale, finger.
+"""
+
+# Standard Library
+from collections import deque
+import time
+from typing import Deque, Tuple
+import urllib.parse
+
+# Third Library
+from serial.serialutil import PortNotOpenError, SerialBase, SerialException, to_bytes
+
+from src.sim.r503 import SerialLink, TimingModel, get_device
+
+# Bytes pyserial hands to the OS without blocking (driver transmit buffer)
+OS_WRITE_BUFFER = 4096
+
+_INT_OPTIONS = ("library_size", "baudrate", "packet_size", "retouch_polls")
+
+
+def parse_url(url: str) -> Tuple[str, dict]:
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme != "sim":
+        raise SerialException(f"expected a port like 'sim://<name>?time_scale=0', got {url!r}")
+    name = parts.netloc or parts.path.lstrip("/") or "default"
+    options = {}
+    for option, values in urllib.parse.parse_qs(parts.query).items():
+        value = values[-1]
+        try:
+            if option in _INT_OPTIONS:
+                options[option] = int(value)
+            elif option == "time_scale":
+                options["timing"] = TimingModel(time_scale=float(value))
+            elif option == "finger":
+                options["finger"] = value or None
+            else:
+                raise ValueError(f"unknown option {option!r}")
+        except ValueError as e:
+            raise SerialException(f"invalid sim:// port {url!r}: {e}") from e
+    return name, options
+
+
+class Serial(SerialBase):
+    """In-memory serial port wired to a simulated R503; replies arrive on the device's schedule."""
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        name, options = parse_url(self.portstr)
+        self.device = get_device(name, **options)
+        self._link = SerialLink(self.device)
+        self._arrivals: Deque[Tuple[float, bytes]] = deque()
+        self._received = bytearray()
+        self._reconfigure_port()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def _reconfigure_port(self):
+        if not isinstance(self._baudrate, int) or self._baudrate <= 0:
+            raise ValueError(f"invalid baudrate: {self._baudrate!r}")
+
+    def _collect(self) -> None:
+        now = time.monotonic()
+        while self._arrivals and self._arrivals[0][0] <= now:
+            self._received += self._arrivals.popleft()[1]
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        self._collect()
+        return len(self._received)
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            self._collect()
+            if len(self._received) >= size:
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if self._arrivals:
+                wake = self._arrivals[0][0]
+                time.sleep(max(0.0, (wake if deadline is None else min(wake, deadline)) - now))
+            elif deadline is None:
+                raise SerialException("read without timeout would block forever")
+            else:
+                time.sleep(deadline - now)
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        return data
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        now = time.monotonic()
+        sent, replies = self._link.send(data, self._baudrate, now)
+        self._arrivals.extend(replies)
+        # only what does not fit the driver buffer blocks the caller
+        blocked = sent - self.device.timing.transfer(OS_WRITE_BUFFER, self._baudrate) - now
+        if blocked > 0:
+            time.sleep(blocked)
+        return len(data)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self._collect()
+        self._received.clear()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    def flush(self):
+        if not self.is_open:
+            raise PortNotOpenError()
@@ -0,0 +1,99 @@
+"""
+Serve a simulated R503 on a pseudo-terminal (POSIX), so anything that opens a real
+serial device path (pyserial, the asyncio transport, other processes) can talk to it.
+
+    python -m src.sim.pty_server --time-scale 1
+
+prints the device path to use as PORT.
+"""
+
+# Standard Library
+import argparse
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from src.core.transport import PtyPair
+from src.sim.protocol_sim import parse_url
+from src.sim.r503 import SerialLink, SimulatedR503, get_device
+from src.utils.logger import setup_logger
+
+
+class PtyServer:
+    """Answers host packets written to `path` with the device's timing."""
+
+    def __init__(self, device: SimulatedR503):
+        self.logger = setup_logger("PtyServer")
+        self.device = device
+        self._link = SerialLink(device)
+        self._pty = PtyPair()
+        self.path = self._pty.path
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name=f"sim-{self.path}", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        fd = self._pty.controller_fd
+        while not self._closed.is_set():
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            # a pty has no line speed: model it at the rate the device is set to
+            received, replies = self._link.send(data, self.device.baudrate, time.monotonic())
+            for arrival, packet in replies:
+                self._wait_until(arrival)
+                try:
+                    os.write(fd, packet)
+                except OSError:
+                    self.logger.warning("Simulated sensor on %s lost its host", self.path)
+                    return
+            # consume input no faster than the line delivers it, so host writes see backpressure
+            self._wait_until(received)
+
+    @staticmethod
+    def _wait_until(moment: float):
+        delay = moment - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def close(self):
+        self._closed.set()
+        self._pty.close()
+
+
+_servers: Dict[str, PtyServer] = {}
+_servers_lock = threading.Lock()
+
+
+def serve_pty(url: str) -> PtyServer:
+    """PtyServer for the simulated device behind a "sim://" port (one per device)."""
+    name, options = parse_url(url)
+    with _servers_lock:
+        server = _servers.get(name)
+        if server is None:
+            server = _servers[name] = PtyServer(get_device(name, **options))
+        return server
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Serve a simulated R503 on a pty")
+    parser.add_argument("--library-size", type=int, default=200)
+    parser.add_argument("--baudrate", type=int, default=57600)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    url = f"sim://cli?library_size={args.library_size}&baudrate={args.baudrate}&time_scale={args.time_scale}"
+    server = serve_pty(url)
+    print(server.path, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
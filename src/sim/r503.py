@@ -0,0 +1,502 @@
+"""Software R503 that speaks the sensor packet protocol, for hardware-free runs and benchmarks.
+
+The device itself is transport agnostic: `receive()` takes the bytes written by the host
+and returns the reply packets together with the sensor-side processing delay of each.
+`src/sim/protocol_sim.py` (in-memory "sim://" serial ports) and `src/sim/pty_server.py`
+turn these delays plus baud-rate-accurate transfer times into real waiting.
+
+Fingerprints are modelled as 16-byte identities: images and templates start with the
+identity of the finger they were taken from, and two templates match when their
+identities are equal. Char templates also carry a minutiae set derived from the identity
+(layout "sim", decoded by `src.sim.minutiae` for host-side matching).
+"""
+
+# Standard Library
+from dataclasses import dataclass
+import hashlib
+import struct
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Third Library
+import adafruit_fingerprint
+
+from src.core import protocol
+
+IDENTITY_SIZE = 16
+# Minutiae block of a char template, right after the identity: count (1 byte), then per
+# minutia x, y (pixels, uint16) and direction (uint8, 256 steps per turn), big endian
+MINUTIA = struct.Struct(">HHB")
+MINUTIAE_OFFSET = IDENTITY_SIZE
+MINUTIAE_COUNT = (30, 50)
+IMAGE_WIDTH, IMAGE_HEIGHT = 256, 288
+# Char buffers IMAGE2TZ can fill during an enrollment (REGMODEL merges them)
+CHAR_BUFFERS = 6
+# Reply to LOAD of an empty or unreadable location (not defined by the Adafruit driver)
+LOADFAIL = 0x0C
+
+
+@dataclass
+class TimingModel:
+    """Sensor-side latencies in seconds (close to the R503 datasheet figures)."""
+
+    image_capture: float = 0.2  # GETIMAGE with a finger on the sensor
+    no_finger: float = 0.02  # GETIMAGE on an empty sensor
+    extract: float = 0.15  # IMAGE2TZ
+    register: float = 0.05  # REGMODEL
+    flash_write: float = 0.02  # STORE / DELETE
+    flash_read: float = 0.005  # LOAD
+    empty: float = 0.1  # EMPTY
+    compare: float = 0.01  # COMPARE
+    search_base: float = 0.01  # SEARCH / HISPEEDSEARCH
+    search_per_template: float = 0.0015  # per stored template scanned
+    command: float = 0.001  # any other instruction
+    bits_per_byte: int = 10  # 8N1 framing
+    time_scale: float = 1.0  # multiplies every delay, 0 runs as fast as possible
+
+    def scaled(self, seconds: float) -> float:
+        return seconds * self.time_scale
+
+    def transfer(self, nbytes: int, baudrate: int) -> float:
+        """Time the bytes spend on the wire."""
+        return self.scaled(nbytes * self.bits_per_byte / baudrate)
+
+
+def finger_identity(finger) -> bytes:
+    """Identity of a finger given by name, number or raw bytes."""
+    if isinstance(finger, bytes) and len(finger) == IDENTITY_SIZE:
+        return finger
+    return hashlib.sha256(str(finger).encode()).digest()[:IDENTITY_SIZE]
+
+
+def _fill(identity: bytes, size: int, tag: bytes) -> bytes:
+    """Deterministic payload of size bytes carrying identity."""
+    return identity + hashlib.shake_128(tag + identity).digest(size - IDENTITY_SIZE)
+
+
+def minutiae_for(identity: bytes) -> List[Tuple[int, int, int]]:
+    """Deterministic (x, y, direction) minutiae of the finger with identity."""
+    low, high = MINUTIAE_COUNT
+    seed = hashlib.shake_128(b"minutiae" + identity).digest(1 + high * MINUTIA.size)
+    count = low + seed[0] % (high - low + 1)
+    margin = 16
+    minutiae = []
+    for i in range(count):
+        x, y, direction = MINUTIA.unpack_from(seed, 1 + i * MINUTIA.size)
+        minutiae.append((margin + x % (IMAGE_WIDTH - 2 * margin), margin + y % (IMAGE_HEIGHT - 2 * margin), direction))
+    return minutiae
+
+
+def encode_minutiae(minutiae: List[Tuple[int, int, int]]) -> bytes:
+    return bytes([len(minutiae)]) + b"".join(MINUTIA.pack(*minutia) for minutia in minutiae)
+
+
+class SimulatedR503:
+    """
+    In-memory R503 state machine (library, char buffers, image buffer, LED, system params).
+
+    A finger is considered present from `press()` until `lift()`; by default the device
+    starts with a finger named "default" on the sensor so unattended runs never block.
+    After every image the finger is lifted and put back, i.e. missing for the next
+    `retouch_polls` GETIMAGE polls (0: it stays on the sensor), as between enrollment samples.
+    """
+
+    def __init__(
+        self,
+        library_size: int = 200,
+        baudrate: int = 57600,
+        packet_size: int = 2,
+        timing: Optional[TimingModel] = None,
+        image_size: int = 256 * 288 // 2,
+        template_size: int = 1536,
+        password: Tuple[int, int, int, int] = (0, 0, 0, 0),
+        finger="default",
+        retouch_polls: int = 1,
+    ):
+        self.library_size = library_size
+        self.baudrate = baudrate
+        self.packet_size = packet_size
+        self.security_level = 3
+        self.timing = timing or TimingModel()
+        self.image_size = image_size
+        self.template_size = template_size
+        self.password = bytes(password)
+        self.library: Dict[int, bytes] = {}
+        self.buffers: Dict[int, Optional[bytes]] = dict.fromkeys(range(1, CHAR_BUFFERS + 1))
+        self.samples: Set[int] = set()  # char buffers filled since the enrollment started (IMAGE2TZ into 1)
+        self.retouch_polls = retouch_polls
+        self.image: Optional[bytes] = None
+        self.led: Optional[Tuple[int, int, int, int]] = None
+        self.commands: Dict[int, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._finger: Optional[bytes] = None
+        self._press_after = 0
+        self._lifted_polls = 0
+        self._inbox = bytearray()
+        self._download: Optional[Tuple[str, int]] = None
+        self._download_data = bytearray()
+        self.lock = threading.RLock()
+        if finger is not None:
+            self.press(finger)
+
+    # -------------------------
+    #   Finger model
+    # -------------------------
+    def press(self, finger="default", after_polls: int = 0) -> bytes:
+        """Put finger on the sensor, optionally only after after_polls empty GETIMAGE polls."""
+        with self.lock:
+            self._finger = finger_identity(finger)
+            self._press_after = after_polls
+            self._lifted_polls = 0
+            return self._finger
+
+    def lift(self) -> None:
+        with self.lock:
+            self._finger = None
+
+    @property
+    def finger_present(self) -> bool:
+        return self._finger is not None and self._press_after == 0 and self._lifted_polls == 0
+
+    def template_for(self, finger) -> bytes:
+        """Char-buffer template the sensor extracts for finger (what the host gets on UPLOAD)."""
+        identity = finger_identity(finger)
+        block = identity + encode_minutiae(minutiae_for(identity))
+        return block + _fill(identity, self.template_size - len(block) + IDENTITY_SIZE, b"char")[IDENTITY_SIZE:]
+
+    def image_for(self, finger) -> bytes:
+        return _fill(finger_identity(finger), self.image_size, b"image")
+
+    # -------------------------
+    #   Host interface
+    # -------------------------
+    @property
+    def data_packet_bytes(self) -> int:
+        return protocol.PACKET_SIZES.get(self.packet_size, 32)
+
+    def receive(self, data: bytes) -> List[Tuple[float, bytes]]:
+        """
+        Feed bytes written by the host. Returns (processing delay, packet) for every reply
+        packet, in order; data packets following an acknowledgement have no extra delay.
+        """
+        replies: List[Tuple[float, bytes]] = []
+        with self.lock:
+            self.bytes_in += len(data)
+            self._inbox += data
+            while len(self._inbox) >= protocol.HEADER_SIZE:
+                try:
+                    packet_type, length = protocol.decode_header(bytes(self._inbox[: protocol.HEADER_SIZE]))
+                except RuntimeError:
+                    # resynchronise on the next start code
+                    del self._inbox[0]
+                    continue
+                end = protocol.HEADER_SIZE + length
+                if len(self._inbox) < end:
+                    break
+                body = bytes(self._inbox[protocol.HEADER_SIZE : end])
+                del self._inbox[:end]
+                try:
+                    payload = protocol.verify_body(packet_type, length, body)
+                except RuntimeError:
+                    replies.append((self.timing.command, self._ack([adafruit_fingerprint.PACKETRECIEVEERR])))
+                    continue
+                replies.extend(self._dispatch(packet_type, payload))
+            self.bytes_out += sum(len(packet) for _, packet in replies)
+        return replies
+
+    # -------------------------
+    #   Packets
+    # -------------------------
+    @staticmethod
+    def _ack(payload) -> bytes:
+        return protocol.encode_packet(protocol.ACKPACKET, payload)
+
+    def _reply(self, delay: float, code: int, *extra: int) -> List[Tuple[float, bytes]]:
+        return [(delay, self._ack([code, *extra]))]
+
+    def _data_reply(self, delay: float, data: Optional[bytes], fail_code: int) -> List[Tuple[float, bytes]]:
+        if data is None:
+            return self._reply(delay, fail_code)
+        replies = self._reply(delay, adafruit_fingerprint.OK)
+        replies.extend((0.0, packet) for packet in protocol.encode_data(data, self.data_packet_bytes))
+        return replies
+
+    def _dispatch(self, packet_type: int, payload: bytes) -> List[Tuple[float, bytes]]:
+        if packet_type in (protocol.DATAPACKET, protocol.ENDDATAPACKET):
+            self._receive_data(packet_type, payload)
+            return []
+        if packet_type != protocol.COMMANDPACKET or not payload:
+            return self._reply(self.timing.command, adafruit_fingerprint.PACKETRECIEVEERR)
+        code, args = payload[0], payload[1:]
+        self.commands[code] = self.commands.get(code, 0) + 1
+        handler = self._HANDLERS.get(code)
+        if handler is None:
+            return self._reply(self.timing.command, adafruit_fingerprint.PACKETRECIEVEERR)
+        return handler(self, args)
+
+    def _receive_data(self, packet_type: int, payload: bytes) -> None:
+        if self._download is None:
+            return
+        self._download_data += payload
+        if packet_type == protocol.ENDDATAPACKET:
+            target, slot = self._download
+            if target == "image":
+                self.image = bytes(self._download_data)
+            else:
+                self.buffers[slot] = bytes(self._download_data)
+            self._download = None
+            self._download_data = bytearray()
+
+    # -------------------------
+    #   Instructions
+    # -------------------------
+    @staticmethod
+    def _slot(args: bytes) -> int:
+        return 1 if args[0] == 1 else 2
+
+    @staticmethod
+    def _location(args: bytes, offset: int = 0) -> int:
+        return (args[offset] << 8) | args[offset + 1]
+
+    def _verify_password(self, args: bytes):
+        ok = bytes(args[:4]) == self.password
+        return self._reply(self.timing.command, adafruit_fingerprint.OK if ok else adafruit_fingerprint.PASSFAIL)
+
+    def _read_sysparam(self, args: bytes):
+        params = struct.pack(
+            ">HHHH4sHH",
+            0,
+            0x0009,
+            self.library_size,
+            self.security_level,
+            protocol.DEFAULT_ADDRESS,
+            self.packet_size,
+            self.baudrate // 9600,
+        )
+        return self._reply(self.timing.command, adafruit_fingerprint.OK, *params)
+
+    def _set_sysparam(self, args: bytes):
+        param, value = args[0], args[1]
+        if param == protocol.PARAM_BAUDRATE and 1 <= value <= 12:
+            replies = self._reply(self.timing.command, adafruit_fingerprint.OK)
+            # the acknowledgement still goes out at the old rate
+            self.baudrate = value * 9600
+            return replies
+        if param == protocol.PARAM_SECURITY_LEVEL and 1 <= value <= 5:
+            self.security_level = value
+        elif param == protocol.PARAM_PACKET_SIZE and value in protocol.PACKET_SIZES:
+            self.packet_size = value
+        else:
+            return self._reply(self.timing.command, adafruit_fingerprint.PACKETRECIEVEERR)
+        return self._reply(self.timing.command, adafruit_fingerprint.OK)
+
+    def _get_image(self, args: bytes):
+        if self._lifted_polls > 0:
+            self._lifted_polls -= 1
+            return self._reply(self.timing.no_finger, adafruit_fingerprint.NOFINGER)
+        if self._finger is not None and self._press_after > 0:
+            self._press_after -= 1
+        if not self.finger_present:
+            return self._reply(self.timing.no_finger, adafruit_fingerprint.NOFINGER)
+        self.image = self.image_for(self._finger)
+        self._lifted_polls = self.retouch_polls
+        return self._reply(self.timing.image_capture, adafruit_fingerprint.OK)
+
+    def _image_2_tz(self, args: bytes):
+        if self.image is None or len(self.image) < IDENTITY_SIZE:
+            return self._reply(self.timing.command, adafruit_fingerprint.INVALIDIMAGE)
+        slot = args[0]
+        if not 1 <= slot <= CHAR_BUFFERS:
+            return self._reply(self.timing.command, adafruit_fingerprint.INVALIDREG)
+        if slot == 1:
+            self.samples.clear()
+        self.samples.add(slot)
+        self.buffers[slot] = self.template_for(self.image[:IDENTITY_SIZE])
+        return self._reply(self.timing.extract, adafruit_fingerprint.OK)
+
+    def _identity(self, template: Optional[bytes]) -> Optional[bytes]:
+        return template[:IDENTITY_SIZE] if template else None
+
+    def _score(self, identity: bytes) -> int:
+        return 50 + identity[0] % 150
+
+    def _reg_model(self, args: bytes):
+        identities = {self._identity(self.buffers[slot]) for slot in self.samples | {1, 2}}
+        if None in identities or len(identities) != 1:
+            return self._reply(self.timing.register, adafruit_fingerprint.ENROLLMISMATCH)
+        self.samples.clear()
+        self.buffers[2] = self.buffers[1]
+        return self._reply(self.timing.register, adafruit_fingerprint.OK)
+
+    def _store(self, args: bytes):
+        location = self._location(args, 1)
+        if location >= self.library_size:
+            return self._reply(self.timing.command, adafruit_fingerprint.BADLOCATION)
+        template = self.buffers[self._slot(args)]
+        if template is None:
+            return self._reply(self.timing.command, adafruit_fingerprint.FLASHERR)
+        self.library[location] = template
+        return self._reply(self.timing.flash_write, adafruit_fingerprint.OK)
+
+    def _load(self, args: bytes):
+        location = self._location(args, 1)
+        if location not in self.library:
+            return self._reply(self.timing.flash_read, LOADFAIL)
+        self.buffers[self._slot(args)] = self.library[location]
+        return self._reply(self.timing.flash_read, adafruit_fingerprint.OK)
+
+    def _upload(self, args: bytes):
+        return self._data_reply(
+            self.timing.command, self.buffers[self._slot(args)], adafruit_fingerprint.UPLOADFEATUREFAIL
+        )
+
+    def _upload_image(self, args: bytes):
+        return self._data_reply(self.timing.command, self.image, adafruit_fingerprint.UPLOADFAIL)
+
+    def _download_char(self, args: bytes):
+        self._download = ("char", self._slot(args))
+        return self._reply(self.timing.command, adafruit_fingerprint.OK)
+
+    def _download_image(self, args: bytes):
+        self._download = ("image", 0)
+        return self._reply(self.timing.command, adafruit_fingerprint.OK)
+
+    def _delete(self, args: bytes):
+        start, count = self._location(args), self._location(args, 2)
+        if start + count > self.library_size:
+            return self._reply(self.timing.command, adafruit_fingerprint.BADLOCATION)
+        for location in range(start, start + count):
+            self.library.pop(location, None)
+        return self._reply(self.timing.flash_write, adafruit_fingerprint.OK)
+
+    def _empty(self, args: bytes):
+        self.library.clear()
+        return self._reply(self.timing.empty, adafruit_fingerprint.OK)
+
+    def _compare(self, args: bytes):
+        first, second = self._identity(self.buffers[1]), self._identity(self.buffers[2])
+        if first is None or first != second:
+            return self._reply(self.timing.compare, adafruit_fingerprint.NOMATCH, 0, 0)
+        return self._reply(self.timing.compare, adafruit_fingerprint.OK, *struct.pack(">H", self._score(first)))
+
+    def _search(self, args: bytes):
+        probe = self._identity(self.buffers[self._slot(args)])
+        start, count = self._location(args, 1), self._location(args, 3)
+        scanned = 0
+        for location in sorted(self.library):
+            if not start <= location < start + count:
+                continue
+            scanned += 1
+            if probe is not None and self._identity(self.library[location]) == probe:
+                delay = self.timing.search_base + scanned * self.timing.search_per_template
+                return self._reply(
+                    delay, adafruit_fingerprint.OK, *struct.pack(">HH", location, self._score(probe))
+                )
+        delay = self.timing.search_base + scanned * self.timing.search_per_template
+        return self._reply(delay, adafruit_fingerprint.NOTFOUND, 0, 0, 0, 0)
+
+    def _template_count(self, args: bytes):
+        return self._reply(self.timing.command, adafruit_fingerprint.OK, *struct.pack(">H", len(self.library)))
+
+    def _read_index(self, args: bytes):
+        page = args[0]
+        bitmap = bytearray(32)
+        for location in self.library:
+            offset = location - page * 256
+            if 0 <= offset < 256:
+                bitmap[offset // 8] |= 1 << (offset % 8)
+        return self._reply(self.timing.command, adafruit_fingerprint.OK, *bitmap)
+
+    def _set_aura(self, args: bytes):
+        mode, speed, color, cycles = args[:4]
+        self.led = (color, mode, cycles, speed)
+        return self._reply(self.timing.command, adafruit_fingerprint.OK)
+
+    def _echo(self, args: bytes):
+        return self._reply(self.timing.command, adafruit_fingerprint.MODULEOK)
+
+    def _soft_reset(self, args: bytes):
+        self.buffers = dict.fromkeys(range(1, CHAR_BUFFERS + 1))
+        self.samples.clear()
+        self.image = None
+        self.led = None
+        return self._reply(self.timing.command, adafruit_fingerprint.OK)
+
+    _HANDLERS = {
+        protocol.VERIFYPASSWORD: _verify_password,
+        protocol.READSYSPARA: _read_sysparam,
+        protocol.SETSYSPARA: _set_sysparam,
+        protocol.GETIMAGE: _get_image,
+        protocol.IMAGE2TZ: _image_2_tz,
+        protocol.REGMODEL: _reg_model,
+        protocol.STORE: _store,
+        protocol.LOAD: _load,
+        protocol.UPLOAD: _upload,
+        protocol.UPLOADIMAGE: _upload_image,
+        protocol.DOWNLOAD: _download_char,
+        protocol.DOWNLOADIMAGE: _download_image,
+        protocol.DELETE: _delete,
+        protocol.EMPTY: _empty,
+        protocol.COMPARE: _compare,
+        protocol.FINGERPRINTSEARCH: _search,
+        protocol.HISPEEDSEARCH: _search,
+        protocol.TEMPLATECOUNT: _template_count,
+        protocol.TEMPLATEREAD: _read_index,
+        protocol.SETAURA: _set_aura,
+        protocol.GETECHO: _echo,
+        protocol.SOFTRESET: _soft_reset,
+    }
+
+
+class SerialLink:
+    """
+    Baud-rate-accurate timing of one host <-> sensor connection. Both directions are
+    serialised: a reply can only start once the previous one has left the wire.
+    """
+
+    def __init__(self, device: SimulatedR503):
+        self.device = device
+        self._inbound_free = 0.0
+        self._outbound_free = 0.0
+
+    def send(self, data: bytes, baudrate: int, now: float) -> Tuple[float, List[Tuple[float, bytes]]]:
+        """
+        Host writes data at now with the port set to baudrate. Returns the time the last
+        byte reaches the sensor and (arrival time, packet) for every reply.
+        """
+        timing = self.device.timing
+        received = max(now, self._inbound_free) + timing.transfer(len(data), baudrate)
+        self._inbound_free = received
+        if baudrate != self.device.baudrate:
+            # framing errors on the sensor side: nothing is understood, nothing answered
+            return received, []
+        replies = []
+        cursor = received
+        for delay, packet in self.device.receive(data):
+            cursor = max(cursor + timing.scaled(delay), self._outbound_free)
+            cursor += timing.transfer(len(packet), baudrate)
+            self._outbound_free = cursor
+            replies.append((cursor, packet))
+        return received, replies
+
+
+# -------------------------
+#   Device registry
+# -------------------------
+_devices: Dict[str, SimulatedR503] = {}
+_devices_lock = threading.Lock()
+
+
+def get_device(name: str, **options) -> SimulatedR503:
+    """Shared simulated sensor called name; options only apply when it is created."""
+    with _devices_lock:
+        device = _devices.get(name)
+        if device is None:
+            device = _devices[name] = SimulatedR503(**options)
+        return device
+
+
+def reset_devices() -> None:
+    with _devices_lock:
+        _devices.clear()
@@ -1,59 +1,104 @@
 # Standard Library
 import os
 from pathlib import Path
+import threading
+from typing import Dict
 
 # Third Library
 # THIRDPARTY
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from src.utils.keys import KeyManager
 from src.utils.logger import setup_logger
 
+# File header: magic + container version + data format byte.
+# Files without the magic are legacy `salt + nonce + ct` files holding image data.
+#   version 1: key = PBKDF2(password, salt)
+#   version 2: key = HKDF(master_key, salt), master_key derived once per process
+FILE_MAGIC = b"R5FP"
+FILE_VERSION_PBKDF2 = 1
+FILE_VERSION = 2
+HEADER_SIZE = len(FILE_MAGIC) + 2
+LEGACY_DATA_FORMAT = 0
+
 
 class Encrypt:
-    def __init__(self, iterations: int = 390000):
+    def __init__(self, iterations: int = 390000, key_cache_size: int = 256):
         self.logger = setup_logger("Encryptor")
         self.iterations = iterations
-        self.backend = default_backend()
-
-    def _derive_key(self, password: str, salt: bytes) -> bytes:
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,  # 256 key
-            salt=salt,
-            iterations=self.iterations,
-            backend=self.backend,
-        )
-        return kdf.derive(password.encode())
-
-    def _encrypt(self, data: bytes, password: str) -> tuple[bytes, bytes, bytes]:
-        if not isinstance(data, bytes):
+        self.key_cache_size = key_cache_size
+        self._keys: Dict[str, KeyManager] = {}
+        self._keys_lock = threading.Lock()
+
+    def keys(self, password: str) -> KeyManager:
+        """Return the (cached) KeyManager for password."""
+        with self._keys_lock:
+            manager = self._keys.get(password)
+            if manager is None:
+                manager = KeyManager(password, self.iterations, self.key_cache_size)
+                self._keys[password] = manager
+            return manager
+
+    def _encrypt(self, data: bytes, password: str, aad: bytes = None) -> tuple[bytes, bytes, bytes]:
+        # buffers (bytes, bytearray, memoryview) go to AESGCM as they are
+        if not isinstance(data, (bytes, bytearray, memoryview)):
             data = bytes(data)
         salt = os.urandom(16)
-        key = self._derive_key(password, salt)
+        key = self.keys(password).file_key(salt)
         aesgcm = AESGCM(key)
         nonce = os.urandom(12)
-        ct = aesgcm.encrypt(nonce, data, None)
+        ct = aesgcm.encrypt(nonce, data, aad)
         return ct, nonce, salt
 
-    def _decrypt(self, ct: bytes, nonce: bytes, salt: bytes, password: str) -> bytes:
-        key = self._derive_key(password, salt)
+    def _decrypt(self, ct: bytes, nonce: bytes, key: bytes, aad: bytes = None) -> bytes:
         aesgcm = AESGCM(key)
         self.logger.info("Decrypting data...")
-        return list(aesgcm.decrypt(nonce, ct, None))
+        return aesgcm.decrypt(nonce, ct, aad)
 
-    def encrypt_to_file(self, filepath: Path, data: bytes, password: str):
-        ct, nonce, salt = self._encrypt(data, password)
+    def encrypt_bytes(self, data: bytes, password: str, data_format: int = LEGACY_DATA_FORMAT) -> bytes:
+        """
+        Encrypt data into a self-contained blob (header + salt + nonce + ct). The header
+        (authenticated as AAD) records the data format so readers know whether the
+        payload is an image or a template.
+        """
+        header = FILE_MAGIC + bytes([FILE_VERSION, data_format])
+        ct, nonce, salt = self._encrypt(data, password, header)
+        return header + salt + nonce + ct
+
+    def encrypt_to_file(self, filepath: Path, data: bytes, password: str, data_format: int = LEGACY_DATA_FORMAT):
+        """Encrypt data to file (see encrypt_bytes)."""
+        blob = self.encrypt_bytes(data, password, data_format)
         with open(filepath, "wb") as f:
-            f.write(salt + nonce + ct)
+            f.write(blob)
         self.logger.info("Data encrypted and saved to : %s", filepath)
         return True
 
     def decrypt_from_file(self, filepath: Path, password: str) -> bytes:
+        return self.decrypt_with_format(filepath, password)[1]
+
+    def decrypt_with_format(self, filepath: Path, password: str) -> tuple[int, bytes]:
+        """Decrypt a file and return (data_format, data). Legacy files report LEGACY_DATA_FORMAT."""
         with open(filepath, "rb") as f:
             raw = f.read()
-        salt, nonce, ct = raw[:16], raw[16:28], raw[28:]
         self.logger.info("Data read from %s, starting decryption", filepath)
-        return self._decrypt(ct, nonce, salt, password)
+        return self.decrypt_bytes(raw, password, source=filepath)
+
+    def decrypt_bytes(self, raw: bytes, password: str, source: object = "<bytes>") -> tuple[int, bytes]:
+        """
+        Decrypt a blob written by encrypt_bytes (or a legacy file's content). raw may be
+        a memoryview (e.g. a slice of a mapped store); the ciphertext is not copied.
+        """
+        keys = self.keys(password)
+        version = raw[len(FILE_MAGIC)] if len(raw) > HEADER_SIZE else None
+        if raw[: len(FILE_MAGIC)] == FILE_MAGIC and version in (FILE_VERSION_PBKDF2, FILE_VERSION):
+            header, body = raw[:HEADER_SIZE], raw[HEADER_SIZE:]
+            salt, nonce, ct = bytes(body[:16]), bytes(body[16:28]), body[28:]
+            key = keys.file_key(salt) if version == FILE_VERSION else keys.legacy_key(salt)
+            try:
+                return header[-1], self._decrypt(ct, nonce, key, header)
+            except InvalidTag:
+                # a legacy file whose random salt happens to start with the magic
+                self.logger.warning("Header decryption failed for %s, retrying as legacy file", source)
+        salt, nonce, ct = bytes(raw[:16]), bytes(raw[16:28]), raw[28:]
+        return LEGACY_DATA_FORMAT, self._decrypt(ct, nonce, keys.legacy_key(salt))
@@ -0,0 +1,77 @@
+# Standard Library
+from collections import OrderedDict
+import threading
+from typing import Optional
+
+# Third Library
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+# Domain-separation constants. The per-file randomness comes from the HKDF salt.
+MASTER_SALT = b"R503FingerprintManager/master-key/v1"
+FILE_KEY_INFO = b"R503FingerprintManager/file-key/v2"
+
+
+class KeyManager:
+    """
+    Derives and caches AES keys for one password.
+
+    - The master key is derived once with PBKDF2 (the expensive part) and reused.
+    - Per-file keys are HKDF subkeys of the master key, keyed by the file salt.
+    - Legacy per-salt PBKDF2 keys are kept in a bounded LRU so repeated reads
+      of the same legacy file only pay PBKDF2 once.
+    """
+
+    def __init__(self, password: str, iterations: int = 390000, cache_size: int = 256):
+        self._password = password.encode()
+        self.iterations = iterations
+        self.cache_size = cache_size
+        self.backend = default_backend()
+        self._master_key: Optional[bytes] = None
+        self._legacy_keys: OrderedDict[bytes, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pbkdf2(self, salt: bytes) -> bytes:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,  # 256 key
+            salt=salt,
+            iterations=self.iterations,
+            backend=self.backend,
+        )
+        return kdf.derive(self._password)
+
+    @property
+    def master_key(self) -> bytes:
+        with self._lock:
+            if self._master_key is None:
+                self._master_key = self._pbkdf2(MASTER_SALT)
+            return self._master_key
+
+    def file_key(self, salt: bytes) -> bytes:
+        """HKDF subkey for a single file."""
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            info=FILE_KEY_INFO,
+            backend=self.backend,
+        )
+        return hkdf.derive(self.master_key)
+
+    def legacy_key(self, salt: bytes) -> bytes:
+        """PBKDF2 key of a legacy file, served from the LRU when possible."""
+        with self._lock:
+            key = self._legacy_keys.get(salt)
+            if key is not None:
+                self._legacy_keys.move_to_end(salt)
+                return key
+        key = self._pbkdf2(salt)
+        with self._lock:
+            self._legacy_keys[salt] = key
+            self._legacy_keys.move_to_end(salt)
+            while len(self._legacy_keys) > self.cache_size:
+                self._legacy_keys.popitem(last=False)
+        return key
@@ -0,0 +1,34 @@
+"""Helpers for objects that are built on first use instead of at import time."""
+
+# Standard Library
+import functools
+import threading
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def once(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Decorate a zero-argument factory so it runs on the first call only (thread-safe);
+    later calls return the same object. `loaded()` tells whether it has been built and
+    `reset()` drops it so the next call builds a new one.
+    """
+    lock = threading.Lock()
+    cell = []
+
+    @functools.wraps(factory)
+    def get() -> T:
+        if not cell:
+            with lock:
+                if not cell:
+                    cell.append(factory())
+        return cell[0]
+
+    def reset() -> None:
+        with lock:
+            cell.clear()
+
+    get.loaded = lambda: bool(cell)
+    get.reset = reset
+    return get
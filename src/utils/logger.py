@@ -6,9 +6,49 @@ import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import time
+from typing import Optional
 
 from src.config import settings
 
+_formatter = logging.Formatter(
+    "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+class _DailyFileHandler(logging.Handler):
+    """
+    `<LOGGER_PATH>/<date>.log` rotating handler shared by every logger. Settings are read
+    and the directory and file created when the first record is written, so setting up a
+    logger (usually at import) touches nothing.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._file: Optional[RotatingFileHandler] = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # handle() holds self.lock, so the file is opened once
+        if self._file is None:
+            Path(settings.LOGGER_PATH).mkdir(parents=True, exist_ok=True)
+            self._file = RotatingFileHandler(
+                f"{settings.LOGGER_PATH}/{time.strftime('%Y_%m_%d')}.log",
+                maxBytes=5 * 1024 * 1024,
+                backupCount=3,
+                encoding="utf-8",
+            )
+            self._file.setFormatter(self.formatter)
+        self._file.emit(record)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        super().close()
+
+
+_file_handler = _DailyFileHandler()
+_file_handler.setFormatter(_formatter)
+
 
 def setup_logger(name: str = None) -> logging.Logger:
     logger = logging.getLogger(name)
@@ -17,20 +57,6 @@ def setup_logger(name: str = None) -> logging.Logger:
     if logger.handlers:
         return logger
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-
-    Path(settings.LOGGER_PATH).mkdir(parents=True, exist_ok=True)
-
-    file_handler = RotatingFileHandler(
-        f"{settings.LOGGER_PATH}/{time.strftime('%Y_%m_%d')}.log",
-        maxBytes=5 * 1024 * 1024,
-        backupCount=3,
-        encoding="utf-8",
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    logger.addHandler(_file_handler)
 
     return logger
@@ -0,0 +1,184 @@
+"""In-process metrics: counters and latency histograms with a Prometheus text dump and hooks."""
+
+# Standard Library
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.utils.logger import setup_logger
+
+# Histogram buckets in seconds (UART commands are milliseconds, image transfers seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# hook(kind, name, value, labels): kind is "counter" or "histogram"
+MetricsHook = Callable[[str, str, float, Dict[str, str]], None]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of labelled counters and histograms.
+
+    - `inc()` / `observe()` record values, `span()` times a block with time.monotonic.
+    - `render_prometheus()` returns the Prometheus text exposition format.
+    - Hooks registered with `add_hook()` receive every recorded value (e.g. to forward
+      them to StatsD); hook errors are logged and never reach the sensor code.
+    """
+
+    def __init__(self, namespace: str = "fingerprint", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.logger = setup_logger("Metrics")
+        self.namespace = namespace
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._hooks: List[MetricsHook] = []
+        self._lock = threading.Lock()
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    @staticmethod
+    def _labels(labels: Dict[str, object]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[self._name(name)] = text
+
+    # -------------------------
+    #   Recording
+    # -------------------------
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add value to the counter name{labels}."""
+        if not value:
+            return
+        key, full_name = self._labels(labels), self._name(name)
+        with self._lock:
+            series = self._counters.setdefault(full_name, {})
+            series[key] = series.get(key, 0) + value
+        self._emit("counter", full_name, value, key)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record value (seconds) in the histogram name{labels}."""
+        key, full_name = self._labels(labels), self._name(name)
+        with self._lock:
+            series = self._histograms.setdefault(full_name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+        self._emit("histogram", full_name, value, key)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time the block into the stage_seconds histogram, labelled with stage and outcome."""
+        start = time.monotonic()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe("stage_seconds", time.monotonic() - start, stage=stage, outcome=outcome, **labels)
+
+    # -------------------------
+    #   Hooks
+    # -------------------------
+    def add_hook(self, hook: MetricsHook) -> None:
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: MetricsHook) -> None:
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def _emit(self, kind: str, name: str, value: float, labels: Labels) -> None:
+        for hook in list(self._hooks):
+            try:
+                hook(kind, name, value, dict(labels))
+            except Exception:
+                self.logger.exception("Metrics hook %r failed (ignored).", hook)
+
+    # -------------------------
+    #   Export
+    # -------------------------
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._name(name), {}).get(self._labels(labels), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Tuple[int, float]]:
+        """(count, sum) of a histogram series, None when nothing was observed."""
+        with self._lock:
+            histogram = self._histograms.get(self._name(name), {}).get(self._labels(labels))
+            return (histogram.count, histogram.sum) if histogram else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (
+            (key, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in pairs
+        )
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket = self._format_labels(labels, (("le", f"{bound:g}"),))
+                        lines.append(f"{name}_bucket{bucket} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Instance
+metrics = MetricsRegistry()
+metrics.describe("stage_seconds", "Duration of sensor and pipeline stages.")
+metrics.describe("capture_polls_total", "GETIMAGE polls by result.")
+metrics.describe("retries_total", "Handshake retries and reconnects.")
+metrics.describe("led_writes_total", "LED updates written, skipped as unchanged, or failed.")
+metrics.describe("uart_bytes_total", "Bytes moved over the sensor UART.")
+metrics.describe("requests_total", "Service requests by operation and result.")
+metrics.describe("image_quality_total", "Enrollment images graded on the host, accepted or rejected.")
+metrics.describe("enroll_retakes_total", "Enrollment samples retaken because they did not match the first one.")
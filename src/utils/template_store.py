@@ -0,0 +1,366 @@
+"""
+Storage backends for encrypted templates (the blobs written by `Encrypt.encrypt_bytes`).
+
+- `FileStore`: one `user_<id>.bin` file per user (the original layout).
+- `PackedStore`: a single append-only container read through mmap, with a
+  user_id -> offset index, so a lookup is a dict hit and a zero-copy slice.
+"""
+
+# Standard Library
+import atexit
+import json
+import mmap
+import os
+from pathlib import Path
+import struct
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import zlib
+
+from src.utils.logger import setup_logger
+
+Blob = Union[bytes, memoryview]
+
+
+class TemplateStore:
+    """Interface shared by the storage backends (user_id -> encrypted blob)."""
+
+    def get(self, user_id: str) -> Optional[Blob]:
+        raise NotImplementedError
+
+    def put(self, user_id: str, blob: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def user_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    def location(self, user_id: str) -> str:
+        """Human readable place where user_id is stored (for responses and logs)."""
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, Blob]]:
+        for user_id in self.user_ids():
+            blob = self.get(user_id)
+            if blob is not None:
+                yield user_id, blob
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.get(user_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.user_ids())
+
+    def close(self) -> None:
+        pass
+
+
+def write_atomic(path: Path, blob: bytes) -> None:
+    """Write through a temporary file and rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -------------------------
+#   One file per user
+# -------------------------
+class FileStore(TemplateStore):
+    PREFIX = "user_"
+    SUFFIX = ".bin"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, user_id: str) -> Path:
+        return self.root / f"{self.PREFIX}{user_id}{self.SUFFIX}"
+
+    def get(self, user_id: str) -> Optional[bytes]:
+        try:
+            return self.path(user_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, user_id: str, blob: bytes) -> None:
+        write_atomic(self.path(user_id), bytes(blob))
+
+    def delete(self, user_id: str) -> bool:
+        try:
+            self.path(user_id).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def user_ids(self) -> List[str]:
+        pattern = f"{self.PREFIX}*{self.SUFFIX}"
+        return [path.name[len(self.PREFIX) : -len(self.SUFFIX)] for path in sorted(self.root.glob(pattern))]
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.path(user_id).exists()
+
+    def location(self, user_id: str) -> str:
+        return self.path(user_id).name
+
+
+# -------------------------
+#   Packed container
+# -------------------------
+# File header: magic, version, 3 reserved bytes, 8 byte generation (changes on every compaction)
+PACK_MAGIC = b"R5PK"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct("<4sB3x8s")
+# Record: crc32 (over the rest of the record), kind, key length, blob length, key, blob
+RECORD = struct.Struct("<IBHI")
+RECORD_PUT = 1
+RECORD_DELETE = 2
+
+
+class PackedStore(TemplateStore):
+    """
+    Append-only container: every put/delete appends a CRC-checked record and is fsynced
+    before the in-memory index points at it, so a crash leaves either the old or the new
+    value (a torn tail record is cut off on the next open).
+
+    - `get()` returns a memoryview into the mapped file (no read or copy).
+    - The index is rebuilt by scanning records; `<pack>.idx` snapshots it (written on
+      close and compaction) so an open only scans what was appended after the snapshot.
+    - Superseded records are dropped by `compact()`, run automatically once dead bytes
+      exceed `compact_ratio` of the file.
+    """
+
+    def __init__(self, path: Path, compact_ratio: float = 0.5, compact_min_bytes: int = 1 << 20):
+        self.logger = setup_logger("PackedStore")
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.RLock()
+        self._index: Dict[str, Tuple[int, int]] = {}  # user_id -> (blob offset, blob length)
+        self._dead = 0
+        self._map: Optional[mmap.mmap] = None
+        self._open()
+
+    # -------------------------
+    #   Opening / recovery
+    # -------------------------
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            write_atomic(self.path, PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, os.urandom(8)))
+        self._file = open(self.path, "r+b")
+        header = self._file.read(PACK_HEADER.size)
+        if len(header) < PACK_HEADER.size:
+            raise ValueError(f"{self.path} is not a template pack")
+        magic, version, self._generation = PACK_HEADER.unpack(header)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"{self.path} is not a template pack (version {version})")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._remap()
+
+        start = self._load_index_snapshot()
+        end = self._scan(start)
+        if end < self._size:
+            self.logger.warning("Dropping %d bytes of incomplete records at the end of %s", self._size - end, self.path)
+            self._file.truncate(end)
+            os.fsync(self._file.fileno())
+            self._size = end
+            self._remap()
+        self.logger.info("Opened %s: %d templates, %d bytes", self.path, len(self._index), self._size)
+
+    def _remap(self) -> None:
+        self._release_map()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = self._size
+
+    def _release_map(self) -> None:
+        if self._map is None:
+            return
+        try:
+            self._map.close()
+        except BufferError:
+            # views handed out by get() still use it; it is unmapped once they are released
+            pass
+
+    def _load_index_snapshot(self) -> int:
+        """Load <pack>.idx if it belongs to this file; return the offset to scan from."""
+        try:
+            snapshot = json.loads(self.index_path.read_text())
+            if bytes.fromhex(snapshot["generation"]) == self._generation and snapshot["end"] <= self._size:
+                self._index = {user_id: tuple(entry) for user_id, entry in snapshot["entries"].items()}
+                self._dead = snapshot["dead"]
+                return snapshot["end"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError):
+            self.logger.warning("Ignoring unreadable index %s", self.index_path)
+        self._index, self._dead = {}, 0
+        return PACK_HEADER.size
+
+    def _scan(self, offset: int) -> int:
+        """Apply records from offset on; return where the valid records end."""
+        view = self._map
+        while offset + RECORD.size <= self._size:
+            crc, kind, key_len, blob_len = RECORD.unpack_from(view, offset)
+            end = offset + RECORD.size + key_len + blob_len
+            if end > self._size or kind not in (RECORD_PUT, RECORD_DELETE):
+                break
+            if zlib.crc32(view[offset + 4 : end]) != crc:
+                break
+            key_start = offset + RECORD.size
+            user_id = view[key_start : key_start + key_len].decode()
+            self._apply(user_id, kind, key_start + key_len, blob_len, end - offset)
+            offset = end
+        return offset
+
+    def _apply(self, user_id: str, kind: int, blob_offset: int, blob_len: int, record_len: int) -> None:
+        previous = self._index.pop(user_id, None)
+        if previous is not None:
+            self._dead += self._record_len(user_id, previous[1])
+        if kind == RECORD_PUT:
+            self._index[user_id] = (blob_offset, blob_len)
+        else:
+            self._dead += record_len
+
+    @staticmethod
+    def _record_len(user_id: str, blob_len: int) -> int:
+        return RECORD.size + len(user_id.encode()) + blob_len
+
+    # -------------------------
+    #   Access
+    # -------------------------
+    def get(self, user_id: str) -> Optional[memoryview]:
+        with self._lock:
+            entry = self._index.get(user_id)
+            if entry is None:
+                return None
+            offset, length = entry
+            if offset + length > self._mapped:
+                self._remap()
+            return memoryview(self._map)[offset : offset + length]
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            return sorted(self._index)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def location(self, user_id: str) -> str:
+        return f"{self.path.name}#{user_id}"
+
+    # -------------------------
+    #   Updates
+    # -------------------------
+    @staticmethod
+    def _record(user_id: str, kind: int, blob: bytes = b"") -> bytes:
+        key = user_id.encode()
+        body = RECORD.pack(0, kind, len(key), len(blob))[4:] + key + blob
+        return struct.pack("<I", zlib.crc32(body)) + body
+
+    def _append(self, user_id: str, kind: int, blob: bytes = b"") -> None:
+        record = self._record(user_id, kind, blob)
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size += len(record)
+            self._apply(user_id, kind, self._size - len(blob), len(blob), len(record))
+            self._maybe_compact()
+
+    def put(self, user_id: str, blob: bytes) -> None:
+        self._append(user_id, RECORD_PUT, bytes(blob))
+
+    def delete(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id not in self._index:
+                return False
+            self._append(user_id, RECORD_DELETE)
+            return True
+
+    def _maybe_compact(self) -> None:
+        if self._size >= self.compact_min_bytes and self._dead > self.compact_ratio * self._size:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the pack with live records only and atomically swap it in."""
+        with self._lock:
+            generation = os.urandom(8)
+            tmp = self.path.with_name(f".{self.path.name}.tmp")
+            index: Dict[str, Tuple[int, int]] = {}
+            with open(tmp, "wb") as f:
+                f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, generation))
+                for user_id, (offset, length) in self._index.items():
+                    if offset + length > self._mapped:
+                        self._remap()
+                    start = offset - RECORD.size - len(user_id.encode())
+                    position = f.tell()
+                    f.write(self._map[start : offset + length])
+                    index[user_id] = (position + offset - start, length)
+                f.flush()
+                os.fsync(f.fileno())
+            before = self._size
+            # Windows cannot replace a file that is still open or mapped
+            self._release_map()
+            self._file.close()
+            try:
+                os.replace(tmp, self.path)
+                _fsync_dir(self.path.parent)
+                self._generation = generation
+                self._index, self._dead = index, 0
+            finally:
+                self._file = open(self.path, "r+b")
+                self._size = os.fstat(self._file.fileno()).st_size
+                self._remap()
+            self._save_index_snapshot()
+            self.logger.info("Compacted %s: %d -> %d bytes", self.path, before, self._size)
+
+    def _save_index_snapshot(self) -> None:
+        snapshot = {
+            "generation": self._generation.hex(),
+            "end": self._size,
+            "dead": self._dead,
+            "entries": self._index,
+        }
+        write_atomic(self.index_path, json.dumps(snapshot).encode())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._save_index_snapshot()
+            self._file.close()
+            self._release_map()
+
+
+def _fsync_dir(path: Path) -> None:
+    """Persist a rename (POSIX; directories cannot be opened on Windows)."""
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def open_store(kind: str, root: Path) -> TemplateStore:
+    """Store backend by name: "files" (user_<id>.bin under root) or "packed" (root/templates.pack)."""
+    if kind == "files":
+        return FileStore(root)
+    if kind == "packed":
+        store = PackedStore(Path(root) / "templates.pack")
+        # the index snapshot only saves a rescan, so a missed close is harmless
+        atexit.register(store.close)
+        return store
+    raise ValueError(f"Unknown template store {kind!r} (expected 'files' or 'packed')")
@@ -0,0 +1,119 @@
+"""A request cancelled in the middle of an upload must not leak library slots."""
+
+# Standard Library
+import asyncio
+
+# Third Library
+import pytest
+
+from src.core.async_sensor import AsyncFingerprint
+from src.core.async_service import AsyncIdentifyService
+from src.core.cancel import CancelToken, OperationCancelled
+from src.core.identify_service import IdentifyService
+from src.core.slot_allocator import SlotAllocator
+from src.core.status import SensorStatus
+from src.core.template import Template, TemplateFormat
+from src.core.template_cache import SensorTemplateCache
+from src.sim.r503 import get_device
+
+LIBRARY_SIZE = 3
+
+
+@pytest.fixture(autouse=True)
+def _settings(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+
+
+def _port(name: str) -> str:
+    return f"sim://{name}?time_scale=0&library_size={LIBRARY_SIZE}"
+
+
+def _template(device, finger: str) -> Template:
+    return Template(device.template_for(finger), TemplateFormat.CHAR)
+
+
+def _bound(service):
+    service.bind_session(SensorTemplateCache(), SlotAllocator())
+    return service
+
+
+def _cancel_during(service, method: str):
+    """Cancel the service's request while `method` is exchanged with the sensor."""
+    real = getattr(service._sensor, method)
+
+    def cancelling(*args):
+        result = real(*args)
+        service.cancel_token.cancel()
+        return result
+
+    setattr(service._sensor, method, cancelling)
+    return lambda: setattr(service._sensor, method, real)
+
+
+def test_cancelled_uploads_release_their_slots():
+    service = _bound(IdentifyService(port=_port("cancel-upload")))
+    device = get_device("cancel-upload")
+    try:
+        restore = _cancel_during(service, "send_fpdata")
+        for finger in range(LIBRARY_SIZE):
+            service.cancel_token = CancelToken()  # a new request
+            with pytest.raises(OperationCancelled):
+                service.upload_to_sensor(_template(device, f"user_{finger}"))
+        restore()
+        assert device.library == {}
+
+        service.cancel_token = CancelToken()
+        result = service.upload_to_sensor(_template(device, "user_0"))
+        assert result["status"] == SensorStatus.SUCCESS
+    finally:
+        service.close()
+
+
+def test_cancelled_load_resyncs_the_library():
+    service = _bound(IdentifyService(port=_port("cancel-load")))
+    device = get_device("cancel-load")
+    try:
+        for finger in range(LIBRARY_SIZE):
+            template = _template(device, f"user_{finger}")
+            result = service.load_template(f"user_{finger}", str(finger), lambda t=template: t)
+            assert result["status"] == SensorStatus.SUCCESS
+
+        # the library is full: user_3 evicts a slot, then the upload is cancelled
+        restore = _cancel_during(service, "delete_model")
+        template = _template(device, "user_3")
+        with pytest.raises(OperationCancelled):
+            service.load_template("user_3", "3", lambda: template)
+        restore()
+        assert not service.template_cache.synced
+
+        service.cancel_token = CancelToken()
+        result = service.load_template("user_3", "3", lambda: template)
+        assert result["status"] == SensorStatus.SUCCESS
+        assert len(device.library) == LIBRARY_SIZE
+    finally:
+        service.close()
+
+
+def test_cancelled_async_upload_releases_its_slot():
+    async def scenario():
+        sensor = await AsyncFingerprint.open(_port("cancel-async"), 57600)
+        device = get_device("cancel-async")
+        service = _bound(AsyncIdentifyService(port=_port("cancel-async"), sensor=sensor))
+        real = sensor.send_fpdata
+
+        async def cancelled(*args):
+            await real(*args)
+            raise asyncio.CancelledError()
+
+        try:
+            sensor.send_fpdata = cancelled
+            for finger in range(LIBRARY_SIZE):
+                with pytest.raises(asyncio.CancelledError):
+                    await service.upload_to_sensor(_template(device, f"user_{finger}"))
+            sensor.send_fpdata = real
+            result = await service.upload_to_sensor(_template(device, "user_0"))
+            assert result["status"] == SensorStatus.SUCCESS
+        finally:
+            sensor.close_uart()
+
+    asyncio.run(scenario())